@@ -1,14 +1,31 @@
 import json
 import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from agents.stream_parser import PlannerStreamCollector
 from entity.ChainContextEntity import FunctionCall, FunctionResponse
+from entity.Conversation import ChatMessageType
+from entity.Models import ChatContent
 from providers.Deepseek import DeepSeekChat
+from providers.ProvidersBase import AbstractChat
+from providers.Resilience import is_retryable
 from tools.math_tools import MATH_TOOLS, FUNCTION_DESCRIPTIONS
 
 
 class FunctionCaller:
-    def __init__(self, api_key: str = None):
-        self.chat = DeepSeekChat(api_key=api_key, model="deepseek-chat")
+    def __init__(self, api_key: str = None, chat: Optional[AbstractChat] = None, native_tools: bool = True):
+        """
+        Args:
+            chat: 可注入任意 AbstractChat（如 RouterChat），默认使用 deepseek-chat
+            native_tools: 使用原生 function calling；模型不支持工具调用时退回 JSON 提示模式
+        """
+        self.chat = chat or DeepSeekChat(api_key=api_key, model="deepseek-chat")
+        self.native_tools = native_tools
+        # 原生模式下工具定义通过 tools 参数传递，提示词无需再内嵌工具说明
+        self.native_prompt = """你是一个数学问题分析专家。
+请分析用户的数学问题，在回复正文中给出分析：制定回答的策略，说明涉及的数学知识等。
+只有在需要精确计算、解方程或分析函数时才调用工具，简单的概念解释不需要调用工具；
+所有涉及数学公式的参数值需要符合python库sympy的语法。\n"""
         self.function_caller_prompt = f"""你是一个数学问题分析专家。
 {FUNCTION_DESCRIPTIONS}
         
@@ -53,67 +70,202 @@ Function calling工具定义:
         """分析问题并判断是否需要调用函数"""
 
         try:
-            response = self.chat.chatting(
-                user_input=f"请分析这个数学问题：{problem}",
-                system_prompt=self.function_caller_prompt + f"用户的教育背景为{user_background}"
-            )
-            
-            # 解析响应
-            content = response.content
-            
-            # 尝试提取JSON
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
+            for native, messages, kwargs in self._attempts(problem, user_background):
                 try:
-                    result = json.loads(json_match.group())
-
-                    if result.get("need_function", False):
-                        function_results = []
-                        for func_call in result.get("function_calls", []):
-                            function_results.append(FunctionCall(
-                                function_name=func_call["function_name"],
-                                parameters=func_call["parameters"],
-                                reason=func_call.get("reason", "")
-                            ))
-
-                        return FunctionResponse(
-                            need_function=True,
-                            analysis=result.get("analysis", ""),
-                            function_results=function_results,
-                            reasoning=getattr(response, "reasoning_content", None)
-                        )
-                    else:
-                        return FunctionResponse(
-                            need_function=False,
-                            analysis=result.get("analysis", ""),
-                            function_results=[],
-                            reasoning=getattr(response, "reasoning_content", None)
-                        )
-                        
-                except json.JSONDecodeError:
-                    # JSON解析失败，返回原始分析
+                    return self._parse_completion(native, self.chat.call_api(messages, stream=False, **kwargs))
+                except Exception as e:
+                    self._fall_back(native, e)
+        except Exception as e:
+            return self._error_response(e)
+
+    async def aanalyze(self, problem: str, user_background: str) -> FunctionResponse:
+        """analyze 的异步版本"""
+
+        try:
+            for native, messages, kwargs in self._attempts(problem, user_background):
+                try:
+                    return self._parse_completion(native, await self.chat.acall_api(messages, stream=False, **kwargs))
+                except Exception as e:
+                    self._fall_back(native, e)
+        except Exception as e:
+            return self._error_response(e)
+
+    def analyze_stream(self, problem: str, user_background: str, on_call: Callable[[FunctionCall], None],
+                       on_discard: Optional[Callable[[], None]] = None) -> FunctionResponse:
+        """
+        流式分析：每个工具调用一旦完整即回调 on_call（用于提前派发工具执行），
+        流结束后返回与 analyze 相同的完整分析结果。
+        流中途失败时（之后改用 JSON 模式重新分析或返回错误结果），先回调 on_discard 作废已回调的工具调用
+        """
+
+        try:
+            for native, messages, kwargs in self._attempts(problem, user_background):
+                collector = PlannerStreamCollector(native=native)
+                try:
+                    for delta in self.chat.stream_api(messages, **kwargs):
+                        self._feed(collector, delta, on_call)
+                    return self._collected_response(collector)
+                except Exception as e:
+                    if on_discard is not None:
+                        on_discard()
+                    self._fall_back(native, e)
+        except Exception as e:
+            return self._error_response(e)
+
+    async def aanalyze_stream(self, problem: str, user_background: str, on_call: Callable[[FunctionCall], None],
+                              on_discard: Optional[Callable[[], None]] = None) -> FunctionResponse:
+        """analyze_stream 的异步版本"""
+
+        try:
+            for native, messages, kwargs in self._attempts(problem, user_background):
+                collector = PlannerStreamCollector(native=native)
+                try:
+                    async for delta in self.chat.astream_api(messages, **kwargs):
+                        self._feed(collector, delta, on_call)
+                    return self._collected_response(collector)
+                except Exception as e:
+                    if on_discard is not None:
+                        on_discard()
+                    self._fall_back(native, e)
+        except Exception as e:
+            return self._error_response(e)
+
+    def _attempts(self, problem: str, user_background: str) -> List[Tuple[bool, List[Dict[str, str]], Dict[str, Any]]]:
+        """依次尝试的请求 (是否原生模式, 消息, 请求参数)：原生 function calling 优先，JSON 提示模式兜底"""
+        attempts = []
+        if self.native_tools:
+            attempts.append((True, self._build_messages(problem, user_background, native=True),
+                             {"tools": MATH_TOOLS, "tool_choice": "auto"}))
+        attempts.append((False, self._build_messages(problem, user_background), {}))
+        return attempts
+
+    @staticmethod
+    def _fall_back(native: bool, e: Exception) -> None:
+        """原生模式的不可重试错误（如模型不支持工具调用）改用 JSON 模式，其余错误向上抛出"""
+        if not native or is_retryable(e):
+            raise e
+        print(f"原生工具调用失败，改用JSON模式：{str(e)}")
+
+    def _parse_completion(self, native: bool, response: Any) -> FunctionResponse:
+        if native:
+            return self._parse_tool_calls(self.chat._parse_response(response))
+        return self._parse_analysis(self._to_chat_content(response))
+
+    @staticmethod
+    def _feed(collector: PlannerStreamCollector, delta: Dict[str, Any],
+              on_call: Callable[[FunctionCall], None]) -> None:
+        for call in collector.feed(delta):
+            on_call(call)
+
+    def _collected_response(self, collector: PlannerStreamCollector) -> FunctionResponse:
+        """流结束后组装完整分析结果"""
+        if collector.native:
+            function_results = collector.tool_calls()
+            return FunctionResponse(
+                need_function=bool(function_results),
+                analysis=collector.content,
+                function_results=function_results,
+                reasoning=collector.reasoning
+            )
+        return self._parse_analysis(ChatContent(
+            role="assistant",
+            content=collector.content,
+            reasoning_content=collector.reasoning,
+            chat_type=ChatMessageType.NORMAL_MESSAGE_ASSISTANT
+        ))
+
+    def _build_messages(self, problem: str, user_background: str, native: bool = False) -> List[Dict[str, str]]:
+        """每次分析独立构建消息，不累积聊天记录，便于多个请求共享同一个 chat"""
+        prompt = self.native_prompt if native else self.function_caller_prompt
+        return [
+            {"role": "system", "content": prompt + f"用户的教育背景为{user_background}"},
+            {"role": "user", "content": f"请分析这个数学问题：{problem}"}
+        ]
+
+    @staticmethod
+    def _parse_tool_calls(response_data: Dict[str, Any]) -> FunctionResponse:
+        """将原生 tool_calls 转换为 FunctionResponse，正文作为分析"""
+        tool_calls = response_data.get("tool_calls") or []
+        function_results = [
+            FunctionCall(function_name=call["name"], parameters=call["arguments"])
+            for call in tool_calls
+        ]
+        return FunctionResponse(
+            need_function=bool(function_results),
+            analysis=response_data.get("content") or "",
+            function_results=function_results,
+            reasoning=response_data.get("reasoning_content")
+        )
+
+    def _to_chat_content(self, response: Any) -> ChatContent:
+        response_data = self.chat._parse_response(response)
+        return ChatContent(
+            role="assistant",
+            content=response_data.get("content") or "",
+            reasoning_content=response_data.get("reasoning_content"),
+            message=response_data.get("message"),
+            finish_reason=response_data.get("finish_reason"),
+            chat_type=ChatMessageType.NORMAL_MESSAGE_ASSISTANT
+        )
+
+    def _parse_analysis(self, response: ChatContent) -> FunctionResponse:
+        """解析模型回复中的JSON"""
+        content = response.content
+        
+        # 尝试提取JSON
+        json_match = re.search(r'\{.*\}', content, re.DOTALL)
+        if json_match:
+            try:
+                result = json.loads(json_match.group())
+
+                if result.get("need_function", False):
+                    function_results = []
+                    for func_call in result.get("function_calls", []):
+                        function_results.append(FunctionCall(
+                            function_name=func_call["function_name"],
+                            parameters=func_call["parameters"],
+                            reason=func_call.get("reason", "")
+                        ))
+
+                    return FunctionResponse(
+                        need_function=True,
+                        analysis=result.get("analysis", ""),
+                        function_results=function_results,
+                        reasoning=getattr(response, "reasoning_content", None)
+                    )
+                else:
                     return FunctionResponse(
-                            need_function=False,
-                            analysis=content,
-                            function_results=[],
-                            reasoning=getattr(response, "reasoning_content", None)
-                        )
-            else:
+                        need_function=False,
+                        analysis=result.get("analysis", ""),
+                        function_results=[],
+                        reasoning=getattr(response, "reasoning_content", None)
+                    )
+                    
+            except json.JSONDecodeError:
+                # JSON解析失败，返回原始分析
                 return FunctionResponse(
-                            need_function=False,
-                            analysis=content,
-                            function_results=[],
-                            reasoning=getattr(response, "reasoning_content", None)
-                        )
-                
-        except Exception as e:
-            print(f"分析过程中出现错误：{str(e)}")
+                        need_function=False,
+                        analysis=content,
+                        function_results=[],
+                        reasoning=getattr(response, "reasoning_content", None)
+                    )
+        else:
             return FunctionResponse(
-                            need_function=False,
-                            analysis=f"分析过程中出现错误：{str(e)}",
-                            function_results=[],
-                            error=str(e)
-                        )
+                        need_function=False,
+                        analysis=content,
+                        function_results=[],
+                        reasoning=getattr(response, "reasoning_content", None)
+                    )
+
+    @staticmethod
+    def _error_response(e: Exception) -> FunctionResponse:
+        print(f"分析过程中出现错误：{str(e)}")
+        return FunctionResponse(
+                        need_function=False,
+                        analysis=f"分析过程中出现错误：{str(e)}",
+                        function_results=[],
+                        error=str(e)
+                    )
     
     def clear_history(self):
         """清除对话历史"""
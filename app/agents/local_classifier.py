@@ -0,0 +1,187 @@
+import re
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import sympy as sp
+from sympy.parsing.sympy_parser import (convert_xor, implicit_multiplication_application, parse_expr,
+                                        standard_transformations)
+
+from entity.ChainContextEntity import FunctionCall, FunctionResponse
+
+_TRANSFORMATIONS = standard_transformations + (implicit_multiplication_application, convert_xor)
+
+_SUPERSCRIPTS = {"⁰": "0", "¹": "1", "²": "2", "³": "3", "⁴": "4", "⁵": "5", "⁶": "6", "⁷": "7", "⁸": "8",
+                 "⁹": "9", "⁻": "-"}
+_SYMBOL_MAP = {"×": "*", "·": "*", "∙": "*", "÷": "/", "−": "-", "–": "-", "（": "(", "）": ")", "＝": "=",
+               "π": "pi", "√": "sqrt", "，": ",", "：": ":", "？": "?", "。": ""}
+
+# 允许出现在表达式中的函数与常量名，其余多字母标识符一律视为无法可靠解析
+_ALLOWED_NAMES = {"sin", "cos", "tan", "cot", "sec", "csc", "asin", "acos", "atan", "sinh", "cosh", "tanh",
+                  "log", "ln", "exp", "sqrt", "abs", "pi", "E", "e", "factorial"}
+_MATH_CHARS = re.compile(r"^[0-9a-zA-Z_+\-*/^().,\s!]+$")
+
+_CALCULATE = re.compile(r"^(?:请)?(?:计算|求值|算一算|算一下|求)\s*[:]?\s*(?P<expr>.+?)\s*(?:的值|等于多少|=\s*\?|=)?\s*[?]?$")
+_SOLVE = re.compile(r"^(?:请)?(?:解方程|求解方程|解)\s*[:]?\s*(?P<eq>[^=]+=[^=]+?)\s*[?]?$")
+_ANALYZE = re.compile(r"^(?:请)?分析函数\s*(?:[a-zA-Z]\s*\(\s*x\s*\)\s*=|y\s*=)?\s*(?P<expr>.+?)\s*(?:的(?:图像)?(?:特征|性质|图像))?\s*[?]?$")
+
+
+def normalize_math(text: str) -> str:
+    """规范化 Unicode 数学符号：上标转乘方、×÷ 转运算符、全角转半角"""
+    text = re.sub(r"[⁰¹²³⁴⁵⁶⁷⁸⁹⁻]+",
+                  lambda m: "**" + "".join(_SUPERSCRIPTS[c] for c in m.group()), text)
+    for source, target in _SYMBOL_MAP.items():
+        text = text.replace(source, target)
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _unevaluated(function: Callable[..., sp.Basic]) -> Callable[..., sp.Basic]:
+    return lambda *args, **kwargs: function(*args, evaluate=False)
+
+
+# 白名单函数的不求值版本，解析时只构建表达式树（factorial(10**8) 等不会在服务进程内计算）
+_UNEVALUATED_FUNCTIONS = {name: _unevaluated(getattr(sp, {"abs": "Abs", "ln": "log"}.get(name, name)))
+                          for name in _ALLOWED_NAMES - {"pi", "E", "e"}}
+
+
+def parse_unevaluated(expression: str, transformations: Tuple = _TRANSFORMATIONS) -> sp.Basic:
+    """
+    按原有结构解析表达式，不做任何化简与数值计算，耗时只与文本长度有关。
+    题目文本来自用户，求值（如 10**10**10）只能在有截止时间的工具沙箱中进行
+    """
+    return parse_expr(expression, local_dict=dict(_UNEVALUATED_FUNCTIONS), transformations=transformations,
+                      evaluate=False)
+
+
+def _parse(expression: str) -> Optional[sp.Expr]:
+    """只解析由白名单字符和函数名构成的表达式，失败返回 None"""
+    if not expression or not _MATH_CHARS.match(expression):
+        return None
+    for name in re.findall(r"[a-zA-Z_]+", expression):
+        if len(name) > 1 and name not in _ALLOWED_NAMES:
+            return None
+    try:
+        expr = parse_unevaluated(expression)
+    except Exception:
+        return None
+    return expr if isinstance(expr, sp.Basic) else None
+
+
+def _as_tool_text(source: str, expr: sp.Expr) -> str:
+    """
+    优先沿用题目原有写法（仅将 ^ 换成 **），含隐式乘法等 sympify 无法按同样结构解析的写法时使用解析结果；
+    两种解析都不求值，按表达式树结构比较
+    """
+    candidate = source.replace("^", "**").strip()
+    try:
+        if parse_unevaluated(candidate, standard_transformations) == expr:
+            return candidate
+    except Exception:
+        pass
+    return str(expr)
+
+
+class LocalClassifier:
+    """
+    本地规则 + sympy 分类器：能可靠识别的简单题目（计算、解一元方程、分析一元函数）
+    直接生成策略与工具调用，跳过策略规划的 LLM 调用；无法识别时返回 None 交给 LLM
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.hits: Dict[str, int] = {}
+
+    def classify(self, problem: str) -> Optional[FunctionResponse]:
+        text = normalize_math(problem)
+        result = self._classify_calculate(text) or self._classify_solve(text) or self._classify_analyze(text)
+
+        with self._lock:
+            self.attempts += 1
+            if result is not None:
+                kind = result[0]
+                self.hits[kind] = self.hits.get(kind, 0) + 1
+
+        if result is None:
+            return None
+
+        _, analysis, function_calls = result
+        return FunctionResponse(
+            need_function=True,
+            analysis=analysis,
+            function_results=function_calls,
+            reasoning="本地规则解析"
+        )
+
+    def _classify_calculate(self, text: str) -> Optional[Tuple[str, str, List[FunctionCall]]]:
+        match = _CALCULATE.match(text)
+        if not match:
+            return None
+        expr = _parse(match.group("expr"))
+        # 至少包含一个运算，"求 100" 这类只有单个数的文本交给 LLM 理解
+        if expr is None or expr.free_symbols or expr.is_Atom:
+            return None
+
+        expression = _as_tool_text(match.group("expr"), expr)
+        return "calculate", f"这是一道数值计算题，需按运算顺序（先括号、再乘方、后乘除加减）计算表达式 {expression}。", [
+            FunctionCall(function_name="calculate_expression",
+                         parameters={"expression": expression},
+                         reason="精确计算表达式的值")
+        ]
+
+    def _classify_solve(self, text: str) -> Optional[Tuple[str, str, List[FunctionCall]]]:
+        match = _SOLVE.match(text)
+        if not match:
+            return None
+        lhs_text, rhs_text = match.group("eq").split("=")
+        lhs, rhs = _parse(lhs_text), _parse(rhs_text)
+        if lhs is None or rhs is None:
+            return None
+
+        symbols = (lhs.free_symbols | rhs.free_symbols)
+        if len(symbols) != 1:
+            return None
+        # 未知数在移项后消去（如 x = x、x + 1 = x + 2）需要化简才能判断，由沙箱中的 solve_equation 标记
+        variable = str(next(iter(symbols)))
+
+        equation = f"{_as_tool_text(lhs_text, lhs)} = {_as_tool_text(rhs_text, rhs)}"
+        return "solve", f"这是一道关于 {variable} 的方程求解题，需要求出方程 {equation} 的所有解并验证。", [
+            FunctionCall(function_name="solve_equation",
+                         parameters={"equation": equation, "variable": variable},
+                         reason="求解方程")
+        ]
+
+    def _classify_analyze(self, text: str) -> Optional[Tuple[str, str, List[FunctionCall]]]:
+        match = _ANALYZE.match(text)
+        if not match:
+            return None
+        expr = _parse(match.group("expr"))
+        if expr is None or {str(s) for s in expr.free_symbols} != {"x"}:
+            return None
+
+        function = _as_tool_text(match.group("expr"), expr)
+        return "analyze", f"这是一道函数图像分析题，需要求出函数 {function} 的导数、极值点和拐点，并结合图像说明其性质。", [
+            FunctionCall(function_name="plot_function",
+                         parameters={"function": function, "x_range": [-10, 10]},
+                         reason="分析函数的导数、极值点与拐点"),
+            FunctionCall(function_name="draw_plot",
+                         parameters={"plot_type": "function", "functions": [function], "x_range": [-10, 10],
+                                     "title": f"y = {function}"},
+                         reason="绘制函数图像")
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        """命中统计"""
+        with self._lock:
+            total_hits = sum(self.hits.values())
+            return {
+                "attempts": self.attempts,
+                "hits": total_hits,
+                "hit_rate": total_hits / self.attempts if self.attempts else 0.0,
+                "by_kind": dict(self.hits)
+            }
+
+
+# 进程级单例，统计全局命中率
+local_classifier = LocalClassifier()
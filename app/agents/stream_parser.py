@@ -0,0 +1,164 @@
+import json
+from typing import Any, Dict, List, Optional
+
+from entity.ChainContextEntity import FunctionCall
+
+
+class FunctionCallsStreamParser:
+    """
+    增量解析 JSON 模式的规划输出：每当 "function_calls" 数组中的一个对象闭合，
+    立即解析并返回对应的 FunctionCall，无需等待整段回复结束
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0                       # 已扫描到的位置
+        self._array_start: Optional[int] = None
+        self._depth = 0                     # 数组内对象的括号深度
+        self._object_start: Optional[int] = None
+        self._in_string = False
+        self._escaped = False
+        self._done = False
+
+    def feed(self, text: str) -> List[FunctionCall]:
+        """追加一段文本，返回本次新闭合的工具调用"""
+        self.buffer += text
+        if self._done:
+            return []
+
+        if self._array_start is None:
+            key = self.buffer.find('"function_calls"')
+            if key < 0:
+                return []
+            bracket = self.buffer.find("[", key)
+            if bracket < 0:
+                return []
+            self._array_start = bracket
+            self._pos = bracket + 1
+
+        calls: List[FunctionCall] = []
+        while self._pos < len(self.buffer):
+            char = self.buffer[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._object_start = self._pos
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0 and self._object_start is not None:
+                    call = self._to_call(self.buffer[self._object_start:self._pos + 1])
+                    if call is not None:
+                        calls.append(call)
+                    self._object_start = None
+            elif char == "]" and self._depth == 0:
+                self._done = True
+                self._pos += 1
+                break
+            self._pos += 1
+        return calls
+
+    @staticmethod
+    def _to_call(raw: str) -> Optional[FunctionCall]:
+        try:
+            data = json.loads(raw)
+            return FunctionCall(
+                function_name=data["function_name"],
+                parameters=data.get("parameters", {}),
+                reason=data.get("reason", "")
+            )
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+            return None
+
+
+class ToolCallStreamAccumulator:
+    """
+    累积原生 function calling 的流式 tool_calls 增量（按 index 拼接 arguments），
+    参数拼成完整 JSON 时立即返回对应的 FunctionCall
+    """
+
+    def __init__(self):
+        self._calls: Dict[int, Dict[str, Any]] = {}
+
+    def feed(self, tool_call_deltas: Optional[List[Any]]) -> List[FunctionCall]:
+        """追加一批 tool_calls 增量，返回参数已完整的工具调用"""
+        completed: List[FunctionCall] = []
+        for delta in tool_call_deltas or []:
+            call = self._calls.setdefault(delta.index, {"name": "", "arguments": "", "dispatched": False})
+            function = getattr(delta, "function", None)
+            if function is not None:
+                if function.name:
+                    call["name"] += function.name
+                if function.arguments:
+                    call["arguments"] += function.arguments
+            parsed = self._try_complete(call)
+            if parsed is not None:
+                completed.append(parsed)
+        return completed
+
+    def finish(self) -> List[FunctionCall]:
+        """流结束时返回所有工具调用（按 index 排序），参数不合法的被跳过"""
+        results = []
+        for index in sorted(self._calls):
+            call = self._calls[index]
+            try:
+                arguments = json.loads(call["arguments"] or "{}")
+            except json.JSONDecodeError:
+                print(f"工具 {call['name']} 的参数不是合法 JSON，已跳过：{call['arguments']}")
+                continue
+            results.append(FunctionCall(function_name=call["name"], parameters=arguments))
+        return results
+
+    @staticmethod
+    def _try_complete(call: Dict[str, Any]) -> Optional[FunctionCall]:
+        if call["dispatched"] or not call["name"] or not call["arguments"].rstrip().endswith("}"):
+            return None
+        try:
+            arguments = json.loads(call["arguments"])
+        except json.JSONDecodeError:
+            return None
+        call["dispatched"] = True
+        return FunctionCall(function_name=call["name"], parameters=arguments)
+
+
+class PlannerStreamCollector:
+    """汇总规划阶段的流式输出，并在工具调用闭合时返回，供调用方提前派发"""
+
+    def __init__(self, native: bool):
+        self.native = native
+        self.content_parts: List[str] = []
+        self.reasoning_parts: List[str] = []
+        self._accumulator = ToolCallStreamAccumulator() if native else None
+        self._parser = None if native else FunctionCallsStreamParser()
+
+    def feed(self, delta: Dict[str, Any]) -> List[FunctionCall]:
+        if delta.get("reasoning_content"):
+            self.reasoning_parts.append(delta["reasoning_content"])
+        completed: List[FunctionCall] = []
+        if delta.get("content"):
+            self.content_parts.append(delta["content"])
+            if self._parser is not None:
+                completed.extend(self._parser.feed(delta["content"]))
+        if self._accumulator is not None and delta.get("tool_calls"):
+            completed.extend(self._accumulator.feed(delta["tool_calls"]))
+        return completed
+
+    @property
+    def content(self) -> str:
+        return "".join(self.content_parts)
+
+    @property
+    def reasoning(self) -> Optional[str]:
+        return "".join(self.reasoning_parts) or None
+
+    def tool_calls(self) -> List[FunctionCall]:
+        """原生模式下的完整工具调用列表"""
+        return self._accumulator.finish() if self._accumulator is not None else []
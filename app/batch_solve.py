@@ -0,0 +1,317 @@
+"""
+批量解题：从 JSONL 读取题目，以有限并发送入 MathChain，结果逐条追加写入 JSONL。
+输出文件同时作为断点：重新运行时跳过已完成的题目，崩溃后可直接续跑。
+同一 id 有多条记录时以最后一条为准；--retry-failed 运行结束后会压缩输出文件，每个 id 只保留最后一条记录
+
+输入每行：{"id": "可选，默认行号", "question": "题目", "user_background": "可选", "prompt": "可选，Prompt 名称"}
+（"question" 也可写作 "problem"，"prompt" 也可写作 "prompt_name"）
+
+用法（在 app 目录下）：
+    python batch_solve.py data/homework.jsonl data/homework_answers.jsonl --concurrency 8
+    python batch_solve.py in.jsonl out.jsonl --retry-failed
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from chain.math_chain import MathChain
+from chain.quick_answer import QUICK_ANSWER_MODES
+from entity.ChainContextEntity import StageStatus
+from telemetry.metrics import percentile
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROMPTS_JSONL_FILE_PATH = f"{CURRENT_DIR}/data/prompts.jsonl"
+DEFAULT_BACKGROUND = "教育阶段：高中，数学水平：中等，学习偏好：详细步骤"
+
+
+def load_prompts(file_path: str = PROMPTS_JSONL_FILE_PATH) -> Dict[str, str]:
+    """加载 Prompt 模板（与页面中的模板共用同一文件）"""
+    prompts = {"默认Prompt": ""}
+    if os.path.exists(file_path):
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    prompt_data = json.loads(line)
+                    prompts[prompt_data["name"]] = prompt_data["prompt"]
+    return prompts
+
+
+def load_tasks(file_path: str, default_background: str) -> List[Dict[str, Any]]:
+    """读取输入题目，跳过空行，格式错误的行报错退出"""
+    tasks = []
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"第 {line_no} 行不是合法的 JSON：{str(e)}")
+            question = item.get("question") or item.get("problem")
+            if not question:
+                raise ValueError(f"第 {line_no} 行缺少 question 字段")
+            tasks.append({
+                "id": str(item.get("id", line_no)),
+                "question": question,
+                "user_background": item.get("user_background") or default_background,
+                "prompt_name": item.get("prompt") or item.get("prompt_name") or "默认Prompt"
+            })
+    return tasks
+
+
+def load_records(file_path: str) -> Dict[str, Dict[str, Any]]:
+    """读取已有输出，同一 id 以最后一条记录为准；最后一行写了一半（崩溃）时忽略该行"""
+    records: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(file_path):
+        return records
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records.pop(str(record.get("id")), None)
+            records[str(record.get("id"))] = record
+    return records
+
+
+def load_finished(file_path: str, retry_failed: bool) -> Set[str]:
+    """已完成的题目 id；retry_failed 时只有最后一条记录成功的题目算完成"""
+    return {record_id for record_id, record in load_records(file_path).items()
+            if record.get("status") == "completed" or not retry_failed}
+
+
+def compact_output(file_path: str) -> None:
+    """重写输出文件，每个 id 只保留最后一条记录（按最后写入的顺序）"""
+    records = load_records(file_path)
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for record in records.values():
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, file_path)
+
+
+class ResultWriter:
+    """逐条追加写入结果并刷盘，保证崩溃时已写入的结果完整；刷盘较慢，应在事件循环之外的线程中调用"""
+
+    def __init__(self, file_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        self._file = open(file_path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class Progress:
+    """吞吐量与进度统计"""
+
+    def __init__(self, total: int, report_interval: float):
+        self.total = total
+        self.report_interval = report_interval
+        self.start = time.perf_counter()
+        self.last_report = 0.0
+        self.completed = 0
+        self.failed = 0
+        self.latencies: List[float] = []
+        self.tokens = 0
+
+    def record(self, record: Dict[str, Any]) -> None:
+        if record["status"] == "completed":
+            self.completed += 1
+        else:
+            self.failed += 1
+        self.latencies.append(record["elapsed"])
+        self.tokens += record.get("telemetry", {}).get("prompt_tokens", 0) + \
+            record.get("telemetry", {}).get("completion_tokens", 0)
+
+        now = time.perf_counter()
+        if now - self.last_report >= self.report_interval or self.done == self.total:
+            self.last_report = now
+            print(self.line(), file=sys.stderr)
+
+    @property
+    def done(self) -> int:
+        return self.completed + self.failed
+
+    @property
+    def throughput(self) -> float:
+        elapsed = time.perf_counter() - self.start
+        return self.done / elapsed if elapsed else 0.0
+
+    def line(self) -> str:
+        rate = self.throughput
+        eta = (self.total - self.done) / rate if rate else 0.0
+        return (f"[{self.done}/{self.total}] 成功 {self.completed}，失败 {self.failed}，"
+                f"{rate:.2f} 题/s，预计剩余 {eta:.0f}s")
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.start
+        return {
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "elapsed": elapsed,
+            "throughput": self.done / elapsed if elapsed else 0.0,
+            "latency_p50": percentile(self.latencies, 50),
+            "latency_p95": percentile(self.latencies, 95),
+            "tokens": self.tokens
+        }
+
+
+def plot_files(context, plot_dir: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    工具结果中的图像。内存渲染的图像不随上下文保存，写入 plot_dir（以 plot_key 命名）后记录路径；
+    不引用绘图缓存中的文件，缓存按配额淘汰后路径会失效
+    """
+    plots = []
+    for result in context.tool_results.results if context.tool_results else []:
+        key = result.result.get("plot_key")
+        if not (result.success and key):
+            continue
+        image_format = result.result.get("image_format")
+        path = result.img_path
+        if path is None and result.image is not None and plot_dir:
+            path = os.path.join(plot_dir, f"{key}.{image_format}")
+            try:
+                if not os.path.exists(path):
+                    os.makedirs(plot_dir, exist_ok=True)
+                    with open(f"{path}.tmp", "wb") as f:
+                        f.write(result.image)
+                    os.replace(f"{path}.tmp", path)
+            except OSError as e:
+                print(f"保存图像失败：{str(e)}", file=sys.stderr)
+                path = None
+        plots.append({"plot_key": key, "image_format": image_format, "path": path})
+    return plots
+
+
+def build_record(task: Dict[str, Any], chain: MathChain, context, elapsed: float,
+                 error: Optional[str] = None, plot_dir: Optional[str] = None) -> Dict[str, Any]:
+    """整理一道题的输出记录，字段与页面保存的错题记录保持一致并附带处理信息；会写图像文件，应在线程中调用"""
+    record = {
+        "id": task["id"],
+        "question": task["question"],
+        "user_background": task["user_background"],
+        "prompt_name": task["prompt_name"],
+        "timestamp": datetime.now().isoformat(),
+        "elapsed": elapsed
+    }
+    if context is None:
+        record.update({"status": "error", "answer": None, "error": error})
+        return record
+
+    steps = chain.get_processing_steps(context)
+    ok = context.stage_status("answer_synthesizer") == StageStatus.COMPLETED
+    plots = plot_files(context, plot_dir)
+    record.update({
+        "status": "completed" if ok else "error",
+        "answer": context.final_answer,
+        "error": None if ok else context.stage("answer_synthesizer").error,
+        "img_path": context.metadata.get("img_path") or next((plot["path"] for plot in plots if plot["path"]), None),
+        "plots": plots,
+        "stages": {name: {"status": step["status"], "duration": step["duration"]}
+                   for name, step in steps.items() if name not in ("telemetry", "trace_id")},
+        "tool_summary": context.tool_results.summary if context.tool_results else None,
+        "telemetry": {key: value for key, value in steps["telemetry"].items() if key != "stages"},
+        "trace_id": steps["trace_id"]
+    })
+    return record
+
+
+async def solve_all(tasks: List[Dict[str, Any]], chain: MathChain, prompts: Dict[str, str],
+                    writer: ResultWriter, concurrency: int, report_interval: float,
+                    trace_dir: Optional[str] = None, plot_dir: Optional[str] = None) -> Dict[str, Any]:
+    """concurrency 个 worker 依次领取题目处理，每完成一道立即写出；题库再大也只有 concurrency 个协程"""
+    progress = Progress(len(tasks), report_interval)
+    # 各 worker 共用同一个迭代器领取下一道题（同一事件循环内，无需加锁）
+    queue = iter(tasks)
+
+    async def solve(task: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            context = await chain.aprocess(task["question"], task["user_background"],
+                                           custom_prompt=prompts.get(task["prompt_name"], ""))
+            record = await asyncio.to_thread(build_record, task, chain, context, time.perf_counter() - start,
+                                             plot_dir=plot_dir)
+            if trace_dir and context.trace is not None:
+                await asyncio.to_thread(context.trace.export, os.path.join(trace_dir, f"{task['id']}.trace.json"))
+        except Exception as e:
+            record = build_record(task, chain, None, time.perf_counter() - start, error=str(e))
+        return record
+
+    async def worker() -> None:
+        for task in queue:
+            record = await solve(task)
+            # 刷盘在线程中执行，不阻塞其他题目的请求
+            await asyncio.to_thread(writer.write, record)
+            progress.record(record)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(tasks))))))
+    return progress.summary()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="批量解题：JSONL 输入，JSONL 输出，支持断点续跑")
+    parser.add_argument("input", help="输入 JSONL 文件")
+    parser.add_argument("output", help="输出 JSONL 文件，同时作为断点")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时处理的题目数")
+    parser.add_argument("--api-key", default=os.getenv("DEEPSEEK_API_KEY"), help="DeepSeek 密钥，默认读取 DEEPSEEK_API_KEY")
+    parser.add_argument("--background", default=DEFAULT_BACKGROUND, help="题目未指定 user_background 时使用")
+    parser.add_argument("--quick-answer", choices=QUICK_ANSWER_MODES, default="style")
+    parser.add_argument("--retry-failed", action="store_true", help="重新处理输出中失败的题目")
+    parser.add_argument("--limit", type=int, default=None, help="最多处理的题目数")
+    parser.add_argument("--trace-dir", default=None,
+                        help="按题目导出 Chrome trace JSON 的目录；默认只采样 1%%，全部导出需设置 SMART_TEACHER_TRACE_SAMPLE_RATE=1")
+    parser.add_argument("--plot-dir", default=None,
+                        help="保存题目图像的目录，默认为输出文件同名的 _plots 目录")
+    parser.add_argument("--report-interval", type=float, default=5.0, help="进度输出间隔（秒）")
+    args = parser.parse_args()
+
+    tasks = load_tasks(args.input, args.background)
+    finished = load_finished(args.output, args.retry_failed)
+    pending = [task for task in tasks if task["id"] not in finished]
+    skipped = len(tasks) - len(pending)
+    if args.limit is not None:
+        pending = pending[:args.limit]
+
+    prompts = load_prompts()
+    unknown = {task["prompt_name"] for task in pending} - prompts.keys()
+    if unknown:
+        print(f"未找到 Prompt：{', '.join(sorted(unknown))}，将使用默认 Prompt", file=sys.stderr)
+
+    print(f"共 {len(tasks)} 题，已完成 {skipped} 题，本次处理 {len(pending)} 题", file=sys.stderr)
+    if not pending:
+        return
+
+    chain = MathChain(args.api_key, quick_answer=args.quick_answer)
+    writer = ResultWriter(args.output)
+    try:
+        plot_dir = args.plot_dir or f"{os.path.splitext(args.output)[0]}_plots"
+        summary = asyncio.run(solve_all(pending, chain, prompts, writer, args.concurrency,
+                                         args.report_interval, args.trace_dir, plot_dir))
+    finally:
+        writer.close()
+        if args.retry_failed:
+            compact_output(args.output)
+
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
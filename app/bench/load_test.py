@@ -0,0 +1,154 @@
+"""
+MathChain 并发压测：N 个并发 MathChain.process 请求打到本地模拟服务，
+统计吞吐量以及各阶段（策略规划 / 工具执行 / 答案整合 / 端到端）的 p50/p95/p99
+
+用法（在 app 目录下）：
+    python -m bench.load_test --requests 200 --concurrency 32 --latency lognormal:0.5,0.4
+    python -m bench.load_test --base-url http://127.0.0.1:8765 --requests 100
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from bench.mock_llm_server import MockConfig, run_mock_server
+from entity.ChainContextEntity import StageStatus
+from telemetry.metrics import percentile
+
+EXAMPLE_PROBLEMS = [
+    "计算 (2+3)×4-5²",
+    "解方程 x² - 5x + 6 = 0",
+    "分析函数 f(x) = x² - 4x + 3 的图像特征",
+    "求导数 d/dx(x³ + 2x² - x + 1)"
+]
+USER_BACKGROUND = "教育阶段：高中，数学水平：中等，学习偏好：详细步骤"
+STAGES = ["strategy_planner", "tool_executor", "answer_synthesizer", "total"]
+
+
+def run_one(chain, index: int, stream: bool) -> Dict[str, Any]:
+    """执行一次完整的 MathChain 请求，返回各阶段耗时"""
+    problem = EXAMPLE_PROBLEMS[index % len(EXAMPLE_PROBLEMS)]
+    start = time.perf_counter()
+    if stream:
+        context = None
+        for event in chain.process_stream(problem, USER_BACKGROUND):
+            if event["type"] == "done":
+                context = event["context"]
+    else:
+        context = chain.process(problem, USER_BACKGROUND)
+    total = time.perf_counter() - start
+
+    timings = context.stage_timings()
+    timings["total"] = total
+    return {
+        "timings": timings,
+        "ok": context.stage_status("answer_synthesizer") == StageStatus.COMPLETED,
+        "tool_ok": context.stage_status("tool_executor") in (StageStatus.COMPLETED, StageStatus.SKIPPED)
+    }
+
+
+def run_load(requests: int, concurrency: int, stream: bool = False, coalesce: bool = False) -> Dict[str, Any]:
+    """以给定并发度执行压测并汇总结果；coalesce 为 False 时每个请求都完整执行，便于测量处理链本身"""
+    from chain.math_chain import MathChain
+    from chain.single_flight import single_flight
+
+    chain = MathChain("mock-key", coalesce=coalesce)
+    results: List[Dict[str, Any]] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(run_one, chain, i, stream) for i in range(requests)]
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+                with lock:
+                    results.append(result)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+    elapsed = time.perf_counter() - start
+
+    stages = {}
+    for stage in STAGES:
+        values = [r["timings"][stage] for r in results if stage in r["timings"]]
+        stages[stage] = {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99)
+        }
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "stream": stream,
+        "elapsed": elapsed,
+        "throughput": len(results) / elapsed if elapsed else 0.0,
+        "succeeded": sum(1 for r in results if r["ok"]),
+        "tool_failures": sum(1 for r in results if not r["tool_ok"]),
+        "exceptions": len(errors),
+        "stages": stages,
+        "single_flight": single_flight.stats() if coalesce else None
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"请求数 {report['requests']}，并发 {report['concurrency']}，流式 {report['stream']}")
+    print(f"总耗时 {report['elapsed']:.2f}s，吞吐量 {report['throughput']:.2f} req/s")
+    print(f"成功 {report['succeeded']}，工具失败 {report['tool_failures']}，异常 {report['exceptions']}")
+    print(f"{'阶段':<20}{'次数':>6}{'p50(s)':>10}{'p95(s)':>10}{'p99(s)':>10}")
+    for stage, stats in report["stages"].items():
+        def fmt(value: Optional[float]) -> str:
+            return f"{value:.3f}" if value is not None else "-"
+        print(f"{stage:<20}{stats['count']:>6}{fmt(stats['p50']):>10}{fmt(stats['p95']):>10}{fmt(stats['p99']):>10}")
+    if report["single_flight"]:
+        flight = report["single_flight"]
+        print(f"请求合并：执行 {flight['executions']} 次，合并 {flight['coalesced']} 次，"
+              f"节省 LLM 调用 {flight['saved_llm_calls']} 次、工具调用 {flight['saved_tool_calls']} 次、"
+              f"{flight['saved_tokens']} tokens")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="MathChain 并发压测")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stream", action="store_true", help="使用流式答案整合")
+    parser.add_argument("--coalesce", action="store_true", help="合并同时提交的相同题目（single-flight）")
+    parser.add_argument("--base-url", default=None, help="已启动的模拟服务地址，不指定时在进程内启动")
+    parser.add_argument("--latency", default="lognormal:0.3,0.4")
+    parser.add_argument("--reasoner-latency", default="lognormal:1.0,0.5")
+    parser.add_argument("--token-interval", type=float, default=0.002)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        config = MockConfig(args.latency, args.reasoner_latency, args.token_interval, args.error_rate)
+        server, base_url = run_mock_server(config=config)
+    os.environ["DEEPSEEK_BASE_URL"] = base_url
+
+    # 以文件输出（SMART_TEACHER_PLOT_OUTPUT=file）的绘图写在当前目录，压测期间切换到临时目录
+    os.chdir(tempfile.mkdtemp(prefix="smart_teacher_bench_"))
+
+    try:
+        report = run_load(args.requests, args.concurrency, args.stream, args.coalesce)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+本地 OpenAI 兼容的模拟 LLM 服务，用于压测，不消耗真实额度
+
+支持 /chat/completions（流式与非流式、tool_calls、reasoning_content）和 /models，
+可配置首token延迟分布、流式分块间隔与错误注入。
+
+用法（在 app 目录下）：
+    python -m bench.mock_llm_server --port 8765 --latency lognormal:0.8,0.5 --error-rate 0.02
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8765 streamlit run main.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class LatencyModel:
+    """
+    延迟分布，格式：
+    - fixed:0.5            固定 0.5 秒
+    - uniform:0.2,1.5      均匀分布
+    - lognormal:0.8,0.5    对数正态分布（中位数, sigma）
+    """
+
+    def __init__(self, spec: str = "fixed:0"):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"未知延迟分布: {spec}")
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.params[0] if self.params else 0.0
+        if self.kind == "uniform":
+            return random.uniform(self.params[0], self.params[1])
+        median, sigma = self.params
+        return random.lognormvariate(0, sigma) * median
+
+
+class MockConfig:
+    def __init__(self, latency: str = "fixed:0.2", reasoner_latency: Optional[str] = None,
+                 token_interval: float = 0.005, error_rate: float = 0.0, error_status: int = 500,
+                 hang_rate: float = 0.0, hang_seconds: float = 300.0):
+        """
+        Args:
+            latency: deepseek-chat 等普通模型的首token延迟分布
+            reasoner_latency: deepseek-reasoner 的首token延迟分布，默认同 latency
+            token_interval: 流式分块之间的间隔（秒）
+            error_rate: 返回错误状态码的概率
+            error_status: 注入错误时的状态码（如 500、429）
+            hang_rate: 长时间不响应的概率，用于验证超时
+            hang_seconds: 不响应的时长
+        """
+        self.latency = LatencyModel(latency)
+        self.reasoner_latency = LatencyModel(reasoner_latency or latency)
+        self.token_interval = token_interval
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def count(self, error: bool = False) -> None:
+        with self._lock:
+            self.requests += 1
+            self.errors += 1 if error else 0
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 2)
+
+
+def _plan_for(problem: str) -> List[Dict[str, Any]]:
+    """根据问题关键词生成工具调用计划"""
+    if "方程" in problem:
+        return [{"function_name": "solve_equation",
+                 "parameters": {"equation": "x**2 - 5*x + 6 = 0", "variable": "x"},
+                 "reason": "求方程的根"}]
+    if "函数" in problem or "图像" in problem:
+        return [
+            {"function_name": "plot_function",
+             "parameters": {"function": "x**2 - 4*x + 3", "x_range": [-2, 6]},
+             "reason": "分析函数特征"},
+            {"function_name": "draw_plot",
+             "parameters": {"plot_type": "function", "functions": ["x**2 - 4*x + 3"], "x_range": [-2, 6]},
+             "reason": "绘制函数图像"}
+        ]
+    if "导数" in problem:
+        return [{"function_name": "plot_function",
+                 "parameters": {"function": "x**3 + 2*x**2 - x + 1"},
+                 "reason": "求导数"}]
+    return [{"function_name": "calculate_expression",
+             "parameters": {"expression": "(2+3)*4-5**2"},
+             "reason": "计算表达式"}]
+
+
+def build_reply(body: Dict[str, Any]) -> Dict[str, Any]:
+    """按请求内容生成模拟回复：content / reasoning_content / tool_calls"""
+    model = body.get("model", "")
+    messages = body.get("messages", [])
+    user_text = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    system_text = "\n".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+    problem = re.sub(r"^请分析这个数学问题：", "", user_text) or system_text
+
+    plan = _plan_for(problem)
+    reply: Dict[str, Any] = {"content": "", "reasoning_content": None, "tool_calls": None}
+
+    if body.get("tools"):
+        reply["content"] = f"分析：这是一个关于「{problem[:20]}」的问题，需要借助工具精确求解。"
+        reply["tool_calls"] = [{
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {"name": call["function_name"],
+                         "arguments": json.dumps(call["parameters"], ensure_ascii=False)}
+        } for call in plan]
+    elif "need_function" in system_text:
+        reply["content"] = json.dumps({
+            "need_function": True,
+            "function_calls": plan,
+            "analysis": f"分析：这是一个关于「{problem[:20]}」的问题，需要借助工具精确求解。"
+        }, ensure_ascii=False, indent=2)
+    else:
+        reply["content"] = (
+            "### 解答\n\n"
+            "1. 根据题意整理已知条件。\n"
+            "2. 结合工具计算结果：$x = 2$ 或 $x = 3$。\n"
+            "3. 检验结果满足原题。\n\n"
+            "**学习建议：** 多练习因式分解与配方法。"
+        )
+
+    if model == "deepseek-reasoner":
+        reply["reasoning_content"] = "先回顾相关知识点，再逐步推导，最后整合工具结果并检查。" * 3
+
+    return reply
+
+
+def _usage(body: Dict[str, Any], reply: Dict[str, Any]) -> Dict[str, Any]:
+    prompt_tokens = sum(_estimate_tokens(m.get("content") or "") for m in body.get("messages", []))
+    reasoning_tokens = _estimate_tokens(reply["reasoning_content"]) if reply["reasoning_content"] else 0
+    completion_tokens = _estimate_tokens(reply["content"]) + reasoning_tokens
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_cache_hit_tokens": 0,
+        "prompt_cache_miss_tokens": prompt_tokens,
+        "completion_tokens_details": {"reasoning_tokens": reasoning_tokens}
+    }
+
+
+def _split(text: str, size: int = 8) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: MockConfig = MockConfig()
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [
+                {"id": "deepseek-chat", "object": "model", "owned_by": "mock"},
+                {"id": "deepseek-reasoner", "object": "model", "owned_by": "mock"}
+            ]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        config = self.config
+        if random.random() < config.error_rate:
+            config.count(error=True)
+            self._send_json(config.error_status, {"error": {"message": "injected error", "type": "mock"}})
+            return
+        config.count()
+
+        if random.random() < config.hang_rate:
+            time.sleep(config.hang_seconds)
+
+        model = body.get("model", "deepseek-chat")
+        latency = config.reasoner_latency if model == "deepseek-reasoner" else config.latency
+        time.sleep(latency.sample())
+
+        reply = build_reply(body)
+        if body.get("stream"):
+            self._stream(body, reply)
+        else:
+            self._complete(body, reply)
+
+    def _complete(self, body: Dict[str, Any], reply: Dict[str, Any]) -> None:
+        message: Dict[str, Any] = {"role": "assistant", "content": reply["content"]}
+        if reply["reasoning_content"]:
+            message["reasoning_content"] = reply["reasoning_content"]
+        if reply["tool_calls"]:
+            message["tool_calls"] = reply["tool_calls"]
+
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if reply["tool_calls"] else "stop"
+            }],
+            "usage": _usage(body, reply)
+        })
+
+    def _stream(self, body: Dict[str, Any], reply: Dict[str, Any]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        def emit(delta: Dict[str, Any], finish_reason: Optional[str] = None,
+                 usage: Optional[Dict[str, Any]] = None, with_choice: bool = True) -> None:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if with_choice else [],
+            }
+            if usage is not None:
+                payload["usage"] = usage
+            self._write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n")
+
+        emit({"role": "assistant", "content": ""})
+        for piece in _split(reply["reasoning_content"] or ""):
+            emit({"reasoning_content": piece, "content": None})
+            time.sleep(self.config.token_interval)
+        for piece in _split(reply["content"]):
+            emit({"content": piece})
+            time.sleep(self.config.token_interval)
+        for index, call in enumerate(reply["tool_calls"] or []):
+            emit({"tool_calls": [{"index": index, "id": call["id"], "type": "function",
+                                  "function": {"name": call["function"]["name"], "arguments": ""}}]})
+            for piece in _split(call["function"]["arguments"], 16):
+                emit({"tool_calls": [{"index": index, "function": {"arguments": piece}}]})
+                time.sleep(self.config.token_interval)
+
+        emit({}, finish_reason="tool_calls" if reply["tool_calls"] else "stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            emit({}, usage=_usage(body, reply), with_choice=False)
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def run_mock_server(host: str = "127.0.0.1", port: int = 0,
+                    config: Optional[MockConfig] = None) -> Tuple[ThreadingHTTPServer, str]:
+    """在后台线程启动模拟服务，返回 (server, base_url)；port 为 0 时自动分配端口"""
+    handler = type("ConfiguredMockLLMHandler", (MockLLMHandler,), {"config": config or MockConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容模拟 LLM 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="fixed:0.2", help="首token延迟分布")
+    parser.add_argument("--reasoner-latency", default=None, help="deepseek-reasoner 的首token延迟分布")
+    parser.add_argument("--token-interval", type=float, default=0.005, help="流式分块间隔（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="错误注入概率")
+    parser.add_argument("--error-status", type=int, default=500, help="注入错误的状态码")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="长时间不响应的概率")
+    args = parser.parse_args()
+
+    config = MockConfig(args.latency, args.reasoner_latency, args.token_interval,
+                        args.error_rate, args.error_status, args.hang_rate)
+    server, base_url = run_mock_server(args.host, args.port, config)
+    print(f"模拟服务已启动：{base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,33 @@
+from typing import Any, Dict, Iterator, List, Optional
+
 from chain.base_handler import BaseHandler, ChainContext
+from chain.quick_answer import QUICK_ANSWER_MODES, try_quick_answer
+from entity.ChainContextEntity import StageStatus
 from providers.Deepseek import DeepSeekChat
+from providers.ProvidersBase import AbstractChat
+from telemetry.metrics import llm_call_scope
 
 
 class AnswerSynthesizer(BaseHandler):
     """答案整合处理器 - 整合所有信息生成最终答案"""
+
+    name = "answer_synthesizer"
+    inputs = ("problem", "user_background", "custom_prompt", "strategy_plan", "tool_results")
+    outputs = ("final_answer",)
     
-    def __init__(self, api_key:str = None, model: str = "deepseek-reasoner", custom_prompt: str = ""):
+    def __init__(self, api_key:str = None, model: str = "deepseek-reasoner", custom_prompt: str = "",
+                 chat: Optional[AbstractChat] = None, quick_answer: str = "style"):
+        """
+        Args:
+            custom_prompt: 默认附加要求，请求上下文中的 custom_prompt 优先
+            chat: 可注入任意 AbstractChat（如 RouterChat），默认使用 DeepSeek
+            quick_answer: 快速解答模式 off / style / always，命中时用模板生成答案，不调用模型
+        """
         super().__init__()
-        self.chat = DeepSeekChat(api_key=api_key, model=model)
+        if quick_answer not in QUICK_ANSWER_MODES:
+            raise ValueError(f"quick_answer 必须是 {', '.join(QUICK_ANSWER_MODES)} 之一")
+        self.chat = chat or DeepSeekChat(api_key=api_key, model=model)
+        self.quick_answer = quick_answer
         base_prompt = f"""你已经获得了以下信息：
 1. 问题分析和解决策略
 2. 工具计算结果（如果有）
@@ -22,11 +42,121 @@ class AnswerSynthesizer(BaseHandler):
 - 请用 $ 包裹latex语句"""
         
         self.answer_synthesizer_prompt = base_prompt
+        self.custom_prompt = custom_prompt
+
+    def _system_prompt(self, context: ChainContext) -> str:
+        """基础 Prompt 加上本次请求的附加要求（处理器可被多个请求共享，不保存请求状态）"""
+        custom_prompt = context.custom_prompt or self.custom_prompt
         if custom_prompt and custom_prompt.strip():
-            self.answer_synthesizer_prompt += f"\n\n附加要求：\n{custom_prompt}"
+            return f"{self.answer_synthesizer_prompt}\n\n附加要求：\n{custom_prompt}"
+        return self.answer_synthesizer_prompt
     
+    def reset(self, context: ChainContext) -> None:
+        super().reset(context)
+        context.metadata.pop("answer_source", None)
+        context.metadata.pop("reasoning", None)
+
+    def _try_quick_answer(self, context: ChainContext) -> bool:
+        """简单题目直接用模板生成答案，命中时返回 True"""
+        answer = try_quick_answer(context, self.quick_answer)
+        if answer is None:
+            return False
+        context.final_answer = answer
+        context.metadata["answer_source"] = "template"
+        context.set_status(self.name, StageStatus.COMPLETED)
+        return True
+
     def _process(self, context: ChainContext) -> ChainContext:
         """整合所有信息生成最终答案"""
+        if self._try_quick_answer(context):
+            return context
+
+        try:
+            # 调用API生成最终答案
+            messages = self._build_messages(context)
+            
+            with llm_call_scope(context.metadata.setdefault("llm_calls", []), "answer_synthesizer"):
+                response = self.chat.call_api(messages, stream=False)
+            self._apply_response(context, response)
+            
+        except Exception as e:
+            self._fail(context, e)
+        
+        return context
+
+    async def _aprocess(self, context: ChainContext) -> ChainContext:
+        """异步整合所有信息生成最终答案"""
+        if self._try_quick_answer(context):
+            return context
+
+        try:
+            messages = self._build_messages(context)
+
+            with llm_call_scope(context.metadata.setdefault("llm_calls", []), "answer_synthesizer"):
+                response = await self.chat.acall_api(messages, stream=False)
+            self._apply_response(context, response)
+
+        except Exception as e:
+            self._fail(context, e)
+
+        return context
+
+    def _fail(self, context: ChainContext, e: Exception) -> None:
+        context.final_answer = f"生成最终答案时出现错误：{str(e)}"
+        context.set_status(self.name, StageStatus.ERROR, str(e))
+
+    def _apply_response(self, context: ChainContext, response: Any) -> None:
+        """将模型响应写入上下文"""
+        parsed_response = self.chat._parse_response(response)
+        
+        context.final_answer = parsed_response.get("content")
+        context.metadata["answer_source"] = "llm"
+        context.set_status(self.name, StageStatus.COMPLETED)
+        
+        # 如果有推理内容，也保存
+        if parsed_response.get("reasoning_content"):
+            context.metadata["reasoning"] = parsed_response["reasoning_content"]
+
+    def stream(self, context: ChainContext) -> Iterator[Dict[str, Any]]:
+        """流式整合答案：逐块产出推理/正文增量，结束后写回 context 并记录阶段状态与耗时"""
+        with self._running(context, stream=True):
+            yield from self._stream(context)
+
+    def _stream(self, context: ChainContext) -> Iterator[Dict[str, Any]]:
+        if self._try_quick_answer(context):
+            yield {"type": "content", "delta": context.final_answer}
+            return
+
+        content_parts: List[str] = []
+        reasoning_parts: List[str] = []
+
+        try:
+            messages = self._build_messages(context)
+
+            with llm_call_scope(context.metadata.setdefault("llm_calls", []), "answer_synthesizer"):
+                for delta in self.chat.stream_api(messages):
+                    if delta.get("reasoning_content"):
+                        reasoning_parts.append(delta["reasoning_content"])
+                        yield {"type": "reasoning", "delta": delta["reasoning_content"]}
+                    if delta.get("content"):
+                        content_parts.append(delta["content"])
+                        yield {"type": "content", "delta": delta["content"]}
+
+            context.final_answer = "".join(content_parts)
+            context.metadata["answer_source"] = "llm"
+            context.set_status(self.name, StageStatus.COMPLETED)
+
+        except Exception as e:
+            error_message = f"生成最终答案时出现错误：{str(e)}"
+            yield {"type": "content", "delta": f"\n\n{error_message}"}
+            context.final_answer = "".join(content_parts) + f"\n\n{error_message}"
+            context.set_status(self.name, StageStatus.ERROR, str(e))
+
+        if reasoning_parts:
+            context.metadata["reasoning"] = "".join(reasoning_parts)
+
+    def _build_messages(self, context: ChainContext) -> List[Dict[str, str]]:
+        """构建发送给模型的消息列表"""
         
         # 构建完整的上下文信息
         context_info = self._build_context_info(context)
@@ -41,38 +171,27 @@ class AnswerSynthesizer(BaseHandler):
 请为学生提供完整的解答和指导。
 """
 
-        try:
-            # 调用API生成最终答案
-            messages = [
-                {"role": "system", "content": self.answer_synthesizer_prompt},
-                {"role": "system", "content": user_message}
-            ]
+        system_prompt = self._system_prompt(context)
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": user_message}
+        ]
 
-            chat_history = context.metadata["chat_history"]
+        chat_history = context.metadata.get("chat_history")
 
-            if chat_history:
-                messages.append({"role": "user", "content": chat_history["question"]})
-                messages.append({"role": "assistant", "content": chat_history["answer"]})
+        # main.py 传入的是对话列表，兼容单条字典
+        if isinstance(chat_history, dict):
+            chat_history = [chat_history]
 
-            print(f"final prompt:\n {self.answer_synthesizer_prompt}")
-            print(f"first user message:\n {user_message}")
-            # print(f"final messages:\n {messages}")
-            
-            response = self.chat.call_api(messages, stream=False)
-            parsed_response = self.chat._parse_response(response)
-            
-            context.final_answer = parsed_response.get("content")
-            context.metadata["answer_synthesizer"] = "completed"
-            
-            # 如果有推理内容，也保存
-            if parsed_response.get("reasoning_content"):
-                context.metadata["reasoning"] = parsed_response["reasoning_content"]
-            
-        except Exception as e:
-            context.final_answer = f"生成最终答案时出现错误：{str(e)}"
-            context.metadata["answer_synthesizer"] = "error"
-        
-        return context
+        for conv in chat_history or []:
+            messages.append({"role": "user", "content": conv["question"]})
+            messages.append({"role": "assistant", "content": conv["answer"]})
+
+        print(f"final prompt:\n {system_prompt}")
+        print(f"first user message:\n {user_message}")
+        # print(f"final messages:\n {messages}")
+
+        return messages
     
     def _build_context_info(self, context: ChainContext) -> str:
         """构建上下文信息字符串"""
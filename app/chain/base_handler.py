@@ -1,45 +1,243 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
 
-from entity.ChainContextEntity import ToolResults, StrategyPlan
+from entity.ChainContextEntity import FunctionCall, StageState, StageStatus, ToolResults, StrategyPlan
+from telemetry.tracing import Span, Trace, span
+from tools.plot_store import plot_store
 
 
 class ChainContext:
     """责任链上下文，用于在处理器之间传递数据"""
-    def __init__(self, problem: str, user_background: str):
+    def __init__(self, problem: str, user_background: str, custom_prompt: str = ""):
+        self.context_id = uuid.uuid4().hex[:16]
         self.problem = problem
         self.user_background = user_background
+        # 本次请求的附加 Prompt 要求，由答案整合阶段使用
+        self.custom_prompt = custom_prompt
         # self.strategy_plan: Optional[Dict[str, Any]] = None
         self.strategy_plan: Optional[StrategyPlan] = None
         # self.tool_results: Optional[Dict[str, Any]] = None
         self.tool_results: Optional[ToolResults] = None
         self.final_answer: Optional[str] = None
         self.metadata: Dict[str, Any] = {}
+        # 各处理阶段的状态与耗时
+        self.stages: Dict[str, StageState] = {}
+        # 策略规划流式输出期间提前派发的工具调用及其执行结果（仅运行期使用）
+        self.pending_tools: List[Tuple[FunctionCall, Future]] = []
+        # 本次请求的追踪记录，未被采样时为 None（仅运行期使用）
+        self.trace: Optional[Trace] = None
+        # 阶段结束时的快照写出回调 (context, stage, snapshot)，未设置时不序列化（仅运行期使用）
+        self.on_checkpoint: Optional[Callable[['ChainContext', str, str], None]] = None
+        self._checkpoint_lock = threading.Lock()
+
+    def stage(self, name: str) -> StageState:
+        return self.stages.setdefault(name, StageState())
+
+    def set_status(self, name: str, status: StageStatus, error: Optional[str] = None) -> None:
+        state = self.stage(name)
+        state.status = status
+        if error is not None:
+            state.error = error
+
+    def stage_status(self, name: str) -> StageStatus:
+        return self.stages[name].status if name in self.stages else StageStatus.NOT_STARTED
+
+    def stage_timings(self) -> Dict[str, float]:
+        """各阶段耗时（秒）"""
+        return {name: state.duration for name, state in self.stages.items() if state.duration is not None}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """可序列化的上下文内容，不包含提前派发的工具调用、追踪记录和图像字节等运行期状态"""
+        return {
+            "context_id": self.context_id,
+            "problem": self.problem,
+            "user_background": self.user_background,
+            "custom_prompt": self.custom_prompt,
+            "strategy_plan": self.strategy_plan.model_dump() if self.strategy_plan else None,
+            # 内存渲染的图像字节体积大，不写入快照
+            "tool_results": self.tool_results.model_dump(exclude={"results": {"__all__": {"image"}}})
+            if self.tool_results else None,
+            "final_answer": self.final_answer,
+            "metadata": self.metadata,
+            "stages": {name: state.model_dump(mode="json") for name, state in self.stages.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ChainContext':
+        context = cls(data["problem"], data["user_background"], custom_prompt=data.get("custom_prompt", ""))
+        context.context_id = data.get("context_id") or context.context_id
+        if data.get("strategy_plan"):
+            context.strategy_plan = StrategyPlan.model_validate(data["strategy_plan"])
+        if data.get("tool_results"):
+            context.tool_results = ToolResults.model_validate(data["tool_results"])
+        context.final_answer = data.get("final_answer")
+        context.metadata = dict(data.get("metadata") or {})
+        context.stages = {name: StageState.model_validate(state) for name, state in (data.get("stages") or {}).items()}
+        return context
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"), default=str)
+
+    @classmethod
+    def from_json(cls, data: str) -> 'ChainContext':
+        return cls.from_dict(json.loads(data))
+
+    @property
+    def checkpoint(self) -> str:
+        """当前上下文的序列化快照，按需生成"""
+        with self._checkpoint_lock:
+            return self.to_json()
+
+    def save_checkpoint(self, stage: str) -> Optional[str]:
+        """阶段结束后把快照交给 on_checkpoint 写出；未设置写出回调时不序列化，返回 None"""
+        if self.on_checkpoint is None:
+            return None
+        # 并发执行的阶段可能同时结束，串行化以免快照交错
+        with self._checkpoint_lock:
+            snapshot = self.to_json()
+            self.on_checkpoint(self, stage, snapshot)
+            return snapshot
+
+    def restore_images(self) -> None:
+        """快照不含图像字节，按结果中的 plot_key 从绘图缓存补回内存渲染的图像（已被淘汰的保持为空）"""
+        if not self.tool_results:
+            return
+        for result in self.tool_results.results:
+            plot_key, image_format = result.result.get("plot_key"), result.result.get("image_format")
+            if result.image is not None or result.img_path or not (result.success and plot_key and image_format):
+                continue
+            result.image = plot_store.get(plot_key, image_format)
+            if result.image is not None:
+                result.image_format = image_format
 
 
 class BaseHandler(ABC):
-    """责任链处理器基类"""
-    
+    """
+    处理器基类。处理器声明读取（inputs）与写入（outputs）的 ChainContext 字段，
+    既可以用 set_next 串成责任链，也可以交给 ChainDAG 按依赖关系并发调度
+    """
+
+    # 处理阶段名，用于记录状态与耗时
+    name: str = "handler"
+    # 读取的 ChainContext 字段
+    inputs: Tuple[str, ...] = ()
+    # 写入的 ChainContext 字段
+    outputs: Tuple[str, ...] = ()
+
     def __init__(self):
         self._next_handler: Optional[BaseHandler] = None
-    
-    def set_next(self, handler: 'BaseHandler') -> 'BaseHandler':
+
+    def set_next(self, handler: Optional['BaseHandler']) -> Optional['BaseHandler']:
         """设置下一个处理器"""
         self._next_handler = handler
         return handler
-    
+
     def handle(self, context: ChainContext) -> ChainContext:
         """处理请求"""
         # 执行当前处理器的逻辑
-        context = self._process(context)
-        
+        context = self.run(context)
+
         # 如果有下一个处理器，继续传递
         if self._next_handler:
             return self._next_handler.handle(context)
-        
+
+        return context
+
+    async def ahandle(self, context: ChainContext) -> ChainContext:
+        """异步处理请求"""
+        context = await self.arun(context)
+
+        if self._next_handler:
+            return await self._next_handler.ahandle(context)
+
+        return context
+
+    def run(self, context: ChainContext) -> ChainContext:
+        """执行本处理器（不传递给下一个），维护阶段状态与耗时"""
+        if self._skipped(context):
+            return context
+
+        with self._running(context):
+            context = self._process(context)
         return context
-    
+
+    async def arun(self, context: ChainContext) -> ChainContext:
+        """run 的异步版本"""
+        if self._skipped(context):
+            return context
+
+        with self._running(context):
+            context = await self._aprocess(context)
+        return context
+
+    def _skipped(self, context: ChainContext) -> bool:
+        if self.should_run(context):
+            return False
+        self.on_skip(context)
+        context.set_status(self.name, StageStatus.SKIPPED)
+        context.save_checkpoint(self.name)
+        return True
+
+    @contextmanager
+    def _running(self, context: ChainContext, **span_fields) -> Iterator[None]:
+        """阶段执行的公共前后处理：状态、耗时、追踪 span 与快照；处理逻辑的异常记为阶段错误"""
+        context.set_status(self.name, StageStatus.RUNNING)
+        context.stage(self.name).started_at = time.time()
+        start = time.perf_counter()
+        with span(self.name, "handler", **span_fields) as current:
+            try:
+                yield
+            except Exception as e:
+                context.set_status(self.name, StageStatus.ERROR, str(e))
+            finally:
+                self._finish(context, start)
+                self._annotate(context, current)
+        context.save_checkpoint(self.name)
+
+    def reset(self, context: ChainContext) -> None:
+        """清除本阶段的输出、状态和模型调用记录，用于从本阶段重新执行"""
+        for field in self.outputs:
+            setattr(context, field, None)
+        context.stages.pop(self.name, None)
+        llm_calls = context.metadata.get("llm_calls")
+        if llm_calls:
+            context.metadata["llm_calls"] = [call for call in llm_calls if call.get("stage") != self.name]
+
+    def _finish(self, context: ChainContext, start: float) -> None:
+        self.record_timing(context, time.perf_counter() - start)
+        # 处理器自身未标记为出错/跳过时视为完成
+        if context.stage_status(self.name) == StageStatus.RUNNING:
+            context.set_status(self.name, StageStatus.COMPLETED)
+
+    def _annotate(self, context: ChainContext, current: Optional[Span]) -> None:
+        if current is not None:
+            state = context.stage(self.name)
+            current.set(status=state.status.value, error=state.error)
+
+    def should_run(self, context: ChainContext) -> bool:
+        """返回 False 时跳过本阶段"""
+        return True
+
+    def on_skip(self, context: ChainContext) -> None:
+        """跳过本阶段时写入默认输出"""
+        pass
+
+    def record_timing(self, context: ChainContext, seconds: float) -> None:
+        """记录本阶段耗时"""
+        context.stage(self.name).duration = seconds
+
     @abstractmethod
     def _process(self, context: ChainContext) -> ChainContext:
         """具体的处理逻辑，由子类实现"""
         pass
+
+    async def _aprocess(self, context: ChainContext) -> ChainContext:
+        """异步处理逻辑，默认在线程中执行 _process，涉及网络IO的子类应覆盖"""
+        return await asyncio.to_thread(self._process, context)
@@ -0,0 +1,112 @@
+import asyncio
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Set
+
+from chain.base_handler import BaseHandler, ChainContext
+
+# 进程级线程池，各请求的 DAG 节点共用
+_node_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="chain-node")
+
+
+class ChainDAG:
+    """
+    按处理器声明的 inputs / outputs 构建依赖图：节点依赖于写入其输入字段的节点，
+    没有依赖关系的节点并发执行（同步版本使用线程池，异步版本使用事件循环）
+    """
+
+    def __init__(self, handlers: List[BaseHandler]):
+        names = [handler.name for handler in handlers]
+        if len(set(names)) != len(names):
+            raise ValueError(f"处理器名称重复：{names}")
+
+        self.handlers: Dict[str, BaseHandler] = {handler.name: handler for handler in handlers}
+
+        producers: Dict[str, str] = {}
+        for handler in handlers:
+            for field in handler.outputs:
+                if field in producers:
+                    raise ValueError(f"字段 {field} 同时由 {producers[field]} 和 {handler.name} 写入")
+                producers[field] = handler.name
+
+        # 依赖：写入本节点输入字段的节点
+        self.dependencies: Dict[str, Set[str]] = {
+            handler.name: {producers[field] for field in handler.inputs
+                           if field in producers and producers[field] != handler.name}
+            for handler in handlers
+        }
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order: List[str] = []
+        remaining = {name: set(deps) for name, deps in self.dependencies.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"处理器之间存在循环依赖：{sorted(remaining)}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+    def downstream(self, name: str) -> List[str]:
+        """name 及所有直接或间接依赖它的节点，按拓扑顺序返回"""
+        if name not in self.handlers:
+            raise ValueError(f"未知的处理阶段：{name}，可选：{', '.join(self.order)}")
+        affected = {name}
+        for node in self.order:
+            if self.dependencies[node] & affected:
+                affected.add(node)
+        return [node for node in self.order if node in affected]
+
+    def _ready(self, done: Set[str], started: Set[str]) -> List[str]:
+        return [name for name in self.order
+                if name not in started and self.dependencies[name] <= done]
+
+    def run(self, context: ChainContext) -> ChainContext:
+        """同步执行：就绪节点提交到线程池，任一节点完成后调度其后继"""
+        done: Set[str] = set()
+        started: Set[str] = set()
+        running: Dict[Future, str] = {}
+
+        while len(done) < len(self.order):
+            ready = self._ready(done, started)
+            if len(ready) == 1 and not running:
+                # 只有一个可执行节点时直接在当前线程执行，省去线程切换
+                started.add(ready[0])
+                self.handlers[ready[0]].run(context)
+                done.add(ready[0])
+                continue
+
+            for name in ready:
+                started.add(name)
+                # 每个节点在调用方上下文的副本中执行，保留 ContextVar（如调用记录）
+                node_context = contextvars.copy_context()
+                running[_node_pool.submit(node_context.run, self.handlers[name].run, context)] = name
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                future.result()
+                done.add(running.pop(future))
+
+        return context
+
+    async def arun(self, context: ChainContext) -> ChainContext:
+        """异步执行：就绪节点作为任务并发运行"""
+        done: Set[str] = set()
+        started: Set[str] = set()
+        running: Dict[asyncio.Task, str] = {}
+
+        while len(done) < len(self.order):
+            for name in self._ready(done, started):
+                started.add(name)
+                running[asyncio.ensure_future(self.handlers[name].arun(context))] = name
+
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                task.result()
+                done.add(running.pop(task))
+
+        return context
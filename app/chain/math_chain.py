@@ -1,54 +1,254 @@
-from typing import Dict, Any, List
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
 
 from chain.base_handler import ChainContext
+from chain.dag_executor import ChainDAG
 from chain.strategy_planner import StrategyPlanner
 from chain.tool_executor import ToolExecutor
 from chain.answer_synthesizer import AnswerSynthesizer
+from chain.single_flight import flight_key, single_flight
+from providers.ProvidersBase import AbstractChat
+from providers.Router import RouterChat
+from telemetry.metrics import summarize_calls
+from telemetry.tracing import start_trace, use_trace
+
+# 阶段快照目录，默认不写文件（需要时可通过 context.checkpoint 按需取得快照）
+DEFAULT_CHECKPOINT_DIR = os.getenv("SMART_TEACHER_CHECKPOINT_DIR")
+# 是否合并同时提交的相同请求（默认关闭），见 chain.single_flight
+DEFAULT_COALESCE = os.getenv("SMART_TEACHER_SINGLE_FLIGHT", "0") == "1"
 
 
 class MathChain:
-    """数学问题处理责任链"""
+    """
+    数学问题处理链：策略规划 -> 工具执行 -> 答案整合
+
+    处理器和模型客户端在构造时创建一次，请求状态（问题、附加 Prompt、对话历史）
+    全部保存在 ChainContext 中，同一实例可被多个线程 / 协程并发使用
+    """
     
-    def __init__(self, api_key):
-        # 创建处理器
-        self.strategy_planner = StrategyPlanner(api_key)
+    def __init__(self, api_key, planner_backends: Optional[List[AbstractChat]] = None,
+                 synthesizer_backends: Optional[List[AbstractChat]] = None, quick_answer: str = "style",
+                 checkpoint_dir: Optional[str] = DEFAULT_CHECKPOINT_DIR, coalesce: bool = DEFAULT_COALESCE):
+        """
+        Args:
+            planner_backends: 策略规划阶段的候选后端，多个时按延迟路由，默认 deepseek-chat
+            synthesizer_backends: 答案整合阶段的候选后端，多个时按延迟路由，默认 deepseek-reasoner
+            quick_answer: 快速解答模式 off / style / always，见 chain.quick_answer
+            checkpoint_dir: 设置时每个阶段结束后把上下文快照写入 <checkpoint_dir>/<context_id>.json
+            coalesce: 同时提交的相同请求只执行一次，其余请求共享结果
+        """
+        self.quick_answer = quick_answer
+        self.checkpoint_dir = checkpoint_dir
+        self.coalesce = coalesce
+        # 合并键的作用域；不用 id(self)，实例被回收后 id 可能分配给配置不同的新实例
+        self.flight_scope = uuid.uuid4().hex
+        self.planner_chat = self._stage_chat(planner_backends)
+        self.synthesizer_chat = self._stage_chat(synthesizer_backends)
+
+        # 创建处理器，处理器按声明的输入输出由 ChainDAG 调度
+        self.strategy_planner = StrategyPlanner(api_key, chat=self.planner_chat)
         self.tool_executor = ToolExecutor()
+        self.answer_synthesizer = AnswerSynthesizer(api_key=api_key, quick_answer=quick_answer,
+                                                    chat=self.synthesizer_chat)
         self.api_key = api_key
-        # AnswerSynthesizer 将在 process 方法中根据传入的 prompt 初始化
-        self.strategy_planner.set_next(self.tool_executor)
+        # 策略规划与工具执行的处理图，流式处理时答案整合单独驱动
+        self.planning_dag = ChainDAG([self.strategy_planner, self.tool_executor])
+        self.dag = ChainDAG([self.strategy_planner, self.tool_executor, self.answer_synthesizer])
+
+    def _new_context(self, problem: str, user_background: str, custom_prompt: str = "",
+                     conv_history: List[Dict[str, Any]] = None) -> ChainContext:
+        context = ChainContext(problem, user_background, custom_prompt=custom_prompt)
+        # 保存提问时的对话历史副本，之后追加的对话不影响本次上下文（重新生成时同样适用）
+        context.metadata["chat_history"] = list(conv_history) if isinstance(conv_history, list) else conv_history
+        context.trace = start_trace(f"MathChain: {problem[:30]}")
+        self._attach_checkpoint(context)
+        return context
+
+    def _attach_checkpoint(self, context: ChainContext) -> None:
+        if self.checkpoint_dir:
+            context.on_checkpoint = self._write_checkpoint
+
+    def _write_checkpoint(self, context: ChainContext, stage: str, snapshot: str) -> None:
+        """先写临时文件再替换，崩溃时不会留下写了一半的快照"""
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        path = os.path.join(self.checkpoint_dir, f"{context.context_id}.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write(snapshot)
+        os.replace(f"{path}.tmp", path)
+
+    def load_checkpoint(self, context_id: str) -> ChainContext:
+        """读取 checkpoint_dir 中保存的上下文快照"""
+        if not self.checkpoint_dir:
+            raise ValueError("未设置 checkpoint_dir，无法读取快照")
+        with open(os.path.join(self.checkpoint_dir, f"{context_id}.json"), "r", encoding="utf-8") as f:
+            return ChainContext.from_json(f.read())
+
+    def _prepare_resume(self, context: Union[ChainContext, Dict[str, Any], str], from_stage: str,
+                        custom_prompt: Optional[str]) -> Tuple[ChainContext, List[str]]:
+        """恢复上下文并清除 from_stage 及其下游阶段的结果，返回需要重新执行的阶段"""
+        if isinstance(context, str):
+            context = ChainContext.from_json(context)
+        elif isinstance(context, dict):
+            context = ChainContext.from_dict(context)
+        context.restore_images()
+
+        stages = self.dag.downstream(from_stage)
+        for name in stages:
+            self.dag.handlers[name].reset(context)
+        if custom_prompt is not None:
+            context.custom_prompt = custom_prompt
+        context.trace = start_trace(f"MathChain resume {from_stage}: {context.problem[:30]}")
+        self._attach_checkpoint(context)
+        return context, stages
+
+    def resume(self, context: Union[ChainContext, Dict[str, Any], str], from_stage: str,
+               custom_prompt: Optional[str] = None) -> ChainContext:
+        """
+        从指定阶段重新执行，上游阶段的结果（策略、工具结果）直接复用。
+        例如更换 Prompt 或答案整合失败后重试：resume(context, "answer_synthesizer", custom_prompt=...)
+
+        Args:
+            context: ChainContext，或 to_dict / to_json 得到的快照
+            from_stage: 处理阶段名，该阶段及其下游阶段会重新执行
+            custom_prompt: 不为 None 时替换本次请求的附加 Prompt
+        """
+        context, stages = self._prepare_resume(context, from_stage, custom_prompt)
+        with use_trace(context.trace):
+            return ChainDAG([self.dag.handlers[name] for name in stages]).run(context)
+
+    async def aresume(self, context: Union[ChainContext, Dict[str, Any], str], from_stage: str,
+                      custom_prompt: Optional[str] = None) -> ChainContext:
+        """resume 的异步版本"""
+        context, stages = self._prepare_resume(context, from_stage, custom_prompt)
+        with use_trace(context.trace):
+            return await ChainDAG([self.dag.handlers[name] for name in stages]).arun(context)
     
     def process(self, problem: str, user_background: str, custom_prompt: str = "",
                 conv_history: List[Dict[str, Any]] = None) -> ChainContext:
         """处理数学问题"""
-        # 创建上下文
-        context = ChainContext(problem, user_background)
-        
-        # 根据 custom_prompt 初始化 AnswerSynthesizer
-        answer_synthesizer = AnswerSynthesizer(api_key=self.api_key, custom_prompt=custom_prompt)
-        
-        # 构建完整的责任链
-        self.tool_executor.set_next(answer_synthesizer)
-
-        context.metadata["chat_history"] = conv_history
-        
-        # 开始处理链
-        result_context = self.strategy_planner.handle(context)
-        
-        return result_context
+        if self.coalesce:
+            key = flight_key(self.flight_scope, problem, user_background, custom_prompt, conv_history)
+            return single_flight.run(key, lambda: self._process(problem, user_background, custom_prompt, conv_history))
+        return self._process(problem, user_background, custom_prompt, conv_history)
+
+    def _process(self, problem: str, user_background: str, custom_prompt: str,
+                 conv_history: List[Dict[str, Any]]) -> ChainContext:
+        context = self._new_context(problem, user_background, custom_prompt, conv_history)
+        with use_trace(context.trace):
+            return self.dag.run(context)
     
+    async def aprocess(self, problem: str, user_background: str, custom_prompt: str = "",
+                       conv_history: List[Dict[str, Any]] = None) -> ChainContext:
+        """异步处理数学问题，可在同一事件循环中并发处理大量问题"""
+        if self.coalesce:
+            key = flight_key(self.flight_scope, problem, user_background, custom_prompt, conv_history)
+            return await single_flight.arun(
+                key, lambda: self._aprocess(problem, user_background, custom_prompt, conv_history))
+        return await self._aprocess(problem, user_background, custom_prompt, conv_history)
+
+    async def _aprocess(self, problem: str, user_background: str, custom_prompt: str,
+                        conv_history: List[Dict[str, Any]]) -> ChainContext:
+        context = self._new_context(problem, user_background, custom_prompt, conv_history)
+        with use_trace(context.trace):
+            return await self.dag.arun(context)
+
+    def process_stream(self, problem: str, user_background: str, custom_prompt: str = "",
+                       conv_history: List[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        流式处理数学问题：策略规划和工具执行完成后，逐块产出答案增量
+
+        事件格式：
+        - {"type": "reasoning", "delta": str}  推理内容增量
+        - {"type": "content", "delta": str}    答案正文增量
+        - {"type": "done", "context": ChainContext}  完整上下文，用于保存
+        """
+        if self.coalesce:
+            key = flight_key(self.flight_scope, problem, user_background, custom_prompt, conv_history)
+            return single_flight.stream(
+                key, lambda: self._process_stream(problem, user_background, custom_prompt, conv_history))
+        return self._process_stream(problem, user_background, custom_prompt, conv_history)
+
+    def _process_stream(self, problem: str, user_background: str, custom_prompt: str,
+                        conv_history: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        context = self._new_context(problem, user_background, custom_prompt, conv_history)
+
+        with use_trace(context.trace):
+            context = self.planning_dag.run(context)
+            yield from self.answer_synthesizer.stream(context)
+
+        yield {"type": "done", "context": context}
+
+    def resume_stream(self, context: Union[ChainContext, Dict[str, Any], str], from_stage: str,
+                      custom_prompt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """resume 的流式版本，事件格式同 process_stream"""
+        context, stages = self._prepare_resume(context, from_stage, custom_prompt)
+        upstream = [self.dag.handlers[name] for name in stages if name != AnswerSynthesizer.name]
+
+        with use_trace(context.trace):
+            if upstream:
+                context = ChainDAG(upstream).run(context)
+            yield from self.answer_synthesizer.stream(context)
+
+        yield {"type": "done", "context": context}
+    
+    @staticmethod
+    def _stage_chat(backends: Optional[List[AbstractChat]]) -> Optional[AbstractChat]:
+        """单个后端直接使用，多个后端包装为 RouterChat"""
+        if not backends:
+            return None
+        if len(backends) == 1:
+            return backends[0]
+        return RouterChat(backends)
+
     def get_processing_steps(self, context: ChainContext) -> dict:
         """获取处理步骤的详细信息"""
+        def stage(name: str) -> Dict[str, Any]:
+            state = context.stage(name)
+            return {"status": state.status.value, "duration": state.duration, "error": state.error}
+
         return {
             "strategy_planning": {
-                "status": context.metadata.get("strategy_planner", "not_started"),
+                **stage(StrategyPlanner.name),
+                "source": context.metadata.get("strategy_source"),
                 "content": context.strategy_plan
             },
             "tool_execution": {
-                "status": context.metadata.get("tool_executor", "not_started"),
+                **stage(ToolExecutor.name),
                 "content": context.tool_results
             },
             "answer_synthesis": {
-                "status": context.metadata.get("answer_synthesizer", "not_started"),
+                **stage(AnswerSynthesizer.name),
+                "source": context.metadata.get("answer_source"),
                 "content": context.final_answer
-            }
+            },
+            "telemetry": summarize_calls(context.metadata.get("llm_calls", [])),
+            "trace_id": context.trace.trace_id if context.trace else None
         }
+
+
+# 进程内最多保留的共享 MathChain 数量，超出时淘汰最久未使用的
+MAX_SHARED_CHAINS = int(os.getenv("SMART_TEACHER_MAX_SHARED_CHAINS", "16"))
+
+_shared_chains: "OrderedDict[Tuple[str, str], MathChain]" = OrderedDict()
+_shared_chains_lock = threading.Lock()
+
+
+def get_shared_chain(api_key: str, quick_answer: str = "style") -> MathChain:
+    """
+    按密钥与快速解答模式复用的进程级 MathChain，避免每次请求重新创建处理器和客户端。
+    与 ClientRegistry 一样以密钥的哈希为键，并按最近使用保留 MAX_SHARED_CHAINS 个
+    """
+    key = (hashlib.sha256((api_key or "").encode("utf-8")).hexdigest(), quick_answer)
+    with _shared_chains_lock:
+        chain = _shared_chains.get(key)
+        if chain is None:
+            chain = MathChain(api_key, quick_answer=quick_answer)
+            _shared_chains[key] = chain
+        _shared_chains.move_to_end(key)
+        while len(_shared_chains) > MAX_SHARED_CHAINS:
+            _shared_chains.popitem(last=False)
+        return chain
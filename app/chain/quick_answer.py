@@ -0,0 +1,202 @@
+import ast
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import sympy as sp
+
+from agents.local_classifier import parse_unevaluated
+from chain.base_handler import ChainContext
+from entity.ChainContextEntity import ToolExecutionResult
+
+QUICK_ANSWER_STYLE = "快速解答"
+
+# 结果可以直接套模板讲清楚的工具；函数分析、绘图等仍交给模型讲解
+SIMPLE_TOOLS = {"calculate_expression", "solve_equation"}
+
+# off：从不使用；style：学习偏好为“快速解答”时使用；always：满足条件即使用
+QUICK_ANSWER_MODES = ("off", "style", "always")
+
+
+def _latex(expression: str) -> str:
+    """按表达式原有结构转换为 latex，不求值（工具结果已由沙箱算出，这里不再计算用户输入）"""
+    try:
+        return sp.latex(parse_unevaluated(expression.replace("^", "**")))
+    except Exception:
+        return expression
+
+
+# 运算符的 latex 写法与优先级（数值越大结合越紧）
+_BINARY_OPS = {ast.Add: (" + ", 1), ast.Sub: (" - ", 1), ast.Mult: (r" \times ", 2), ast.Div: (" / ", 2)}
+_UNARY_PRECEDENCE = 3
+_POW_PRECEDENCE = 4
+_ATOM_PRECEDENCE = 5
+_LATEX_FUNCTIONS = {"sin", "cos", "tan", "cot", "sec", "csc", "sinh", "cosh", "tanh", "log", "ln", "exp"}
+
+
+def _parenthesize(text: str) -> str:
+    return rf"\left({text}\right)"
+
+
+def _node_latex(node: ast.AST, source: str) -> Tuple[str, int]:
+    """把 python 表达式语法树转换为 latex，返回 (latex, 优先级)；不支持的写法抛出 ValueError"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        # 数字沿用原写法（如 1e3、0.50）
+        return ast.get_source_segment(source, node) or str(node.value), _ATOM_PRECEDENCE
+    if isinstance(node, ast.Name):
+        return {"pi": r"\pi", "E": "e"}.get(node.id, node.id), _ATOM_PRECEDENCE
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand, precedence = _node_latex(node.operand, source)
+        if precedence < _UNARY_PRECEDENCE:
+            operand = _parenthesize(operand)
+        return ("-" if isinstance(node.op, ast.USub) else "+") + operand, _UNARY_PRECEDENCE
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+        # 乘方右结合：a**b**c 即 a^{b^{c}}；底数本身是乘方或带符号时加括号
+        base, precedence = _node_latex(node.left, source)
+        if precedence <= _POW_PRECEDENCE:
+            base = _parenthesize(base)
+        exponent, _ = _node_latex(node.right, source)
+        return f"{base}^{{{exponent}}}", _POW_PRECEDENCE
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+        symbol, precedence = _BINARY_OPS[type(node.op)]
+        left, left_precedence = _node_latex(node.left, source)
+        right, right_precedence = _node_latex(node.right, source)
+        if left_precedence < precedence:
+            left = _parenthesize(left)
+        # 右侧同级运算保留原有括号（如 3 - (2 - 1)），带符号的数也加括号（如 2 × (-3)）
+        if right_precedence <= precedence or isinstance(node.right, ast.UnaryOp):
+            right = _parenthesize(right)
+        return f"{left}{symbol}{right}", precedence
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and len(node.args) == 1 and not node.keywords:
+        argument, precedence = _node_latex(node.args[0], source)
+        name = node.func.id
+        if name == "sqrt":
+            return rf"\sqrt{{{argument}}}", _ATOM_PRECEDENCE
+        if name == "abs":
+            return rf"\left|{argument}\right|", _ATOM_PRECEDENCE
+        if name == "factorial":
+            return f"{argument if precedence == _ATOM_PRECEDENCE else _parenthesize(argument)}!", _ATOM_PRECEDENCE
+        if name in _LATEX_FUNCTIONS:
+            return rf"\{name}{_parenthesize(argument)}", _ATOM_PRECEDENCE
+    raise ValueError(f"无法按原写法转换为 latex：{ast.dump(node)}")
+
+
+def _latex_as_written(expression: str) -> str:
+    """保持题目原有的运算顺序，仅把 python 写法换成 latex；无法转换时使用 sympy 的写法"""
+    try:
+        source = expression.replace("^", "**")
+        return _node_latex(ast.parse(source, mode="eval").body, source)[0]
+    except (SyntaxError, ValueError):
+        return _latex(expression)
+
+
+def _format_number(value: Any) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _render_calculation(result: ToolExecutionResult) -> Tuple[List[str], str]:
+    expression = result.result.get("expression", "")
+    value = _format_number(result.result.get("result"))
+    lines = [f"$$ {_latex_as_written(expression)} = {value} $$"]
+    answer = f"${value}$"
+    # 有理数结果同时给出精确值（由沙箱中的 calculate_expression 算出）
+    exact = result.result.get("exact")
+    if exact:
+        exact_latex = sp.latex(sp.Rational(exact))
+        lines.append(f"精确值为 ${exact_latex}$。")
+        answer = f"${exact_latex} \\approx {value}$"
+    return lines, answer
+
+
+def _render_solution(result: ToolExecutionResult) -> Tuple[List[str], str]:
+    equation = result.result.get("equation", "")
+    variable = result.result.get("variable", "x")
+    solutions = result.result.get("solutions", [])
+    sides = equation.split("=")
+    equation_latex = " = ".join(_latex(side.strip()) for side in sides) if len(sides) == 2 else equation
+
+    lines = [f"解方程 ${equation_latex}$："]
+    if not solutions:
+        lines.append("该方程无解。")
+        return lines, "无解"
+    roots = [f"${variable} = {_latex(solution)}$" for solution in solutions]
+    lines.append("，".join(roots))
+    return lines, " 或 ".join(roots)
+
+
+_RENDERERS = {
+    "calculate_expression": _render_calculation,
+    "solve_equation": _render_solution
+}
+
+
+def is_eligible(context: ChainContext, mode: str = "style") -> bool:
+    """
+    题目属于简单题型（由本地分类器识别为计算或解方程），且所有工具都执行成功、只用到了简单工具时，
+    才可用模板直接出答案；LLM 规划的题目（如应用题）即使只用到简单工具，也需要模型讲解
+    """
+    if mode == "off":
+        return False
+    if mode == "style" and QUICK_ANSWER_STYLE not in (context.user_background or ""):
+        return False
+    if context.metadata.get("strategy_source") != "local":
+        return False
+
+    tool_results = context.tool_results
+    if not tool_results or not tool_results.executed or not tool_results.results:
+        return False
+    # 未知数移项后消去的方程（恒等式、矛盾方程）需要模型解释
+    return all(result.success and result.tool_name in SIMPLE_TOOLS and not result.result.get("degenerate")
+               for result in tool_results.results)
+
+
+def render_quick_answer(context: ChainContext) -> str:
+    """根据工具结果生成 markdown 答案"""
+    parts = ["### 解答", ""]
+    answers = []
+    for result in context.tool_results.results:
+        lines, answer = _RENDERERS[result.tool_name](result)
+        parts.extend(lines)
+        parts.append("")
+        answers.append(answer)
+    parts.append(f"**答案：** {'；'.join(answers)}")
+    parts.append("")
+    parts.append("> 以上为快速解答，如需详细步骤与知识点讲解，可将学习偏好切换为“详细步骤”。")
+    return "\n".join(parts)
+
+
+class QuickAnswerStats:
+    """快速解答命中统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.hits = 0
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            self.attempts += 1
+            if hit:
+                self.hits += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.attempts if self.attempts else 0.0
+            }
+
+
+# 进程级单例，统计全局命中率
+quick_answer_stats = QuickAnswerStats()
+
+
+def try_quick_answer(context: ChainContext, mode: str = "style") -> Optional[str]:
+    """满足条件时返回模板答案并计入统计，否则返回 None"""
+    if mode == "off":
+        return None
+    answer = render_quick_answer(context) if is_eligible(context, mode) else None
+    quick_answer_stats.record(answer is not None)
+    return answer
@@ -0,0 +1,276 @@
+"""
+单飞（single-flight）合并：同一时刻提交的相同请求（题目、学生背景、Prompt 与对话历史均相同）
+只执行一次 MathChain，其余请求等待这一次执行并共享结果。
+课堂上大量学生几秒内提交同一道作业题时，可省去重复的模型调用与工具计算。
+默认关闭，通过 MathChain(coalesce=True) 或 SMART_TEACHER_SINGLE_FLIGHT=1 开启
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import threading
+import uuid
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from agents.local_classifier import normalize_math
+from chain.base_handler import ChainContext
+
+
+def flight_key(scope: Any, problem: str, user_background: str, custom_prompt: str = "",
+               conv_history: Any = None) -> Tuple[Any, str]:
+    """请求的合并键：题目做符号与空白规范化，其余字段只合并空白"""
+    history = json.dumps(conv_history, ensure_ascii=False, sort_keys=True, default=str) if conv_history else ""
+    parts = [normalize_math(problem), " ".join((user_background or "").split()),
+             (custom_prompt or "").strip(), history]
+    return scope, hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    """一次正在执行的请求；流式请求同时缓存已产出的事件，供后加入的请求从头回放"""
+
+    def __init__(self, stream: bool):
+        self.future: Future = Future()
+        self.events: Optional[List[Dict[str, Any]]] = [] if stream else None
+        self.context: Optional[ChainContext] = None
+        self.closed = False
+        self.cond = threading.Condition()
+        # 正在等待本次执行结果的其他请求数，由 SingleFlight 在其锁内维护
+        self.waiters = 0
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        with self.cond:
+            if event["type"] == "done":
+                self.context = event["context"]
+            self.events.append(event)
+            self.cond.notify_all()
+
+    def close(self) -> None:
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def subscribe(self) -> Iterator[Dict[str, Any]]:
+        index = 0
+        while True:
+            with self.cond:
+                while index >= len(self.events) and not self.closed:
+                    self.cond.wait()
+                if index >= len(self.events):
+                    break
+                batch = self.events[index:]
+                index = len(self.events)
+            yield from batch
+
+
+class _Producer:
+    """
+    流式请求的事件源。生成器始终在同一个 contextvars.Context 中推进，
+    执行方中途放弃后可交给后台线程继续推进（use_trace 等上下文变量保持有效）
+    """
+
+    def __init__(self, iterator: Iterator[Dict[str, Any]]):
+        self.iterator = iterator
+        self.context = contextvars.copy_context()
+
+    def __iter__(self) -> '_Producer':
+        return self
+
+    def __next__(self) -> Dict[str, Any]:
+        return self.context.run(next, self.iterator)
+
+    def close(self) -> None:
+        self.context.run(self.iterator.close)
+
+
+def _follower_error(error: BaseException) -> Exception:
+    """等待方各自抛出新的异常对象（原异常作为 __cause__），避免多个线程同时改写同一异常的 traceback"""
+    return RuntimeError(f"合并执行的请求失败：{str(error)}")
+
+
+class SingleFlight:
+    """进程级请求合并表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Tuple[Any, str], _Flight] = {}
+        self._counters = {"requests": 0, "executions": 0, "coalesced": 0, "handoffs": 0,
+                          "saved_llm_calls": 0, "saved_tool_calls": 0, "saved_tokens": 0}
+
+    def _join(self, key: Tuple[Any, str], stream: bool) -> Tuple[_Flight, bool]:
+        """返回 (flight, 是否由本请求执行)；等待方计入 flight.waiters，结束后须调用 _leave"""
+        with self._lock:
+            self._counters["requests"] += 1
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._counters["coalesced"] += 1
+                flight.waiters += 1
+                return flight, False
+            flight = _Flight(stream)
+            self._flights[key] = flight
+            self._counters["executions"] += 1
+            return flight, True
+
+    def _leave(self, flight: _Flight) -> None:
+        with self._lock:
+            flight.waiters -= 1
+
+    def _land(self, key: Tuple[Any, str], flight: _Flight) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _share(self, context: ChainContext) -> ChainContext:
+        """等待方得到上下文副本并计入节省的调用；副本不带模型调用记录，避免重复统计用量"""
+        llm_calls = context.metadata.get("llm_calls", [])
+        tool_calls = len(context.tool_results.results) if context.tool_results else 0
+        tokens = sum(call.get("prompt_tokens", 0) + call.get("completion_tokens", 0) for call in llm_calls)
+        with self._lock:
+            self._counters["saved_llm_calls"] += len(llm_calls)
+            self._counters["saved_tool_calls"] += tool_calls
+            self._counters["saved_tokens"] += tokens
+
+        shared = ChainContext.from_dict(context.to_dict())
+        shared.context_id = uuid.uuid4().hex[:16]
+        # 快照不含图像字节，从原上下文补回（字节对象不可变，可直接共享）
+        if context.tool_results and shared.tool_results:
+            for source, target in zip(context.tool_results.results, shared.tool_results.results):
+                target.image = source.image
+        shared.metadata["llm_calls"] = []
+        shared.metadata["coalesced_from"] = context.context_id
+        return shared
+
+    def _settle(self, key: Tuple[Any, str], flight: _Flight, error: Optional[BaseException] = None) -> None:
+        """执行结束：移出合并表，写入结果并唤醒流式等待方"""
+        self._land(key, flight)
+        if error is None:
+            flight.future.set_result(flight.context)
+        else:
+            flight.future.set_exception(error)
+        flight.close()
+
+    def run(self, key: Tuple[Any, str], fn: Callable[[], ChainContext]) -> ChainContext:
+        """相同 key 的请求正在执行时等待其结果，否则执行 fn"""
+        flight, leader = self._join(key, stream=False)
+        if not leader:
+            try:
+                context = flight.future.result()
+            except Exception as e:
+                raise _follower_error(e) from e
+            finally:
+                self._leave(flight)
+            return self._share(context)
+
+        try:
+            flight.context = fn()
+        except BaseException as e:
+            self._settle(key, flight, e)
+            raise
+        self._settle(key, flight)
+        return flight.context
+
+    async def arun(self, key: Tuple[Any, str], fn: Callable[[], Awaitable[ChainContext]]) -> ChainContext:
+        """run 的异步版本，可与同步请求、其他事件循环中的请求相互合并"""
+        flight, leader = self._join(key, stream=False)
+        if not leader:
+            try:
+                context = await asyncio.wrap_future(flight.future)
+            except Exception as e:
+                raise _follower_error(e) from e
+            finally:
+                self._leave(flight)
+            return self._share(context)
+
+        try:
+            flight.context = await fn()
+        except BaseException as e:
+            self._settle(key, flight, e)
+            raise
+        self._settle(key, flight)
+        return flight.context
+
+    def stream(self, key: Tuple[Any, str], fn: Callable[[], Iterator[Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+        """
+        流式版本：执行方在自己的线程中逐个产出事件并广播，其他请求从头回放。
+        执行方中途放弃时，仍有请求在等待则交给后台线程执行完，否则关闭生成器取消本次执行；
+        合并到非流式请求上时，结果一次性作为正文事件产出
+        """
+        flight, leader = self._join(key, stream=True)
+        if leader:
+            yield from self._lead(key, flight, _Producer(fn()))
+        else:
+            yield from self._follow(flight)
+
+    def _lead(self, key: Tuple[Any, str], flight: _Flight, producer: _Producer) -> Iterator[Dict[str, Any]]:
+        try:
+            for event in producer:
+                flight.publish(event)
+                yield event
+        except GeneratorExit:
+            self._abandon(key, flight, producer)
+            raise
+        except BaseException as e:
+            self._settle(key, flight, e)
+            raise
+        self._settle(key, flight)
+
+    def _abandon(self, key: Tuple[Any, str], flight: _Flight, producer: _Producer) -> None:
+        with self._lock:
+            # 先移出合并表，之后不会再有请求加入，waiters 不再增加
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            handoff = flight.waiters > 0
+            if handoff:
+                self._counters["handoffs"] += 1
+        if handoff:
+            threading.Thread(target=self._drain, args=(key, flight, producer), daemon=True,
+                             name="single-flight").start()
+        else:
+            producer.close()
+            flight.future.cancel()
+            flight.close()
+
+    def _drain(self, key: Tuple[Any, str], flight: _Flight, producer: _Producer) -> None:
+        """执行方放弃后在后台把剩余事件产出给等待方"""
+        try:
+            for event in producer:
+                flight.publish(event)
+        except BaseException as e:
+            self._settle(key, flight, e)
+        else:
+            self._settle(key, flight)
+
+    def _follow(self, flight: _Flight) -> Iterator[Dict[str, Any]]:
+        try:
+            if flight.events is None:
+                try:
+                    context = flight.future.result()
+                except Exception as e:
+                    raise _follower_error(e) from e
+                context = self._share(context)
+                yield {"type": "content", "delta": context.final_answer or ""}
+                yield {"type": "done", "context": context}
+                return
+
+            for event in flight.subscribe():
+                if event["type"] == "done":
+                    event = {"type": "done", "context": self._share(event["context"])}
+                yield event
+            error = flight.future.exception()
+            if error is not None:
+                raise _follower_error(error) from error
+        finally:
+            self._leave(flight)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._counters,
+                "in_flight": len(self._flights),
+                "coalesce_rate": self._counters["coalesced"] / self._counters["requests"]
+                if self._counters["requests"] else 0.0
+            }
+
+
+# 进程级单例，所有 MathChain 共用（合并键包含 MathChain 实例的 flight_scope，不同密钥、配置的请求不会合并）
+single_flight = SingleFlight()
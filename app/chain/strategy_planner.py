@@ -1,42 +1,132 @@
+from typing import Optional
+
 from agents.function_caller import FunctionCaller
+from agents.local_classifier import local_classifier
 from chain.base_handler import BaseHandler, ChainContext
-from entity.ChainContextEntity import StrategyPlan
+from chain.tool_executor import submit_tool
+from entity.ChainContextEntity import FunctionCall, FunctionResponse, StageStatus, StrategyPlan
+from providers.ProvidersBase import AbstractChat
+from telemetry.metrics import llm_call_scope
 
 
 class StrategyPlanner(BaseHandler):
     """策略规划处理器 - 分析问题并制定解决策略"""
+
+    name = "strategy_planner"
+    inputs = ("problem", "user_background")
+    outputs = ("strategy_plan",)
     
-    def __init__(self, api_key:str = None):
+    def __init__(self, api_key:str = None, chat: Optional[AbstractChat] = None,
+                 use_local_classifier: bool = True, early_dispatch: bool = True):
+        """
+        Args:
+            use_local_classifier: 简单题目先由本地分类器处理
+            early_dispatch: 流式解析规划输出，每个工具调用一旦完整即提前派发执行；
+                对冲只作用于非流式请求，模型开启对冲时不提前派发
+        """
         super().__init__()
-        self.function_caller = FunctionCaller(api_key)
+        self.function_caller = FunctionCaller(api_key, chat=chat)
+        self.use_local_classifier = use_local_classifier
+        self.early_dispatch = early_dispatch
+
+    def reset(self, context: ChainContext) -> None:
+        super().reset(context)
+        context.metadata.pop("strategy_source", None)
+
+    def _streams(self) -> bool:
+        return self.early_dispatch and not self.function_caller.chat.hedges
+
+    @staticmethod
+    def _dispatcher(context: ChainContext):
+        def dispatch(call: FunctionCall) -> None:
+            print(f"提前派发工具：{call.function_name}")
+            context.pending_tools.append((call, submit_tool(call)))
+        return dispatch
+
+    @staticmethod
+    def _discarder(context: ChainContext):
+        def discard() -> None:
+            """规划流中途失败，已提前派发的工具调用不再属于最终计划"""
+            for _, future in context.pending_tools:
+                future.cancel()
+            if context.pending_tools:
+                print(f"作废提前派发的工具调用：{len(context.pending_tools)} 个")
+            context.pending_tools = []
+        return discard
+
+    def _try_local(self, context: ChainContext) -> bool:
+        """简单题目由本地分类器直接给出策略，命中时返回 True"""
+        if not self.use_local_classifier:
+            return False
+        response = local_classifier.classify(context.problem)
+        if response is None:
+            return False
+        self._apply_analysis(context, response)
+        context.metadata["strategy_source"] = "local"
+        return True
     
     def _process(self, context: ChainContext) -> ChainContext:
         """分析问题并制定解决策略"""
         try:
+            if self._try_local(context):
+                return context
             
             # 调用API获取策略规划
-            response = self.function_caller.analyze(context.problem, context.user_background)
-
-            print("strategy planner:\n", response)
-            
-            # 解析工具调用
-            if response.need_function:
-                # 保存策略规划结果
-                context.strategy_plan = StrategyPlan(
-                    reasoning=response.reasoning,
-                    tool_calls=response.function_results,
-                    needs_tools=True,
-                    analysis=response.analysis
-                )
-            
-            context.metadata["strategy_planner"] = "completed"
+            with llm_call_scope(context.metadata.setdefault("llm_calls", []), "strategy_planner"):
+                if self._streams():
+                    response = self.function_caller.analyze_stream(
+                        context.problem, context.user_background, self._dispatcher(context), self._discarder(context))
+                else:
+                    response = self.function_caller.analyze(context.problem, context.user_background)
+            self._apply_analysis(context, response)
+            context.metadata["strategy_source"] = "llm"
             
         except Exception as e:
-            context.strategy_plan = StrategyPlan(
-                analysis=f"策略规划过程中出现错误：{str(e)}",
-                tool_calls=[],
-                needs_tools=False
-            )
-            context.metadata["strategy_planner"] = "error"
+            self._apply_error(context, e)
         
         return context
+
+    async def _aprocess(self, context: ChainContext) -> ChainContext:
+        """异步分析问题并制定解决策略"""
+        try:
+            if self._try_local(context):
+                return context
+
+            with llm_call_scope(context.metadata.setdefault("llm_calls", []), "strategy_planner"):
+                if self._streams():
+                    response = await self.function_caller.aanalyze_stream(
+                        context.problem, context.user_background, self._dispatcher(context), self._discarder(context))
+                else:
+                    response = await self.function_caller.aanalyze(context.problem, context.user_background)
+            self._apply_analysis(context, response)
+            context.metadata["strategy_source"] = "llm"
+
+        except Exception as e:
+            self._apply_error(context, e)
+
+        return context
+
+    @staticmethod
+    def _apply_analysis(context: ChainContext, response: FunctionResponse) -> None:
+        """将分析结果写入上下文"""
+        print("strategy planner:\n", response)
+        
+        # 解析工具调用
+        if response.need_function:
+            # 保存策略规划结果
+            context.strategy_plan = StrategyPlan(
+                reasoning=response.reasoning,
+                tool_calls=response.function_results,
+                needs_tools=True,
+                analysis=response.analysis
+            )
+
+
+    @staticmethod
+    def _apply_error(context: ChainContext, e: Exception) -> None:
+        context.strategy_plan = StrategyPlan(
+            analysis=f"策略规划过程中出现错误：{str(e)}",
+            tool_calls=[],
+            needs_tools=False
+        )
+        context.set_status(StrategyPlanner.name, StageStatus.ERROR, str(e))
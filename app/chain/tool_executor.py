@@ -1,34 +1,78 @@
+import contextvars
+import json
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
 from chain.base_handler import BaseHandler, ChainContext
-from entity.ChainContextEntity import ToolResults, ToolExecutionResult
+from entity.ChainContextEntity import FunctionCall, StageStatus, ToolResults, ToolExecutionResult
+from telemetry.tracing import span
 from tools.math_tools import execute_tool
 
+# 工具本身在沙箱工作进程中执行（见 tools.sandbox），这里的线程只负责派发和等待结果
+_tool_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="tool")
+
+
+def _traced_execute(tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    with span(f"tool:{tool_name}", "tool", tool=tool_name) as current:
+        result = execute_tool(tool_name, arguments)
+        if current is not None:
+            current.set(success=result.get("success", False), reason=result.get("reason"),
+                        error=result.get("error"))
+        return result
+
+
+def submit_tool(call: FunctionCall) -> Future:
+    """提交工具调用到后台执行，返回 execute_tool 结果的 Future"""
+    # 在调用方上下文的副本中执行，保留当前 trace
+    return _tool_pool.submit(contextvars.copy_context().run, _traced_execute, call.function_name, call.parameters)
+
+
+def call_key(call: FunctionCall) -> Tuple[str, str]:
+    """工具名 + 规范化参数，用于识别同一计划中的重复调用"""
+    return call.function_name, json.dumps(call.parameters, sort_keys=True, ensure_ascii=False, default=str)
+
 
 class ToolExecutor(BaseHandler):
     """工具执行处理器 - 执行必要的计算和验证工具"""
+
+    name = "tool_executor"
+    inputs = ("strategy_plan",)
+    outputs = ("tool_results",)
+
+    def should_run(self, context: ChainContext) -> bool:
+        return bool(context.strategy_plan and context.strategy_plan.needs_tools)
+
+    def on_skip(self, context: ChainContext) -> None:
+        # 不需要工具时写入空结果
+        context.tool_results = ToolResults(
+            executed=False,
+            results=[],
+            summary="本问题不需要使用计算工具"
+        )
     
+    def reset(self, context: ChainContext) -> None:
+        super().reset(context)
+        context.pending_tools = []
+        context.metadata.pop("img_path", None)
+
     def _process(self, context: ChainContext) -> ChainContext:
         """执行工具调用"""
         
-        if not context.strategy_plan or not context.strategy_plan.needs_tools:
-            # 如果不需要工具，直接跳过
-            context.tool_results = ToolResults(
-                executed=False,
-                results=[],
-                summary="本问题不需要使用计算工具"
-            )
-            context.metadata["tool_executor"] = "skipped"
-            return context
-        
         try:
             function_results = context.strategy_plan.tool_calls
             executed_results = []
+
+            # 相同的调用只执行一次；各不相同的调用并行执行，结果按原顺序收集
+            futures = self._dispatch(context, function_results)
             
             for function_result in function_results:
                 tool_name = function_result.function_name
                 arguments = function_result.parameters
                 
-                # 执行工具
-                result = execute_tool(tool_name, arguments)
+                result = self._collect(futures[call_key(function_result)], tool_name)
+                # 图像字节单独保存；重复调用共享同一个结果字典，这里不修改原字典
+                image = result.get("image")
+                result = {key: value for key, value in result.items() if key != "image"}
 
                 print(f"tool executor: \n{result}")
 
@@ -37,10 +81,13 @@ class ToolExecutor(BaseHandler):
                     arguments=arguments,
                     result=result,
                     success=result.get("success", False),
-                    img_path=result.get("file_path", None)
+                    img_path=result.get("file_path", None),
+                    image=image,
+                    image_format=result.get("image_format") if image else None
                 ))
 
-                context.metadata["img_path"] = result.get("file_path", None)
+                if result.get("file_path"):
+                    context.metadata["img_path"] = result["file_path"]
             
             # 生成工具执行摘要
             successful_tools = [r for r in executed_results if r.success]
@@ -60,8 +107,6 @@ class ToolExecutor(BaseHandler):
                 failed_count=len(failed_tools)
             )
             
-            context.metadata["tool_executor"] = "completed"
-            
         except Exception as e:
             context.tool_results = ToolResults(
                 executed=False,
@@ -69,8 +114,30 @@ class ToolExecutor(BaseHandler):
                 summary=f"工具执行过程中出现错误：{str(e)}",
                 error=str(e)
             )
-            context.metadata["tool_executor"] = "error"
+            context.set_status(self.name, StageStatus.ERROR, str(e))
 
         print(f"tool executor: \n {context.tool_results}")
 
         return context
+
+    @staticmethod
+    def _dispatch(context: ChainContext, calls: List[FunctionCall]) -> Dict[Tuple[str, str], Future]:
+        """为每个不同的调用准备 Future：优先复用策略规划阶段已提前派发的结果"""
+        futures: Dict[Tuple[str, str], Future] = {}
+        for pending_call, future in context.pending_tools:
+            futures.setdefault(call_key(pending_call), future)
+        context.pending_tools = []
+
+        for call in calls:
+            key = call_key(call)
+            if key not in futures:
+                futures[key] = submit_tool(call)
+        return futures
+
+    @staticmethod
+    def _collect(future: Future, tool_name: str) -> Dict[str, Any]:
+        """等待工具结果，异常时转换为失败结果"""
+        try:
+            return future.result()
+        except Exception as e:
+            return {"success": False, "error": str(e), "description": f"执行 {tool_name} 时出错: {str(e)}"}
@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from enum import Enum
+
+from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
 
 class ToolExecutionResult(BaseModel):
@@ -7,6 +9,9 @@ class ToolExecutionResult(BaseModel):
     result: Dict[str, Any]
     success: bool
     img_path: Optional[str] = None
+    # 内存渲染的图像，不放入 result，避免进入模型提示词；不出现在 repr 中，打印结果时不会输出整张图像
+    image: Optional[bytes] = Field(default=None, repr=False)
+    image_format: Optional[str] = None
 
 class ToolResults(BaseModel):
     executed: bool
@@ -32,4 +37,17 @@ class StrategyPlan(BaseModel):
     reasoning: Optional[str] = ""
     tool_calls: List[FunctionCall]
     needs_tools: bool
-    analysis: Optional[str] = ""
\ No newline at end of file
+    analysis: Optional[str] = ""
+
+class StageStatus(str, Enum):
+    NOT_STARTED = "not_started"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    SKIPPED = "skipped"
+    ERROR = "error"
+
+class StageState(BaseModel):
+    status: StageStatus = StageStatus.NOT_STARTED
+    started_at: Optional[float] = None      # 开始时间戳
+    duration: Optional[float] = None        # 耗时（秒）
+    error: Optional[str] = None
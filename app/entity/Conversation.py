@@ -23,6 +23,8 @@ class ChatMessageType(Enum):
     NORMAL_MESSAGE_ASSISTANT_PART = 7
     # 排除的数据，报错
     EXCLUDE_MESSAGE_EXCEPTION = 8
+    # 早期对话的滚动摘要
+    SUMMARY_MESSAGE = 9
 
 class Conversation(BaseModel):
     root_conversation_id: int                        # 表示上一个父节点的会话id -1表示根节点
@@ -11,6 +11,7 @@ class ChatContent(ChatContentMain):
     name: Optional[str] = None              # 消息名称
     finish_reason: Optional[str] = None     # 完成原因
     message: Optional[Any] = None           # 消息对象
+    tool_calls: Optional[List[Any]] = None  # 原生工具调用
     
     class Config:
         arbitrary_types_allowed = True      # 允许 Any 类型
@@ -0,0 +1,20 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class LLMCallRecord(BaseModel):
+    provider: str                                    # 服务商类名
+    model: str                                       # 模型名称
+    stage: Optional[str] = None                      # 所属处理阶段
+    stream: bool = False                             # 是否流式调用
+    cached: bool = False                             # 是否命中响应缓存
+    success: bool = True                             # 是否调用成功
+    error: Optional[str] = None                      # 错误信息
+    prompt_tokens: int = 0                           # 输入token
+    completion_tokens: int = 0                       # 输出token
+    reasoning_tokens: int = 0                        # 推理token
+    cache_hit_tokens: int = 0                        # 服务端上下文缓存命中的输入token
+    wall_time: float = 0.0                           # 总耗时（秒）
+    ttft: Optional[float] = None                     # 首token耗时（秒）
+    timestamp: float = 0.0                           # 调用开始时间戳
@@ -1,10 +1,15 @@
 import streamlit as st
+import hashlib
 import json
 import os
+import time
 from datetime import datetime
 
 from chain.base_handler import ChainContext
-from chain.math_chain import MathChain
+from chain.math_chain import get_shared_chain
+from providers.ClientRegistry import client_registry
+from providers.Deepseek import DEEPSEEK_BASE_URL
+from tools.sandbox import get_sandbox
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 JSONL_FILE_PATH = f"{CURRENT_DIR}/data/questions.jsonl"
@@ -67,6 +72,61 @@ def save_prompt_to_jsonl(prompt_name, prompt_content, file_path=PROMPTS_JSONL_FI
         return False
 
 
+def warm_up_client(api_key):
+    """
+    每个会话对同一密钥只预热一次 DeepSeek 连接池（客户端由 client_registry 在进程内共享）。
+    会话中只记录密钥的哈希，不用 st.cache_resource 以免按明文密钥无限期缓存
+    """
+    key_digest = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    if st.session_state.get("warmed_key") == key_digest:
+        return
+    client_registry.warm_up(api_key, base_url=os.getenv("DEEPSEEK_BASE_URL", DEEPSEEK_BASE_URL))
+    st.session_state.warmed_key = key_digest
+
+
+@st.cache_resource(show_spinner=False)
+def start_tool_sandbox():
+    """应用启动时预先拉起工具工作进程，避免首个问题等待进程启动"""
+    return get_sandbox()
+
+
+def get_plot_image(context):
+    """要展示的图像：优先使用内存渲染的图像（SVG 以文本形式传入），否则使用图像文件路径"""
+    for result in context.tool_results.results if context.tool_results else []:
+        if result.image:
+            return result.image.decode("utf-8") if result.image_format == "svg" else result.image
+    return context.metadata.get("img_path", None)
+
+
+def render_answer_stream(events, reasoning_placeholder, answer_placeholder, refresh_interval=0.1):
+    """增量渲染流式答案，返回最终的 ChainContext"""
+    reasoning_text = ""
+    answer_text = ""
+    last_render = 0.0
+    context = None
+
+    for event in events:
+        if event["type"] == "reasoning":
+            reasoning_text += event["delta"]
+        elif event["type"] == "content":
+            answer_text += event["delta"]
+        elif event["type"] == "done":
+            context = event["context"]
+            break
+
+        # 限制刷新频率，避免每个 token 都重绘页面
+        now = time.monotonic()
+        if now - last_render >= refresh_interval:
+            if reasoning_text and not answer_text:
+                reasoning_placeholder.info(f"🧠 推理中……\n\n{reasoning_text[-800:]}")
+            if answer_text:
+                reasoning_placeholder.empty()
+                answer_placeholder.markdown(answer_text + "▌")
+            last_render = now
+
+    return context
+
+
 def show_error_collection():
     """显示错题集页面"""
     st.header("📚 错题集")
@@ -137,6 +197,8 @@ def main():
     )
 
     st.title("🧮 数学家教智能体")
+    if os.getenv("SMART_TEACHER_TOOL_SANDBOX", "1") != "0":
+        start_tool_sandbox()
     st.markdown("---")
 
     # 页面选择
@@ -166,6 +228,8 @@ def main():
         )
 
         api_key = st.text_input("请输入deepseek密钥", type="password")
+        if api_key and os.getenv("SMART_TEACHER_WARMUP", "1") == "1":
+            warm_up_client(api_key)
 
         user_background = f"教育阶段：{education_level}，数学水平：{math_level}，学习偏好：{learning_style}"
 
@@ -284,19 +348,37 @@ def main():
         # 获取解答按钮
         get_answer_clicked = st.button("🚀 获取解答", type="primary") and problem
 
-        if get_answer_clicked:
+        # 更换 Prompt 或答案整合失败时，沿用已有的分析和工具结果，只重新整合答案
+        previous_context = st.session_state.current_context
+        regenerate_clicked = previous_context is not None and previous_context.problem == problem and \
+            st.button("🔄 重新生成解答（沿用分析与工具结果）")
+
+        if get_answer_clicked or regenerate_clicked:
             with st.spinner("正在处理问题..."):
                 try:
                     st.session_state.is_save = False
-                    # 初始化责任链
-                    math_chain = MathChain(api_key)
+                    # 获取共享的处理链（进程级、按最近使用保留 MAX_SHARED_CHAINS 个），请求相关的状态保存在 ChainContext 中
+                    math_chain = get_shared_chain(api_key)
                     
                     # 获取选中的prompt内容
                     selected_prompt_text = existing_prompts.get(selected_prompt_name, "")
 
-                    # 处理问题
-                    context = math_chain.process(problem, user_background, selected_prompt_text,
-                                                 st.session_state.conversation_history)
+                    # 流式处理问题：推理过程与答案正文分开增量渲染
+                    reasoning_placeholder = st.empty()
+                    answer_placeholder = st.empty()
+                    if regenerate_clicked:
+                        events = math_chain.resume_stream(previous_context, "answer_synthesizer",
+                                                          custom_prompt=selected_prompt_text)
+                    else:
+                        events = math_chain.process_stream(problem, user_background, selected_prompt_text,
+                                                           st.session_state.conversation_history)
+                    context = render_answer_stream(
+                        events,
+                        reasoning_placeholder,
+                        answer_placeholder
+                    )
+                    reasoning_placeholder.empty()
+                    answer_placeholder.empty()
 
                     # 获取处理步骤
                     steps = math_chain.get_processing_steps(context)
@@ -347,6 +429,26 @@ def main():
                             st.success("✅ 答案整合完成")
                         else:
                             st.error("❌ 答案整合失败")
+
+                        # 调用耗时与 token 统计
+                        telemetry = steps["telemetry"]
+                        if steps["answer_synthesis"].get("source") == "template":
+                            st.caption("⚡ 快速解答：答案由工具结果直接生成，未调用答案整合模型")
+                        if telemetry["calls"]:
+                            st.caption(
+                                f"⏱️ LLM 调用 {telemetry['calls']} 次，共 {telemetry['wall_time']:.1f}s；"
+                                f"输入 {telemetry['prompt_tokens']} tokens（缓存命中 {telemetry['cache_hit_tokens']}），"
+                                f"输出 {telemetry['completion_tokens']} tokens（推理 {telemetry['reasoning_tokens']}）"
+                            )
+
+                        # 本次请求的耗时追踪，可在 chrome://tracing 或 Perfetto 中打开
+                        if context.trace is not None:
+                            st.download_button(
+                                "📈 下载耗时追踪（Chrome trace）",
+                                data=json.dumps(context.trace.to_chrome(), ensure_ascii=False),
+                                file_name=f"trace_{context.trace.trace_id}.json",
+                                mime="application/json"
+                            )
                     
                     # 模拟处理过程
                     # context = ChainContext(problem, user_background)
@@ -361,9 +463,9 @@ def main():
                     # 显示最终答案
                     if st.session_state.answer_generated and st.session_state.current_answer:
                         st.markdown("### 📚 详细解答")
-                        img_path = context.metadata.get("img_path", None)
-                        if img_path:
-                            st.image(context.metadata.get("img_path", None), use_container_width=True)
+                        plot_image = get_plot_image(context)
+                        if plot_image:
+                            st.image(plot_image, use_container_width=True)
                         st.markdown(st.session_state.current_answer)
 
                         # 添加到对话历史（只添加一次）
@@ -374,10 +476,12 @@ def main():
                             'user_background': user_background
                         }
 
-                        # 检查是否已经添加过这个对话
+                        # 检查是否已经添加过这个对话，重新生成时替换上一次的解答
                         if not st.session_state.conversation_history or \
                                 st.session_state.conversation_history[-1]['question'] != current_conv['question']:
                             st.session_state.conversation_history.append(current_conv)
+                        elif regenerate_clicked:
+                            st.session_state.conversation_history[-1] = current_conv
 
                 except Exception as e:
                     st.error(f"处理过程中出现错误：{str(e)}")
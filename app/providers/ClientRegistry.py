@@ -0,0 +1,133 @@
+import asyncio
+import atexit
+import hashlib
+import threading
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+
+class ClientRegistry:
+    """进程级 LLM 客户端注册表：按 base_url + api_key 复用客户端及其 keep-alive 连接池"""
+
+    def __init__(self, max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 120.0):
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple[str, str], OpenAI] = {}
+        # 异步连接池绑定创建它的事件循环，因此按事件循环分别缓存
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], AsyncOpenAI]]" = \
+            weakref.WeakKeyDictionary()
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(api_key: str, base_url: Optional[str]) -> Tuple[str, str]:
+        """注册表键，不在内存中以明文形式保存 api_key"""
+        key_digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+        return base_url or OPENAI_BASE_URL, key_digest
+
+    def get_client(self, api_key: str, base_url: Optional[str] = None) -> OpenAI:
+        """获取（或创建）共享客户端"""
+        key = self._key(api_key, base_url)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None and not client.is_closed():
+                self.hits += 1
+                return client
+
+            self.misses += 1
+            client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                # 重试由 providers.Resilience 统一处理
+                max_retries=0,
+                http_client=DefaultHttpxClient(limits=self._limits)
+            )
+            self._clients[key] = client
+            return client
+
+    def get_async_client(self, api_key: str, base_url: Optional[str] = None) -> AsyncOpenAI:
+        """获取（或创建）当前事件循环内共享的异步客户端，须在协程中调用"""
+        loop = asyncio.get_running_loop()
+        key = self._key(api_key, base_url)
+        with self._lock:
+            loop_clients = self._async_clients.setdefault(loop, {})
+            client = loop_clients.get(key)
+            if client is not None and not client.is_closed():
+                self.hits += 1
+                return client
+
+            self.misses += 1
+            client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=0,
+                http_client=DefaultAsyncHttpxClient(limits=self._limits)
+            )
+            loop_clients[key] = client
+            return client
+
+    async def aclose_all(self) -> None:
+        """关闭当前事件循环内的异步连接池"""
+        with self._lock:
+            clients = list(self._async_clients.pop(asyncio.get_running_loop(), {}).values())
+        for client in clients:
+            try:
+                await client.close()
+            except Exception:
+                pass
+
+    def warm_up(self, api_key: str, base_url: Optional[str] = None) -> bool:
+        """预热连接：提前完成 TLS 握手并放入连接池，失败不影响后续调用"""
+        client = self.get_client(api_key, base_url)
+        try:
+            client.models.list()
+            return True
+        except Exception as e:
+            print(f"客户端预热失败：{str(e)}")
+            return False
+
+    def close(self, api_key: str, base_url: Optional[str] = None) -> None:
+        """关闭指定客户端的连接池"""
+        with self._lock:
+            client = self._clients.pop(self._key(api_key, base_url), None)
+        if client is not None:
+            client.close()
+
+    def close_all(self) -> None:
+        """关闭所有连接池"""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """连接池命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "clients": len(self._clients),
+                "async_clients": sum(len(clients) for clients in self._async_clients.values()),
+                "base_urls": sorted({base_url for base_url, _ in self._clients}),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+
+# 进程级单例
+client_registry = ClientRegistry()
+atexit.register(client_registry.close_all)
@@ -4,11 +4,14 @@ from typing import Any, Dict, Optional, List
 import yaml
 from openai import OpenAI
 
+from providers.ClientRegistry import client_registry
 from providers.ProvidersBase import AbstractChat
 
+DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+
 
 class DeepSeekChat(AbstractChat):
-    def __init__(self, model: str, api_key: Optional[str] = None):
+    def __init__(self, model: str, api_key: Optional[str] = None, base_url: Optional[str] = None):
         if api_key is None:
             BASE_DIR = os.path.dirname(__file__)  # 获取 当前文件 所在目录
             with open(f"{BASE_DIR}\\config\\api.yml") as f:
@@ -20,29 +23,51 @@ class DeepSeekChat(AbstractChat):
         if model not in ["deepseek-reasoner", "deepseek-chat"]:
             raise ValueError("模型必须是 'deepseek-reasoner' 或 'deepseek-chat'")
         
-        # 初始化客户端
+        # 初始化客户端，可通过参数或环境变量 DEEPSEEK_BASE_URL 指向兼容服务（如本地模拟服务）
+        self.base_url = base_url or os.getenv("DEEPSEEK_BASE_URL", DEEPSEEK_BASE_URL)
         self.client = self._create_client(api_key)
 
-    def call_api(self, messages: List[Dict[str, str]], stream: bool) -> Any:
+    def _call_api(self, messages: List[Dict[str, str]], stream: bool, **kwargs) -> Any:
         return self.client.chat.completions.create(
             model=self.model,
             messages=messages,
             stream=stream,
+            **self._stream_options(stream),
+            **kwargs
+        )
+
+    async def _acall_api(self, messages: List[Dict[str, str]], stream: bool, **kwargs) -> Any:
+        return await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=stream,
+            **self._stream_options(stream),
+            **kwargs
         )
 
     def _create_client(self, api_key: str, **kwargs) -> OpenAI:
-        return OpenAI(api_key=api_key, base_url="https://api.deepseek.com")
+        return client_registry.get_client(api_key, base_url=self.base_url)
 
     def _parse_response(self, response: Any) -> Dict[str, Any]:
         return {
             "content": response.choices[0].message.content,
             "reasoning_content": getattr(response.choices[0].message, "reasoning_content", None),
             "finish_reason": response.choices[0].finish_reason,
-            "message": response
+            "message": response,
+            "tool_calls": self._parse_tool_calls(response.choices[0].message),
+            "usage": self._parse_usage(getattr(response, "usage", None))
         }
 
+    def _parse_usage(self, usage: Any) -> Dict[str, int]:
+        parsed = super()._parse_usage(usage)
+        if parsed:
+            # DeepSeek 通过 prompt_cache_hit_tokens 返回上下文缓存命中数
+            parsed["cache_hit_tokens"] = getattr(usage, "prompt_cache_hit_tokens", 0) or parsed["cache_hit_tokens"]
+        return parsed
+
     def parse_chunk(self, chunk: Any) -> Dict[str, Any]:
         return {
             "content": chunk.choices[0].delta.content,
-            "reasoning_content": getattr(chunk.choices[0].delta, "reasoning_content", None)
+            "reasoning_content": getattr(chunk.choices[0].delta, "reasoning_content", None),
+            "tool_calls": getattr(chunk.choices[0].delta, "tool_calls", None)
         }
@@ -5,8 +5,11 @@ from typing import Optional
 import yaml
 from openai import OpenAI
 
+from providers.ClientRegistry import client_registry
 from providers.Openai import OpenAIChat
 
+GROK_BASE_URL = "https://api.x.ai/v1"
+
 
 class GrokChat(OpenAIChat):
     def __init__(self, model, api_key: Optional[str] = None):
@@ -20,6 +23,6 @@ class GrokChat(OpenAIChat):
             raise ValueError("模型必须是 grok-3-mini, grok-3, grok-2-image")
 
     def _create_client(self, api_key: str, **kwargs) -> OpenAI:
-        return OpenAI(api_key=api_key, base_url="https://api.x.ai/v1")
+        return client_registry.get_client(api_key, base_url=GROK_BASE_URL)
 
 
@@ -0,0 +1,119 @@
+import re
+from typing import Callable, List, Optional
+
+from entity.Conversation import ChatMessageType
+from entity.Models import Chat, ChatContent
+
+_CJK_PATTERN = re.compile(r"[　-〿㐀-䶿一-鿿＀-￯]")
+
+# 每条消息的格式开销（role、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "此前对话摘要：\n"
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    本地估算token数：中文字符约 0.6 token/字，其余字符约 0.3 token/字符
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return int(cjk * 0.6 + (len(text) - cjk) * 0.3) + 1
+
+
+# 摘要函数：(被移出窗口的消息, 上一次的摘要) -> 新摘要
+Summarizer = Callable[[List[ChatContent], Optional[str]], str]
+
+
+class MemoryPolicy:
+    """
+    对话记忆策略：按token预算保留最近的消息，系统提示始终保留；
+    可选地将移出窗口的消息滚动压缩为一条摘要
+    """
+
+    def __init__(self, max_tokens: int = 16000, min_recent_messages: int = 2,
+                 summarizer: Optional[Summarizer] = None,
+                 estimator: Callable[[Optional[str]], int] = estimate_tokens):
+        """
+        Args:
+            max_tokens: 发送给模型的消息总token预算
+            min_recent_messages: 无论预算如何都保留的最近消息数
+            summarizer: 摘要函数，为 None 时直接丢弃超出窗口的消息
+            estimator: token估算函数
+        """
+        self.max_tokens = max_tokens
+        self.min_recent_messages = min_recent_messages
+        self.summarizer = summarizer
+        self.estimator = estimator
+
+    def _tokens(self, message: ChatContent) -> int:
+        return self.estimator(message.content) + MESSAGE_OVERHEAD_TOKENS
+
+    def apply(self, chat: Chat) -> None:
+        """原地裁剪聊天记录，使其token数不超过预算"""
+        system_messages = [m for m in chat.messages
+                           if m.role == "system" and m.chat_type != ChatMessageType.SUMMARY_MESSAGE]
+        summary = next((m for m in chat.messages if m.chat_type == ChatMessageType.SUMMARY_MESSAGE), None)
+        dialog = [m for m in chat.messages if m.role != "system"]
+
+        budget = self.max_tokens - sum(self._tokens(m) for m in system_messages)
+        if summary is not None:
+            budget -= self._tokens(summary)
+
+        total = sum(self._tokens(m) for m in dialog)
+        if total <= budget:
+            return
+
+        # 从最新的消息往前保留，直到预算用尽
+        kept: List[ChatContent] = []
+        used = 0
+        for message in reversed(dialog):
+            tokens = self._tokens(message)
+            if len(kept) >= self.min_recent_messages and used + tokens > budget:
+                break
+            kept.append(message)
+            used += tokens
+        kept.reverse()
+        evicted = dialog[:len(dialog) - len(kept)]
+
+        if evicted and self.summarizer is not None:
+            try:
+                previous = summary.content[len(SUMMARY_PREFIX):] if summary else None
+                summary_text = self.summarizer(evicted, previous)
+                summary = ChatContent(
+                    role="system",
+                    content=SUMMARY_PREFIX + summary_text,
+                    reasoning_content=None,
+                    chat_type=ChatMessageType.SUMMARY_MESSAGE
+                )
+            except Exception as e:
+                print(f"生成对话摘要失败，直接丢弃早期消息：{str(e)}")
+
+        chat.messages = system_messages + ([summary] if summary is not None else []) + kept
+
+
+class LLMSummarizer:
+    """使用模型生成滚动摘要"""
+
+    def __init__(self, chat, max_summary_chars: int = 800):
+        """
+        Args:
+            chat: 用于生成摘要的 AbstractChat，建议使用较快的模型
+        """
+        self.chat = chat
+        self.max_summary_chars = max_summary_chars
+
+    def __call__(self, evicted: List[ChatContent], previous_summary: Optional[str]) -> str:
+        dialog = "\n".join(f"{m.role}: {m.content}" for m in evicted)
+        prompt = (
+            f"请将以下对话压缩为不超过{self.max_summary_chars}字的要点摘要，"
+            "保留学生背景、已讨论的题目、关键结论和未解决的问题。\n"
+        )
+        if previous_summary:
+            prompt += f"\n已有摘要：\n{previous_summary}\n"
+        prompt += f"\n新增对话：\n{dialog}"
+
+        response = self.chat.call_api([{"role": "user", "content": prompt}], stream=False)
+        content = self.chat._parse_response(response).get("content") or ""
+        return content[:self.max_summary_chars]
@@ -3,6 +3,7 @@ from typing import List, Dict, Any
 
 from openai import OpenAI
 
+from providers.ClientRegistry import client_registry
 from providers.ProvidersBase import AbstractChat
 
 
@@ -12,23 +13,37 @@ class OpenAIChat(AbstractChat):
         self.client = self._create_client(api_key)
 
     def _create_client(self, api_key: str, **kwargs) -> OpenAI:
-        return OpenAI(api_key=api_key)
+        return client_registry.get_client(api_key)
 
-    def call_api(self, messages: List[Dict[str, str]], stream: bool) -> Any:
+    def _call_api(self, messages: List[Dict[str, str]], stream: bool, **kwargs) -> Any:
         return self.client.chat.completions.create(
             model=self.model,
             messages=messages,
             stream=stream,
+            **self._stream_options(stream),
+            **kwargs
+        )
+
+    async def _acall_api(self, messages: List[Dict[str, str]], stream: bool, **kwargs) -> Any:
+        return await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=stream,
+            **self._stream_options(stream),
+            **kwargs
         )
 
     def _parse_response(self, response: Any) -> Dict[str, Any]:
         return {
             "content": response.choices[0].message.content,
             "finish_reason": response.choices[0].finish_reason,
-            "message": response.choices[0].message
+            "message": response.choices[0].message,
+            "tool_calls": self._parse_tool_calls(response.choices[0].message),
+            "usage": self._parse_usage(getattr(response, "usage", None))
         }
 
     def parse_chunk(self, chunk: Any) -> Dict[str, Any]:
         return {
             "content": chunk.choices[0].delta.content,
+            "tool_calls": getattr(chunk.choices[0].delta, "tool_calls", None)
         }
@@ -1,21 +1,110 @@
+import asyncio
+import json
+import time
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
 from uuid import uuid4
 
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
 from entity.Conversation import ChatMessageType
 from entity.Models import Chat, ChatContent
+from entity.TelemetryEntity import LLMCallRecord
+from providers.ClientRegistry import client_registry
+from providers.Memory import MemoryPolicy
+from providers.Resilience import LatencyTracker, ResiliencePolicy, acall_with_policy, call_with_policy
+from providers.ResponseCache import ResponseCache, default_response_cache
+from telemetry.metrics import record_call
+
+
+class _ApiCall:
+    """
+    一次 call_api / acall_api 调用的公共前后处理：读取缓存、记录用量与耗时、写入缓存，
+    同步与异步版本只负责实际的请求。流式响应完整结束后按块写入缓存，命中时原样回放
+    """
+
+    def __init__(self, chat: 'AbstractChat', messages: List[Dict[str, str]], stream: bool, use_cache: bool,
+                 kwargs: Dict[str, Any]):
+        self.chat = chat
+        self.stream = stream
+        self.started_at, self.start = time.time(), time.perf_counter()
+        self.ttft: Optional[float] = None
+        self.usage: Any = None
+        self.error: Optional[Exception] = None
+        # 流式响应是否读到末尾，以及待写入缓存的全部块
+        self.finished = False
+        self.chunks: List[Any] = []
+
+        self.cache_key = chat._cache_key(messages, stream, use_cache, **kwargs)
+        self.cached: Any = None
+        if self.cache_key:
+            payload = chat.response_cache.get(self.cache_key)
+            if payload is not None:
+                self._hit(payload)
+
+    def _hit(self, payload: str) -> None:
+        if not self.stream:
+            self.cached = self.chat._deserialize_response(payload)
+            self.chat._record_response(self.cached, self.started_at, self.start, cached=True)
+            return
+        self.cached = self.chat._deserialize_chunks(payload)
+        usage = next((chunk.usage for chunk in reversed(self.cached) if getattr(chunk, "usage", None)), None)
+        record = self.chat._new_record(self.started_at, self.start, True, usage, cached=True)
+        record.ttft = record.wall_time
+        record_call(record)
+
+    def failed(self, e: Exception) -> None:
+        self.chat._record_error(e, self.started_at, self.start, self.stream)
+
+    def completed(self, response: Any) -> Any:
+        """非流式响应：记录调用并写入缓存"""
+        self.chat._record_response(response, self.started_at, self.start)
+        if self.cache_key:
+            self.chat._store_response(self.cache_key, response)
+        return response
+
+    def observe(self, chunk: Any) -> None:
+        """流式响应的每个块：记录首token耗时与末尾统计块中的 usage"""
+        if self.ttft is None and self.chat._is_first_token(chunk):
+            self.ttft = time.perf_counter() - self.start
+        if getattr(chunk, "usage", None):
+            self.usage = chunk.usage
+        if self.cache_key:
+            self.chunks.append(chunk)
+
+    def stream_closed(self) -> None:
+        record_call(self.chat._new_record(self.started_at, self.start, True, self.usage, self.ttft,
+                                          success=self.error is None,
+                                          error=str(self.error) if self.error else None))
+        # 中途出错或被调用方放弃的流不完整，不写入缓存
+        if self.cache_key and self.finished:
+            self.chat._store_chunks(self.cache_key, self.chunks)
+
+
+async def _replay(chunks: List[Any]) -> AsyncIterator[Any]:
+    for chunk in chunks:
+        yield chunk
 
 
 class AbstractChat(ABC):
-    def __init__(self, model: str):
+    def __init__(self, model: str, memory_policy: Optional[MemoryPolicy] = None):
         """
         初始化抽象聊天类
+
+        Args:
+            memory_policy: 对话记忆策略，默认按token预算保留最近的消息
         """
         self.model = model
         self.chat = Chat(messages=[])
+        self.memory_policy = memory_policy or MemoryPolicy()
 
         self.client: Any = None
         self.conversation_id = str(uuid4())  # 为每个对话分配唯一ID
+        # 响应缓存（可选），默认由环境变量 SMART_TEACHER_LLM_CACHE 控制
+        self.response_cache: Optional[ResponseCache] = default_response_cache()
+        # 超时、重试与对冲策略
+        self.resilience = ResiliencePolicy()
+        self._latency = LatencyTracker()
 
     def prepare_messages(self, user_input: str, system_prompt: Optional[str] = None) -> List[Any]:
         """
@@ -38,6 +127,10 @@ class AbstractChat(ABC):
             )
             self.chat.messages.append(user_message)
 
+        # 按记忆策略裁剪，避免长对话的内存和输入token无限增长
+        if self.memory_policy is not None:
+            self.memory_policy.apply(self.chat)
+
         messages = []
         for msg in self.chat.messages:
             message_dict = {"role": msg.role, "content": msg.content}
@@ -51,9 +144,201 @@ class AbstractChat(ABC):
         pass
 
     @abstractmethod
-    def call_api(self, messages: List[Dict[str, str]], stream: bool, **kwargs) -> Any:
+    def _call_api(self, messages: List[Dict[str, str]], stream: bool, **kwargs) -> Any:
         raise NotImplementedError('请创建调用api方式！')
 
+    def call_api(self, messages: List[Dict[str, str]], stream: bool, use_cache: bool = True,
+                 policy: Optional[ResiliencePolicy] = None, **kwargs) -> Any:
+        """
+        调用API，开启缓存时优先读取缓存（流式请求命中时回放缓存的响应块）；每次调用都会记录 token 与耗时。
+        请求按 resilience 策略执行：单次超时、整体截止时间、可重试错误的指数退避重试，
+        以及非流式请求的可选对冲
+
+        Args:
+            use_cache: 为 False 时绕过缓存，直接请求服务商
+            policy: 本次调用的策略，默认使用 self.resilience
+        """
+        call = _ApiCall(self, messages, stream, use_cache, kwargs)
+        if call.cached is not None:
+            return iter(call.cached) if stream else call.cached
+
+        try:
+            response = call_with_policy(
+                lambda timeout: self._call_api(messages, stream, timeout=timeout, **kwargs),
+                policy or self.resilience, self._latency, hedge=not stream
+            )
+        except Exception as e:
+            call.failed(e)
+            raise
+        return self._track_stream(response, call) if stream else call.completed(response)
+
+    @staticmethod
+    def _stream_options(stream: bool) -> Dict[str, Any]:
+        """流式请求要求服务商在末尾统计块中返回 usage"""
+        return {"stream_options": {"include_usage": True}} if stream else {}
+
+    @property
+    def hedges(self) -> bool:
+        """是否开启了对冲；对冲只作用于非流式请求"""
+        return self.resilience.hedge
+
+    def enable_cache(self, cache: Optional[ResponseCache] = None) -> None:
+        """开启响应缓存，未指定时使用默认路径的缓存"""
+        self.response_cache = cache or ResponseCache()
+
+    def disable_cache(self) -> None:
+        self.response_cache = None
+
+    def _cache_key(self, messages: List[Dict[str, str]], stream: bool, use_cache: bool, **kwargs) -> Optional[str]:
+        """流式与非流式响应的缓存格式不同，分别缓存"""
+        if self.response_cache is None or not use_cache:
+            return None
+        base_url = str(getattr(self.client, "base_url", ""))
+        if stream:
+            kwargs["stream"] = True
+        return ResponseCache.make_key(self.model, messages, base_url=base_url, **kwargs)
+
+    def _store_response(self, cache_key: str, response: Any) -> None:
+        try:
+            self.response_cache.set(cache_key, response.model_dump_json(), model=self.model)
+        except Exception as e:
+            print(f"写入响应缓存失败：{str(e)}")
+
+    def _store_chunks(self, cache_key: str, chunks: List[Any]) -> None:
+        try:
+            payload = "[" + ",".join(chunk.model_dump_json() for chunk in chunks) + "]"
+            self.response_cache.set(cache_key, payload, model=self.model)
+        except Exception as e:
+            print(f"写入响应缓存失败：{str(e)}")
+
+    def _deserialize_response(self, payload: str) -> Any:
+        """将缓存内容还原为响应对象，保留 reasoning_content 等扩展字段"""
+        return ChatCompletion.model_validate_json(payload)
+
+    def _deserialize_chunks(self, payload: str) -> List[Any]:
+        """将缓存的流式响应还原为响应块列表"""
+        return [ChatCompletionChunk.model_validate(chunk) for chunk in json.loads(payload)]
+
+    @property
+    def async_client(self) -> Any:
+        """与同步客户端共用 base_url / api_key 的异步客户端（按事件循环复用连接池）"""
+        if self.client is None:
+            raise ValueError("客户端未初始化")
+        return client_registry.get_async_client(self.client.api_key, str(self.client.base_url))
+
+    async def _acall_api(self, messages: List[Dict[str, str]], stream: bool, **kwargs) -> Any:
+        """
+        异步调用API，子类应使用 async_client 覆盖；默认在线程中执行同步调用
+        """
+        return await asyncio.to_thread(self._call_api, messages, stream, **kwargs)
+
+    async def acall_api(self, messages: List[Dict[str, str]], stream: bool, use_cache: bool = True,
+                        policy: Optional[ResiliencePolicy] = None, **kwargs) -> Any:
+        """
+        call_api 的异步版本
+        """
+        call = _ApiCall(self, messages, stream, use_cache, kwargs)
+        if call.cached is not None:
+            return _replay(call.cached) if stream else call.cached
+
+        try:
+            response = await acall_with_policy(
+                lambda timeout: self._acall_api(messages, stream, timeout=timeout, **kwargs),
+                policy or self.resilience, self._latency, hedge=not stream
+            )
+        except Exception as e:
+            call.failed(e)
+            raise
+        return self._atrack_stream(response, call) if stream else call.completed(response)
+
+    def _parse_usage(self, usage: Any) -> Dict[str, int]:
+        """
+        解析 usage 字段：输入/输出/推理token，以及服务端上下文缓存命中的输入token
+        """
+        if usage is None:
+            return {}
+        completion_details = getattr(usage, "completion_tokens_details", None)
+        prompt_details = getattr(usage, "prompt_tokens_details", None)
+        return {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+            "reasoning_tokens": getattr(completion_details, "reasoning_tokens", 0) or 0,
+            "cache_hit_tokens": getattr(prompt_details, "cached_tokens", 0) or 0
+        }
+
+    @staticmethod
+    def _parse_tool_calls(message: Any) -> Optional[List[Dict[str, Any]]]:
+        """
+        解析原生 tool_calls 为 [{"id", "name", "arguments"}]，arguments 解析为字典；
+        参数不是合法 JSON 的调用会被跳过
+        """
+        tool_calls = getattr(message, "tool_calls", None)
+        if not tool_calls:
+            return None
+        parsed = []
+        for call in tool_calls:
+            try:
+                arguments = json.loads(call.function.arguments or "{}")
+            except json.JSONDecodeError:
+                print(f"工具 {call.function.name} 的参数不是合法 JSON，已跳过：{call.function.arguments}")
+                continue
+            parsed.append({"id": call.id, "name": call.function.name, "arguments": arguments})
+        return parsed
+
+    def _new_record(self, started_at: float, start: float, stream: bool, usage: Any = None,
+                    ttft: Optional[float] = None, **fields) -> LLMCallRecord:
+        return LLMCallRecord(
+            provider=type(self).__name__,
+            model=self.model,
+            stream=stream,
+            wall_time=time.perf_counter() - start,
+            ttft=ttft,
+            timestamp=started_at,
+            **self._parse_usage(usage),
+            **fields
+        )
+
+    def _record_response(self, response: Any, started_at: float, start: float, cached: bool = False) -> None:
+        """非流式响应：整段返回，首token耗时即总耗时"""
+        record = self._new_record(started_at, start, False, getattr(response, "usage", None), cached=cached)
+        record.ttft = record.wall_time
+        record_call(record)
+
+    def _record_error(self, e: Exception, started_at: float, start: float, stream: bool) -> None:
+        record_call(self._new_record(started_at, start, stream, success=False, error=str(e)))
+
+    def _is_first_token(self, chunk: Any) -> bool:
+        if not getattr(chunk, "choices", None):
+            return False
+        delta = self.parse_chunk(chunk)
+        return bool(delta.get("content") or delta.get("reasoning_content"))
+
+    def _track_stream(self, response: Any, call: '_ApiCall') -> Iterator[Any]:
+        """包装流式响应：记录首token耗时，并在流结束时记录末尾统计块中的 usage"""
+        try:
+            for chunk in response:
+                call.observe(chunk)
+                yield chunk
+            call.finished = True
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            call.stream_closed()
+
+    async def _atrack_stream(self, response: Any, call: '_ApiCall') -> AsyncIterator[Any]:
+        """_track_stream 的异步版本"""
+        try:
+            async for chunk in response:
+                call.observe(chunk)
+                yield chunk
+            call.finished = True
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            call.stream_closed()
+
     @abstractmethod
     def _parse_response(self, response: Any) -> Dict[str, Any]:
         """
@@ -65,7 +350,8 @@ class AbstractChat(ABC):
             "content": content,
             "reasoning_content": None,
             "message": None,
-            "finish_reason": response.choices[0].finish_reason
+            "finish_reason": response.choices[0].finish_reason,
+            "usage": self._parse_usage(getattr(response, "usage", None))
         }
         return response_data
 
@@ -86,6 +372,71 @@ class AbstractChat(ABC):
         response = self.call_api(messages, stream=False, **kwargs)
         return self._parse_response(response)
 
+    async def acall_with_tools(self, messages: List[Dict[str, str]], tools: List[Dict] = None,
+                               tool_choice: str = "auto") -> Dict[str, Any]:
+        """call_with_tools 的异步版本"""
+        kwargs = {}
+        if tools:
+            kwargs["tools"] = tools
+            kwargs["tool_choice"] = tool_choice
+
+        response = await self.acall_api(messages, stream=False, **kwargs)
+        return self._parse_response(response)
+
+    def stream_api(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        流式调用API，逐块产出 parse_chunk 解析后的增量（content / reasoning_content / tool_calls 分开）
+        """
+        response = self.call_api(messages, stream=True, **kwargs)
+        for chunk in response:
+            # 部分服务商在流末尾发送不含 choices 的统计块
+            if not getattr(chunk, "choices", None):
+                continue
+            delta = self.parse_chunk(chunk)
+            if delta.get("content") or delta.get("reasoning_content") or delta.get("tool_calls"):
+                yield delta
+
+    async def astream_api(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        """
+        stream_api 的异步版本
+        """
+        response = await self.acall_api(messages, stream=True, **kwargs)
+        async for chunk in response:
+            if not getattr(chunk, "choices", None):
+                continue
+            delta = self.parse_chunk(chunk)
+            if delta.get("content") or delta.get("reasoning_content") or delta.get("tool_calls"):
+                yield delta
+
+    def stream_chatting(self, user_input: str | List[str] = None,
+                        system_prompt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        流式聊天：逐块产出增量，结束后将完整回复写入聊天记录
+        """
+        if self.client is None:
+            raise ValueError("客户端未初始化")
+
+        api_messages = self.prepare_messages(user_input, system_prompt)
+        content_parts: List[str] = []
+        reasoning_parts: List[str] = []
+
+        try:
+            for delta in self.stream_api(api_messages):
+                if delta.get("content"):
+                    content_parts.append(delta["content"])
+                if delta.get("reasoning_content"):
+                    reasoning_parts.append(delta["reasoning_content"])
+                yield delta
+        except Exception as e:
+            raise ValueError(f"API 调用失败: {str(e)}")
+
+        self.chat.messages.append(ChatContent(
+            role="assistant",
+            content="".join(content_parts),
+            reasoning_content="".join(reasoning_parts) or None,
+            chat_type=ChatMessageType.NORMAL_MESSAGE_ASSISTANT
+        ))
+
     def chatting(self, user_input: str | List[str] = None,
                  stream: bool = False, system_prompt: Optional[str] = None) -> ChatContent:
         """
@@ -93,30 +444,50 @@ class AbstractChat(ABC):
         """
         if self.client is None:
             raise ValueError("客户端未初始化")
+        if stream:
+            raise NotImplementedError("流式输出请使用 stream_chatting")
 
         try:
             api_messages = self.prepare_messages(user_input, system_prompt)
 
             response = self.call_api(api_messages, stream)
-            if stream:
-                raise NotImplementedError("Streaming should be handled by yourself")
-            else:
-                response_data = self._parse_response(response)
-                assistant_message = ChatContent(
-                    role="assistant",
-                    content=response_data.get("content"),
-                    reasoning_content=response_data.get("reasoning_content"),
-                    message=response_data.get("message"),
-                    finish_reason=response_data.get("finish_reason"),
-                    chat_type=ChatMessageType.NORMAL_MESSAGE_ASSISTANT
-                )
-                self.chat.messages.append(assistant_message)
-
-            return assistant_message
+            return self._append_response(response)
+
+        except Exception as e:
+            raise ValueError(f"API 调用失败: {str(e)}")
+
+    async def achatting(self, user_input: str | List[str] = None,
+                        system_prompt: Optional[str] = None) -> ChatContent:
+        """
+        chatting 的异步版本
+        """
+        if self.client is None:
+            raise ValueError("客户端未初始化")
+
+        try:
+            api_messages = self.prepare_messages(user_input, system_prompt)
+
+            response = await self.acall_api(api_messages, stream=False)
+            return self._append_response(response)
 
         except Exception as e:
             raise ValueError(f"API 调用失败: {str(e)}")
 
+    def _append_response(self, response: Any) -> ChatContent:
+        """解析非流式响应并写入聊天记录"""
+        response_data = self._parse_response(response)
+        assistant_message = ChatContent(
+            role="assistant",
+            content=response_data.get("content"),
+            reasoning_content=response_data.get("reasoning_content"),
+            message=response_data.get("message"),
+            finish_reason=response_data.get("finish_reason"),
+            tool_calls=response_data.get("tool_calls"),
+            chat_type=ChatMessageType.NORMAL_MESSAGE_ASSISTANT
+        )
+        self.chat.messages.append(assistant_message)
+        return assistant_message
+
     def print_current_response(self) -> None:
         if not self.chat.messages or self.chat.messages[-1].role != "assistant":
             print("当前没有模型响应可打印")
@@ -0,0 +1,210 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Deque, List, Optional
+
+import openai
+from pydantic import BaseModel
+from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, stop_after_delay, \
+    wait_exponential_jitter
+
+from telemetry.metrics import percentile
+
+
+class ResiliencePolicy(BaseModel):
+    timeout: Optional[float] = 180.0                 # 单次请求超时（秒）
+    deadline: Optional[float] = 600.0                # 含重试在内的整体截止时间（秒）
+    max_retries: int = 2                             # 可重试错误的最大重试次数
+    backoff_initial: float = 0.5                     # 指数退避初始等待（秒）
+    backoff_max: float = 8.0                         # 指数退避最大等待（秒）
+    hedge: bool = False                              # 是否开启对冲请求
+    hedge_delay: Optional[float] = None              # 固定对冲延迟（秒），None 时取历史延迟分位数
+    hedge_percentile: float = 95.0                   # 对冲延迟使用的历史延迟分位数
+    hedge_min_samples: int = 20                      # 历史样本不足时不对冲
+
+
+class LatencyTracker:
+    """记录最近成功调用的耗时，用于计算对冲延迟"""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def hedge_delay(self, policy: ResiliencePolicy) -> Optional[float]:
+        if not policy.hedge:
+            return None
+        if policy.hedge_delay is not None:
+            return policy.hedge_delay
+        with self._lock:
+            if len(self._samples) < policy.hedge_min_samples:
+                return None
+            return percentile(list(self._samples), policy.hedge_percentile)
+
+
+# 对冲请求使用的共享线程池
+_hedge_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+# 同时在途的对冲请求上限（落后的请求结束前仍占用名额），用尽时只等待主请求，
+# 避免高负载下对冲使上游流量翻倍、占满线程池
+MAX_HEDGES_IN_FLIGHT = int(os.getenv("SMART_TEACHER_MAX_HEDGES", "8"))
+_hedge_slots = threading.BoundedSemaphore(MAX_HEDGES_IN_FLIGHT)
+
+
+def is_retryable(e: BaseException) -> bool:
+    """超时、连接错误、限流与 5xx 可重试，其余（如 4xx 参数错误）直接失败"""
+    if isinstance(e, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError,
+                      openai.InternalServerError)):
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code >= 500
+
+
+def _attempt_timeout(policy: ResiliencePolicy, deadline_at: Optional[float]) -> Optional[float]:
+    """单次请求可用的超时：取 timeout 与剩余截止时间中较小者"""
+    if deadline_at is None:
+        return policy.timeout
+    remaining = deadline_at - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("LLM 请求超过截止时间")
+    return min(policy.timeout, remaining) if policy.timeout else remaining
+
+
+def _retrying_kwargs(policy: ResiliencePolicy, retries: bool) -> dict:
+    stop = stop_after_attempt((policy.max_retries if retries else 0) + 1)
+    if policy.deadline is not None:
+        stop = stop | stop_after_delay(policy.deadline)
+    return dict(
+        stop=stop,
+        wait=wait_exponential_jitter(initial=policy.backoff_initial, max=policy.backoff_max),
+        retry=retry_if_exception(is_retryable),
+        reraise=True
+    )
+
+
+def _release_slot_when_done(futures: List[Future]) -> None:
+    """主请求与对冲请求都结束（包括落后的请求）后才释放对冲名额"""
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_: Future) -> None:
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            _hedge_slots.release()
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+def _close_result(future: Future) -> None:
+    """落后的请求完成后立即关闭其响应，释放 HTTP 连接"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    close = getattr(future.result(), "close", None)
+    if callable(close):
+        close()
+
+
+def _hedged(fn: Callable[[Optional[float]], Any], timeout: Optional[float], hedge_delay: float) -> Any:
+    """
+    先发主请求，超过对冲延迟仍未返回则再发一个，取先成功者。
+    落后的请求尚未开始时取消；已在执行的线程无法中断，结束后关闭响应，期间继续占用对冲名额
+    """
+    primary = _hedge_pool.submit(contextvars.copy_context().run, fn, timeout)
+    done, _ = wait([primary], timeout=hedge_delay)
+    if done or not _hedge_slots.acquire(blocking=False):
+        return primary.result()
+
+    secondary = _hedge_pool.submit(contextvars.copy_context().run, fn, timeout)
+    _release_slot_when_done([primary, secondary])
+    pending = {primary, secondary}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+    finally:
+        for future in pending:
+            if not future.cancel():
+                future.add_done_callback(_close_result)
+
+
+async def _ahedged(afn: Callable[[Optional[float]], Awaitable[Any]], timeout: Optional[float],
+                   hedge_delay: float) -> Any:
+    """_hedged 的异步版本，落后的请求会被取消"""
+    primary = asyncio.ensure_future(afn(timeout))
+    done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+    if done or not _hedge_slots.acquire(blocking=False):
+        return await primary
+
+    secondary = asyncio.ensure_future(afn(timeout))
+    pending = {primary, secondary}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+        _hedge_slots.release()
+
+
+def call_with_policy(fn: Callable[[Optional[float]], Any], policy: ResiliencePolicy,
+                     tracker: LatencyTracker, idempotent: bool = True, hedge: bool = True) -> Any:
+    """
+    按策略执行调用：每次尝试带超时，幂等调用按指数退避重试，可选对冲
+
+    Args:
+        fn: 接收单次超时参数的调用函数
+        idempotent: 非幂等调用不重试、不对冲
+        hedge: 是否允许对冲（流式调用应关闭）
+    """
+    deadline_at = time.monotonic() + policy.deadline if policy.deadline is not None else None
+    hedge_delay = tracker.hedge_delay(policy) if idempotent and hedge else None
+
+    def attempt() -> Any:
+        timeout = _attempt_timeout(policy, deadline_at)
+        start = time.perf_counter()
+        if hedge_delay is None:
+            result = fn(timeout)
+        else:
+            result = _hedged(fn, timeout, hedge_delay)
+        tracker.add(time.perf_counter() - start)
+        return result
+
+    return Retrying(**_retrying_kwargs(policy, idempotent))(attempt)
+
+
+async def acall_with_policy(afn: Callable[[Optional[float]], Awaitable[Any]], policy: ResiliencePolicy,
+                            tracker: LatencyTracker, idempotent: bool = True, hedge: bool = True) -> Any:
+    """call_with_policy 的异步版本"""
+    deadline_at = time.monotonic() + policy.deadline if policy.deadline is not None else None
+    hedge_delay = tracker.hedge_delay(policy) if idempotent and hedge else None
+
+    async def attempt() -> Any:
+        timeout = _attempt_timeout(policy, deadline_at)
+        start = time.perf_counter()
+        if hedge_delay is None:
+            result = await afn(timeout)
+        else:
+            result = await _ahedged(afn, timeout, hedge_delay)
+        tracker.add(time.perf_counter() - start)
+        return result
+
+    return await AsyncRetrying(**_retrying_kwargs(policy, idempotent))(attempt)
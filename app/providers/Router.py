@@ -0,0 +1,210 @@
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from providers.ProvidersBase import AbstractChat
+
+# 当前线程/协程中最近一次请求实际使用的后端，用于解析响应
+_served_by: ContextVar[Optional[AbstractChat]] = ContextVar("router_served_by", default=None)
+
+
+class BackendHealth:
+    """单个后端的 EWMA 延迟与错误率"""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.last_failure_at = 0.0
+
+    def observe(self, latency: Optional[float], success: bool) -> None:
+        self.calls += 1
+        self.error_rate = self.alpha * (0.0 if success else 1.0) + (1 - self.alpha) * self.error_rate
+        if success:
+            self.latency = latency if self.latency is None else \
+                self.alpha * latency + (1 - self.alpha) * self.latency
+        else:
+            self.failures += 1
+            self.last_failure_at = time.monotonic()
+
+
+class RouterChat(AbstractChat):
+    """
+    多后端路由：按 EWMA 延迟选择当前最快的健康后端，出错时依次故障转移。
+    缓存、重试与调用记录由各后端自身的 call_api 完成
+    """
+
+    def __init__(self, backends: List[AbstractChat], alpha: float = 0.3,
+                 error_threshold: float = 0.5, cooldown: float = 30.0):
+        """
+        Args:
+            backends: 候选后端
+            alpha: EWMA 平滑系数
+            error_threshold: 错误率超过该值视为不健康
+            cooldown: 不健康后端在最近一次失败后经过该时长可再次试探（秒）
+        """
+        if not backends:
+            raise ValueError("至少需要一个后端")
+
+        super().__init__("router[" + ",".join(backend.model for backend in backends) + "]")
+        self.backends = backends
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.client = backends[0].client
+
+        self._lock = threading.Lock()
+        self._health: Dict[int, BackendHealth] = {id(backend): BackendHealth(alpha) for backend in backends}
+
+    def _create_client(self, api_key: str, **kwargs) -> Any:
+        return None
+
+    def _is_healthy(self, health: BackendHealth) -> bool:
+        if health.error_rate < self.error_threshold:
+            return True
+        return time.monotonic() - health.last_failure_at >= self.cooldown
+
+    def ranked_backends(self) -> List[AbstractChat]:
+        """健康后端在前；同组内未测量过的后端优先试探，其余按 EWMA 延迟升序"""
+        with self._lock:
+            def score(backend: AbstractChat):
+                health = self._health[id(backend)]
+                return (
+                    not self._is_healthy(health),
+                    health.latency is not None,
+                    health.latency or 0.0
+                )
+            return sorted(self.backends, key=score)
+
+    def _observe(self, backend: AbstractChat, latency: Optional[float], success: bool) -> None:
+        with self._lock:
+            self._health[id(backend)].observe(latency, success)
+
+    def _route(self, call: Callable[[AbstractChat], Any]) -> Any:
+        error: Optional[Exception] = None
+        for backend in self.ranked_backends():
+            start = time.perf_counter()
+            try:
+                response = call(backend)
+            except Exception as e:
+                self._observe(backend, None, False)
+                print(f"后端 {backend.whoami()} 调用失败，尝试下一个：{str(e)}")
+                error = e
+                continue
+            self._observe(backend, time.perf_counter() - start, True)
+            _served_by.set(backend)
+            return response
+        raise error
+
+    async def _aroute(self, call: Callable[[AbstractChat], Awaitable[Any]]) -> Any:
+        error: Optional[Exception] = None
+        for backend in self.ranked_backends():
+            start = time.perf_counter()
+            try:
+                response = await call(backend)
+            except Exception as e:
+                self._observe(backend, None, False)
+                print(f"后端 {backend.whoami()} 调用失败，尝试下一个：{str(e)}")
+                error = e
+                continue
+            self._observe(backend, time.perf_counter() - start, True)
+            _served_by.set(backend)
+            return response
+        raise error
+
+    def _route_stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[Any]:
+        """
+        流式路由：创建流只是建立连接，延迟按首个 token 到达的时间记录（流中没有 token 时按总耗时）；
+        迭代中出错同样记为后端失败，尚未产出任何数据块时故障转移到下一个后端
+        """
+        error: Optional[Exception] = None
+        for backend in self.ranked_backends():
+            start = time.perf_counter()
+            yielded = measured = False
+            try:
+                for chunk in backend.call_api(messages, True, **kwargs):
+                    if not measured and backend._is_first_token(chunk):
+                        self._observe(backend, time.perf_counter() - start, True)
+                        measured = True
+                    if not yielded:
+                        _served_by.set(backend)
+                        yielded = True
+                    yield chunk
+            except Exception as e:
+                self._observe(backend, None, False)
+                if yielded:
+                    raise
+                print(f"后端 {backend.whoami()} 流式调用失败，尝试下一个：{str(e)}")
+                error = e
+                continue
+            if not measured:
+                self._observe(backend, time.perf_counter() - start, True)
+            return
+        raise error
+
+    async def _aroute_stream(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[Any]:
+        """_route_stream 的异步版本"""
+        error: Optional[Exception] = None
+        for backend in self.ranked_backends():
+            start = time.perf_counter()
+            yielded = measured = False
+            try:
+                async for chunk in await backend.acall_api(messages, True, **kwargs):
+                    if not measured and backend._is_first_token(chunk):
+                        self._observe(backend, time.perf_counter() - start, True)
+                        measured = True
+                    if not yielded:
+                        _served_by.set(backend)
+                        yielded = True
+                    yield chunk
+            except Exception as e:
+                self._observe(backend, None, False)
+                if yielded:
+                    raise
+                print(f"后端 {backend.whoami()} 流式调用失败，尝试下一个：{str(e)}")
+                error = e
+                continue
+            if not measured:
+                self._observe(backend, time.perf_counter() - start, True)
+            return
+        raise error
+
+    def call_api(self, messages: List[Dict[str, str]], stream: bool, **kwargs) -> Any:
+        if stream:
+            return self._route_stream(messages, **kwargs)
+        return self._route(lambda backend: backend.call_api(messages, stream, **kwargs))
+
+    async def acall_api(self, messages: List[Dict[str, str]], stream: bool, **kwargs) -> Any:
+        if stream:
+            return self._aroute_stream(messages, **kwargs)
+        return await self._aroute(lambda backend: backend.acall_api(messages, stream, **kwargs))
+
+    def _call_api(self, messages: List[Dict[str, str]], stream: bool, **kwargs) -> Any:
+        return self.call_api(messages, stream, **kwargs)
+
+    @property
+    def hedges(self) -> bool:
+        return any(backend.hedges for backend in self.backends)
+
+    def _served_backend(self) -> AbstractChat:
+        return _served_by.get() or self.backends[0]
+
+    def _parse_response(self, response: Any) -> Dict[str, Any]:
+        return self._served_backend()._parse_response(response)
+
+    def parse_chunk(self, chunk: Any) -> Dict[str, Any]:
+        return self._served_backend().parse_chunk(chunk)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """各后端的健康状况"""
+        with self._lock:
+            return [{
+                "backend": f"{type(backend).__name__}:{backend.model}",
+                "healthy": self._is_healthy(self._health[id(backend)]),
+                "ewma_latency": self._health[id(backend)].latency,
+                "error_rate": self._health[id(backend)].error_rate,
+                "calls": self._health[id(backend)].calls,
+                "failures": self._health[id(backend)].failures
+            } for backend in self.backends]
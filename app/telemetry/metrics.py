@@ -0,0 +1,132 @@
+import math
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from entity.TelemetryEntity import LLMCallRecord
+from telemetry.tracing import current_trace
+
+# 当前处理阶段的调用记录收集器：(记录列表, 阶段名)
+_current_scope: ContextVar[Optional[Tuple[List[Dict[str, Any]], str]]] = ContextVar("llm_call_scope", default=None)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """最近邻法计算分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class MetricsStore:
+    """进程内LLM调用指标聚合，按 (阶段, 模型) 统计调用量、token 与延迟"""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._window = window
+        self._counters: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._wall_times: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=self._window))
+        self._ttfts: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=self._window))
+
+    def record(self, record: LLMCallRecord) -> None:
+        key = (record.stage or "unknown", record.model)
+        with self._lock:
+            counters = self._counters[key]
+            counters["calls"] += 1
+            counters["errors"] += 0 if record.success else 1
+            counters["cached"] += 1 if record.cached else 0
+            counters["prompt_tokens"] += record.prompt_tokens
+            counters["completion_tokens"] += record.completion_tokens
+            counters["reasoning_tokens"] += record.reasoning_tokens
+            counters["cache_hit_tokens"] += record.cache_hit_tokens
+            self._wall_times[key].append(record.wall_time)
+            if record.ttft is not None:
+                self._ttfts[key].append(record.ttft)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """聚合指标，键为 阶段/模型"""
+        with self._lock:
+            result = {}
+            for key, counters in self._counters.items():
+                wall_times = list(self._wall_times[key])
+                ttfts = list(self._ttfts[key])
+                result[f"{key[0]}/{key[1]}"] = {
+                    **{name: int(value) for name, value in counters.items()},
+                    "wall_time_p50": percentile(wall_times, 50),
+                    "wall_time_p95": percentile(wall_times, 95),
+                    "ttft_p50": percentile(ttfts, 50),
+                    "ttft_p95": percentile(ttfts, 95)
+                }
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._wall_times.clear()
+            self._ttfts.clear()
+
+
+# 进程级单例
+metrics_store = MetricsStore()
+
+
+@contextmanager
+def llm_call_scope(sink: List[Dict[str, Any]], stage: str) -> Iterator[None]:
+    """在作用域内发生的LLM调用会标记阶段名并追加到 sink"""
+    token = _current_scope.set((sink, stage))
+    try:
+        yield
+    finally:
+        _current_scope.reset(token)
+
+
+def record_call(record: LLMCallRecord) -> None:
+    """记录一次调用：写入全局指标，追加到当前作用域的收集器，并在当前 trace 中记录 span"""
+    scope = _current_scope.get()
+    if scope is not None:
+        sink, stage = scope
+        record.stage = record.stage or stage
+        sink.append(record.model_dump())
+    metrics_store.record(record)
+
+    # 调用结束时记录，span 的起点由耗时反推
+    trace = current_trace()
+    if trace is not None:
+        trace.add_completed(
+            f"llm:{record.model}", "llm", record.wall_time,
+            provider=record.provider, model=record.model, stage=record.stage, stream=record.stream,
+            cached=record.cached, success=record.success, error=record.error,
+            prompt_tokens=record.prompt_tokens, completion_tokens=record.completion_tokens,
+            reasoning_tokens=record.reasoning_tokens, cache_hit_tokens=record.cache_hit_tokens,
+            ttft=record.ttft
+        )
+
+
+def summarize_calls(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """汇总单次请求的调用记录"""
+    stages: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        stage = stages.setdefault(record.get("stage") or "unknown", {
+            "calls": 0, "models": [], "prompt_tokens": 0, "completion_tokens": 0,
+            "reasoning_tokens": 0, "cache_hit_tokens": 0, "wall_time": 0.0, "ttft": None
+        })
+        stage["calls"] += 1
+        if record["model"] not in stage["models"]:
+            stage["models"].append(record["model"])
+        for name in ("prompt_tokens", "completion_tokens", "reasoning_tokens", "cache_hit_tokens", "wall_time"):
+            stage[name] += record.get(name) or 0
+        if stage["ttft"] is None:
+            stage["ttft"] = record.get("ttft")
+
+    return {
+        "calls": len(records),
+        "prompt_tokens": sum(stage["prompt_tokens"] for stage in stages.values()),
+        "completion_tokens": sum(stage["completion_tokens"] for stage in stages.values()),
+        "reasoning_tokens": sum(stage["reasoning_tokens"] for stage in stages.values()),
+        "cache_hit_tokens": sum(stage["cache_hit_tokens"] for stage in stages.values()),
+        "wall_time": sum(stage["wall_time"] for stage in stages.values()),
+        "stages": stages
+    }
@@ -0,0 +1,140 @@
+"""
+轻量级请求追踪：处理阶段、模型调用和工具执行各记录一个 span，
+按请求导出为 Chrome trace-event JSON（可在 chrome://tracing 或 Perfetto 中打开）。
+通过采样率控制开销，便于在生产环境常开
+"""
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+# 默认采样率，默认只采样 1% 的请求；排查问题时可通过环境变量 SMART_TEACHER_TRACE_SAMPLE_RATE 调整（0 关闭，1 全部采样）
+DEFAULT_SAMPLE_RATE = float(os.getenv("SMART_TEACHER_TRACE_SAMPLE_RATE", "0.01"))
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+
+class Span:
+    """一段有起止时间的操作，时间单位为微秒（相对于所属 trace 的开始时间）"""
+
+    def __init__(self, name: str, category: str, start_us: float, attributes: Dict[str, Any]):
+        self.name = name
+        self.category = category
+        self.start_us = start_us
+        self.end_us: Optional[float] = None
+        self.thread_id = threading.get_ident()
+        self.thread_name = threading.current_thread().name
+        self.attributes = attributes
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+
+class Trace:
+    """单个请求的全部 span"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans: List[Span] = []
+
+    def now_us(self) -> float:
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def add_completed(self, name: str, category: str, duration: float, **attributes: Any) -> None:
+        """记录一个刚刚结束、耗时为 duration 秒的 span"""
+        end_us = self.now_us()
+        span = Span(name, category, max(0.0, end_us - duration * 1e6), attributes)
+        span.end_us = end_us
+        self.add(span)
+
+    def to_chrome(self) -> Dict[str, Any]:
+        """导出为 Chrome trace-event 格式（完整事件 ph=X，线程名作为元数据事件）"""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+
+        events: List[Dict[str, Any]] = []
+        thread_names: Dict[int, str] = {}
+        for span in spans:
+            thread_names.setdefault(span.thread_id, span.thread_name)
+            events.append({
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": round(span.start_us, 1),
+                "dur": round((span.end_us or span.start_us) - span.start_us, 1),
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": {key: value if isinstance(value, (int, float, str, bool)) or value is None else str(value)
+                         for key, value in span.attributes.items()}
+            })
+        for thread_id, thread_name in thread_names.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id,
+                           "args": {"name": thread_name}})
+
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"trace_id": self.trace_id, "name": self.name, "started_at": self.started_at}
+        }
+
+    def export(self, path: str) -> str:
+        """写入 Chrome trace JSON 文件，返回文件路径"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome(), f, ensure_ascii=False)
+        return path
+
+
+def start_trace(name: str, sample_rate: Optional[float] = None) -> Optional[Trace]:
+    """按采样率创建 trace，未被采样时返回 None（后续 span 均为空操作）"""
+    rate = DEFAULT_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return None
+    return Trace(name)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def use_trace(trace: Optional[Trace]) -> Iterator[Optional[Trace]]:
+    """在作用域内把 trace 设为当前 trace"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str, category: str = "chain", **attributes: Any) -> Iterator[Optional[Span]]:
+    """记录一个 span；没有当前 trace 时不做任何记录"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    current = Span(name, category, trace.now_us(), attributes)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=str(e))
+        raise
+    finally:
+        current.end_us = trace.now_us()
+        trace.add(current)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 与运行 main.py 时一致，以 app 目录为模块根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
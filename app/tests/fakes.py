@@ -0,0 +1,120 @@
+"""测试用的假模型后端：按脚本依次返回响应、抛出异常或产出流式响应块，不访问网络"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import openai
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from providers.ProvidersBase import AbstractChat
+from providers.Resilience import ResiliencePolicy
+
+
+def completion(content: str, tool_calls: Optional[List[Dict[str, Any]]] = None) -> ChatCompletion:
+    message: Dict[str, Any] = {"role": "assistant", "content": content}
+    if tool_calls:
+        message["tool_calls"] = [{"id": f"call_{i}", "type": "function", "function": call}
+                                 for i, call in enumerate(tool_calls)]
+    return ChatCompletion.model_validate({
+        "id": "fake", "object": "chat.completion", "created": 0, "model": "fake",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": message}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+    })
+
+
+def chunk(content: Optional[str] = None, tool_calls: Optional[List[Dict[str, Any]]] = None) -> ChatCompletionChunk:
+    delta: Dict[str, Any] = {"content": content}
+    if tool_calls:
+        delta["tool_calls"] = tool_calls
+    return ChatCompletionChunk.model_validate({
+        "id": "fake", "object": "chat.completion.chunk", "created": 0, "model": "fake",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": None}]
+    })
+
+
+def connection_error() -> openai.APIConnectionError:
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://fake"))
+
+
+class Pause:
+    """流式脚本中的等待（秒）"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+
+def _stream(items: List[Any]):
+    for item in items:
+        if isinstance(item, Pause):
+            time.sleep(item.seconds)
+        elif isinstance(item, BaseException):
+            raise item
+        else:
+            yield item
+
+
+async def _astream(items: List[Any]):
+    for item in items:
+        if isinstance(item, Pause):
+            await asyncio.sleep(item.seconds)
+        elif isinstance(item, BaseException):
+            raise item
+        else:
+            yield item
+
+
+class FakeChat(AbstractChat):
+    """
+    script 的每一项对应一次请求：异常直接抛出；可调用对象以单次超时为参数调用；
+    流式请求时列表为响应块序列（其中的异常在迭代到该位置时抛出）；最后一项重复使用
+    """
+
+    def __init__(self, script: List[Any], model: str = "fake", **policy):
+        super().__init__(model)
+        self.response_cache = None
+        self.resilience = ResiliencePolicy(**{"max_retries": 0, "backoff_initial": 0.0, "backoff_max": 0.0,
+                                              **policy})
+        self.script = list(script)
+        self.calls = 0
+        self.timeouts: List[Optional[float]] = []
+
+    def _next(self, timeout: Optional[float]) -> Any:
+        self.calls += 1
+        self.timeouts.append(timeout)
+        step = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        if isinstance(step, BaseException):
+            raise step
+        return step(timeout) if callable(step) else step
+
+    def _create_client(self, api_key: str, **kwargs) -> Any:
+        return None
+
+    def _call_api(self, messages: List[Dict[str, str]], stream: bool, timeout: Optional[float] = None,
+                  **kwargs) -> Any:
+        step = self._next(timeout)
+        return _stream(step) if stream else step
+
+    async def _acall_api(self, messages: List[Dict[str, str]], stream: bool, timeout: Optional[float] = None,
+                         **kwargs) -> Any:
+        step = self._next(timeout)
+        if asyncio.iscoroutine(step):
+            step = await step
+        return _astream(step) if stream else step
+
+    def _parse_response(self, response: Any) -> Dict[str, Any]:
+        return {
+            "content": response.choices[0].message.content,
+            "reasoning_content": None,
+            "finish_reason": response.choices[0].finish_reason,
+            "message": response,
+            "tool_calls": self._parse_tool_calls(response.choices[0].message),
+            "usage": self._parse_usage(response.usage)
+        }
+
+    def parse_chunk(self, chunk: Any) -> Dict[str, Any]:
+        return {
+            "content": chunk.choices[0].delta.content,
+            "reasoning_content": None,
+            "tool_calls": chunk.choices[0].delta.tool_calls
+        }
@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+from batch_solve import ResultWriter, compact_output, load_finished, load_records, load_tasks, solve_all
+
+
+def _record(record_id: str, status: str, answer: str = None) -> dict:
+    return {"id": record_id, "status": status, "answer": answer}
+
+
+def _write_output(path, records, partial: str = "") -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.write(partial)
+
+
+def _lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+class FailingChain:
+    """aprocess 总是失败的 MathChain 替身"""
+
+    def __init__(self):
+        self.problems = []
+
+    async def aprocess(self, problem, user_background, custom_prompt=""):
+        self.problems.append(problem)
+        raise RuntimeError("模型不可用")
+
+
+def test_last_record_wins_and_partial_line_is_ignored(tmp_path):
+    output = tmp_path / "out.jsonl"
+    _write_output(output, [_record("1", "error"), _record("2", "completed", "x = 1"), _record("1", "completed", "4")],
+                  partial='{"id": "3", "status": "comp')
+    records = load_records(str(output))
+
+    assert list(records) == ["2", "1"]
+    assert records["1"]["answer"] == "4"
+
+
+def test_finished_ids_depend_on_retry_failed(tmp_path):
+    output = tmp_path / "out.jsonl"
+    _write_output(output, [_record("1", "completed"), _record("2", "completed"), _record("2", "error"),
+                           _record("3", "error")])
+
+    assert load_finished(str(output), retry_failed=False) == {"1", "2", "3"}
+    assert load_finished(str(output), retry_failed=True) == {"1"}
+    assert load_finished(str(tmp_path / "missing.jsonl"), retry_failed=True) == set()
+
+
+def test_compact_keeps_one_record_per_id(tmp_path):
+    output = tmp_path / "out.jsonl"
+    _write_output(output, [_record("1", "error"), _record("2", "completed"), _record("1", "completed")],
+                  partial='{"id": "1"')
+    compact_output(str(output))
+
+    assert _lines(output) == [_record("2", "completed"), _record("1", "completed")]
+
+
+def test_retry_run_appends_and_compacts(tmp_path):
+    source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_output(source, [{"id": "1", "question": "1+1"}, {"question": "解方程 x = 2"}, {"id": "3", "problem": "2+2"}])
+    _write_output(output, [_record("1", "completed", "2"), _record("2", "error")])
+
+    tasks = load_tasks(str(source), "高中")
+    finished = load_finished(str(output), retry_failed=True)
+    pending = [task for task in tasks if task["id"] not in finished]
+    assert [task["id"] for task in pending] == ["2", "3"]
+
+    chain, writer = FailingChain(), ResultWriter(str(output))
+    try:
+        summary = asyncio.run(solve_all(pending, chain, {}, writer, concurrency=2, report_interval=60))
+    finally:
+        writer.close()
+    compact_output(str(output))
+
+    assert sorted(chain.problems) == ["2+2", "解方程 x = 2"]
+    assert (summary["completed"], summary["failed"]) == (0, 2)
+    records = _lines(output)
+    assert [record["id"] for record in records].count("2") == 1
+    assert {record["id"]: record["status"] for record in records} == {"1": "completed", "2": "error", "3": "error"}
+    assert next(record for record in records if record["id"] == "3")["error"] == "模型不可用"
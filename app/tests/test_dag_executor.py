@@ -0,0 +1,114 @@
+import asyncio
+import threading
+
+import pytest
+
+from chain.base_handler import BaseHandler, ChainContext
+from chain.dag_executor import ChainDAG
+from chain.tool_executor import ToolExecutor
+from entity.ChainContextEntity import StageStatus, StrategyPlan
+
+
+class Node(BaseHandler):
+    """测试用处理器：把依赖字段的值拼接后写入输出字段，并记录开始与结束顺序"""
+
+    def __init__(self, name, inputs=(), outputs=(), log=None, barrier=None, run=True, fail=False):
+        super().__init__()
+        self.name, self.inputs, self.outputs = name, tuple(inputs), tuple(outputs)
+        self.log = log if log is not None else []
+        self.barrier = barrier
+        self.run_flag, self.fail = run, fail
+
+    def should_run(self, context):
+        return self.run_flag
+
+    def on_skip(self, context):
+        for field in self.outputs:
+            context.metadata[field] = "default"
+
+    def _process(self, context):
+        self.log.append(f"start {self.name}")
+        if self.barrier is not None:
+            # 两个并行节点都开始后才能通过
+            self.barrier.wait(timeout=2)
+        if self.fail:
+            raise ValueError(f"{self.name} 失败")
+        seen = "+".join(context.metadata.get(field, "?") for field in self.inputs)
+        for field in self.outputs:
+            context.metadata[field] = f"{self.name}({seen})"
+        self.log.append(f"end {self.name}")
+        return context
+
+
+def _diamond(log, barrier=None, **overrides):
+    """plan -> (tools, hints) -> answer"""
+    options = {"plan": {}, "tools": {}, "hints": {}, "answer": {}, **overrides}
+    return ChainDAG([
+        Node("answer", ["tool_out", "hint_out"], ["answer_out"], log, **options["answer"]),
+        Node("tools", ["plan_out"], ["tool_out"], log, barrier, **options["tools"]),
+        Node("hints", ["plan_out"], ["hint_out"], log, barrier, **options["hints"]),
+        Node("plan", [], ["plan_out"], log, **options["plan"]),
+    ])
+
+
+def test_dependencies_follow_declared_fields():
+    dag = _diamond([])
+    assert dag.dependencies == {"plan": set(), "tools": {"plan"}, "hints": {"plan"}, "answer": {"tools", "hints"}}
+    assert dag.order[0] == "plan" and dag.order[-1] == "answer"
+    assert dag.downstream("tools") == ["tools", "answer"]
+    assert dag.downstream("plan") == dag.order
+
+
+@pytest.mark.parametrize("runner", ["sync", "async"])
+def test_independent_nodes_run_concurrently_after_dependencies(runner):
+    log = []
+    dag = _diamond(log, threading.Barrier(2))
+    context = ChainContext("题目", "")
+    if runner == "sync":
+        dag.run(context)
+    else:
+        asyncio.run(dag.arun(context))
+
+    assert log[:2] == ["start plan", "end plan"]
+    assert set(log[2:4]) == {"start tools", "start hints"}
+    assert log[-2:] == ["start answer", "end answer"]
+    assert context.metadata["answer_out"] == "answer(tools(plan())+hints(plan()))"
+
+
+def test_skipped_node_writes_defaults_and_downstream_still_runs():
+    log = []
+    context = _diamond(log, tools={"run": False}).run(ChainContext("题目", ""))
+
+    assert "start tools" not in log
+    assert context.stage_status("tools") == StageStatus.SKIPPED
+    assert context.stage_status("answer") == StageStatus.COMPLETED
+    assert context.metadata["answer_out"] == "answer(default+hints(plan()))"
+
+
+def test_failed_node_is_recorded_and_downstream_still_runs():
+    log = []
+    context = asyncio.run(_diamond(log, hints={"fail": True}).arun(ChainContext("题目", "")))
+
+    assert context.stage_status("hints") == StageStatus.ERROR
+    assert "hints 失败" in context.stages["hints"].error
+    assert context.metadata["answer_out"] == "answer(tools(plan())+?)"
+
+
+def test_tool_executor_skips_plan_without_tools():
+    context = ChainContext("什么是导数", "")
+    context.strategy_plan = StrategyPlan(analysis="概念题", tool_calls=[], needs_tools=False)
+    ToolExecutor().run(context)
+
+    assert context.stage_status("tool_executor") == StageStatus.SKIPPED
+    assert context.tool_results is not None and not context.tool_results.executed
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError):
+        ChainDAG([Node("a", outputs=["x"]), Node("a", outputs=["y"])])
+    with pytest.raises(ValueError):
+        ChainDAG([Node("a", outputs=["x"]), Node("b", outputs=["x"])])
+    with pytest.raises(ValueError):
+        ChainDAG([Node("a", ["y"], ["x"]), Node("b", ["x"], ["y"])])
+    with pytest.raises(ValueError):
+        _diamond([]).downstream("missing")
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from tools import math_tools
+from tools.math_tools import MAX_PLOT_SAMPLES, draw_plot, sample_function
+from tools.plot_store import PlotStore
+
+
+def _unavailable(*args, **kwargs):
+    raise NotADirectoryError(20, "Not a directory")
+
+
+@pytest.fixture
+def broken_store(monkeypatch):
+    """绘图缓存目录不可用"""
+    monkeypatch.setattr(math_tools, "PLOT_CACHE_ENABLED", True)
+    monkeypatch.setattr(math_tools.plot_store, "get", _unavailable)
+    monkeypatch.setattr(math_tools.plot_store, "put", _unavailable)
+
+
+def test_memory_plot_survives_store_error(broken_store):
+    result = draw_plot(plot_type="function", functions=["sin(x)"], x_range=[-1, 1], samples=50)
+    assert result["success"] and result["image"] and not result["cached"]
+
+
+def test_file_plot_falls_back_to_direct_write(broken_store, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    result = draw_plot(plot_type="function", functions=["x**2"], x_range=[-1, 1], samples=50, output="file")
+    assert result["success"]
+    assert result["file_path"].startswith(str(tmp_path))
+
+
+def test_sample_function_caps_samples():
+    x, _ = sample_function(lambda x: x, [0, 1], MAX_PLOT_SAMPLES * 100)
+    assert len(x) == MAX_PLOT_SAMPLES
+
+
+def test_file_plot_is_not_written_into_store(tmp_path, monkeypatch):
+    store = PlotStore(str(tmp_path / "store"))
+    monkeypatch.setattr(math_tools, "PLOT_CACHE_ENABLED", True)
+    monkeypatch.setattr(math_tools, "plot_store", store)
+    monkeypatch.chdir(tmp_path)
+    for _ in range(2):
+        result = draw_plot(plot_type="function", functions=["x**3"], x_range=[-1, 1], samples=50, output="file")
+        # 第二次命中缓存，返回的仍是调用方目录中的文件，缓存淘汰后不会失效
+        assert result["success"] and os.path.exists(result["file_path"])
+        assert not os.path.abspath(result["file_path"]).startswith(store.directory)
+    assert result["cached"]
+
+
+def test_store_overwrite_counts_size_once(tmp_path):
+    store = PlotStore(str(tmp_path))
+    store.put("aa01", "png", b"x" * 10)
+    store.put("bb02", "png", b"y" * 20)
+    store.put("aa01", "png", b"z" * 15)
+    assert store._usage == store.usage()["bytes"] == 35
@@ -0,0 +1,31 @@
+import time
+
+import pytest
+
+from agents.local_classifier import LocalClassifier
+from tools.math_tools import solve_equation
+
+
+def _calls(problem: str):
+    response = LocalClassifier().classify(problem)
+    return [(call.function_name, call.parameters) for call in response.function_results] if response else None
+
+
+@pytest.mark.parametrize("problem", ["计算 10**10**10", "计算 factorial(100000000)", "计算 100000000!"])
+def test_classification_does_not_evaluate_user_input(problem):
+    start = time.perf_counter()
+    calls = _calls(problem)
+    assert time.perf_counter() - start < 1
+    assert calls[0][0] == "calculate_expression"
+
+
+def test_tool_text_keeps_written_form_or_uses_parse_result():
+    assert _calls("计算 (2+3)*4-5^2") == [("calculate_expression", {"expression": "(2+3)*4-5**2"})]
+    assert _calls("解方程 2(x+1)=4") == [("solve_equation", {"equation": "2*(x + 1) = 4", "variable": "x"})]
+
+
+@pytest.mark.parametrize("equation, degenerate", [("x = x", "identity"), ("x + 1 = x + 2", "contradiction")])
+def test_solver_marks_equations_whose_unknown_cancels(equation, degenerate):
+    assert _calls(f"解 {equation}")[0][0] == "solve_equation"
+    result = solve_equation(equation, "x")
+    assert result["success"] and result["degenerate"] == degenerate and result["solutions"] == []
@@ -0,0 +1,89 @@
+from entity.Conversation import ChatMessageType
+from entity.Models import Chat, ChatContent
+from fakes import FakeChat
+from providers.Memory import MESSAGE_OVERHEAD_TOKENS, SUMMARY_PREFIX, MemoryPolicy, estimate_tokens
+
+
+def _length(text):
+    return len(text or "")
+
+
+def _message(role: str, content: str) -> ChatContent:
+    chat_type = {"system": ChatMessageType.SYSTEM_PROMPT, "user": ChatMessageType.NORMAL_MESSAGE_USER,
+                 "assistant": ChatMessageType.NORMAL_MESSAGE_ASSISTANT}[role]
+    return ChatContent(role=role, content=content, reasoning_content=None, chat_type=chat_type)
+
+
+def _chat(*dialog: str) -> Chat:
+    """系统提示加交替的用户 / 助手消息"""
+    messages = [_message("system", "你是数学老师")]
+    messages += [_message("user" if i % 2 == 0 else "assistant", text) for i, text in enumerate(dialog)]
+    return Chat(messages)
+
+
+def _contents(chat: Chat):
+    return [m.content for m in chat.messages]
+
+
+def _budget(*texts: str) -> int:
+    return sum(len(text) + MESSAGE_OVERHEAD_TOKENS for text in texts)
+
+
+def test_estimate_tokens_weights_cjk_higher():
+    assert estimate_tokens(None) == 0
+    assert estimate_tokens("解方程") > estimate_tokens("abc")
+
+
+def test_within_budget_is_untouched():
+    chat = _chat("q1", "a1")
+    MemoryPolicy(max_tokens=_budget("你是数学老师", "q1", "a1"), estimator=_length).apply(chat)
+    assert _contents(chat) == ["你是数学老师", "q1", "a1"]
+
+
+def test_oldest_messages_are_dropped_and_system_prompt_kept():
+    chat = _chat("q1" * 10, "a1" * 10, "q2", "a2")
+    MemoryPolicy(max_tokens=_budget("你是数学老师", "q2", "a2"), estimator=_length).apply(chat)
+    assert _contents(chat) == ["你是数学老师", "q2", "a2"]
+
+
+def test_min_recent_messages_kept_over_budget():
+    chat = _chat("q1", "a1", "长" * 100)
+    MemoryPolicy(max_tokens=1, min_recent_messages=2, estimator=_length).apply(chat)
+    assert _contents(chat) == ["你是数学老师", "a1", "长" * 100]
+
+
+def test_evicted_messages_roll_into_one_summary():
+    calls = []
+
+    def summarize(evicted, previous):
+        calls.append(([m.content for m in evicted], previous))
+        return "摘要" + str(len(calls))
+
+    policy = MemoryPolicy(max_tokens=_budget("你是数学老师", SUMMARY_PREFIX + "摘要1", "q2", "a2"),
+                          summarizer=summarize, estimator=_length)
+    chat = _chat("q1" * 10, "a1" * 10, "q2", "a2")
+    policy.apply(chat)
+    assert _contents(chat) == ["你是数学老师", SUMMARY_PREFIX + "摘要1", "q2", "a2"]
+
+    chat.messages += [_message("user", "q3"), _message("assistant", "a3")]
+    policy.apply(chat)
+    assert _contents(chat) == ["你是数学老师", SUMMARY_PREFIX + "摘要2", "q3", "a3"]
+    assert chat.count_by_type(ChatMessageType.SUMMARY_MESSAGE) == 1
+    assert calls == [(["q1" * 10, "a1" * 10], None), (["q2", "a2"], "摘要1")]
+
+
+def test_summarizer_failure_falls_back_to_dropping():
+    def broken(evicted, previous):
+        raise RuntimeError("摘要模型不可用")
+
+    chat = _chat("q1", "a1", "q2", "a2")
+    MemoryPolicy(max_tokens=_budget("你是数学老师", "q2", "a2"), summarizer=broken, estimator=_length).apply(chat)
+    assert _contents(chat) == ["你是数学老师", "q2", "a2"]
+
+
+def test_prepare_messages_applies_policy():
+    chat = FakeChat([None])
+    chat.memory_policy = MemoryPolicy(max_tokens=_budget("系统", "q3"), min_recent_messages=1, estimator=_length)
+    for question in ("q1", "q2", "q3"):
+        messages = chat.prepare_messages(question, system_prompt="系统")
+    assert messages == [{"role": "system", "content": "系统"}, {"role": "user", "content": "q3"}]
@@ -0,0 +1,78 @@
+import pytest
+
+from chain.base_handler import ChainContext
+from chain.quick_answer import QUICK_ANSWER_STYLE, _latex, _latex_as_written, is_eligible, render_quick_answer
+from entity.ChainContextEntity import ToolExecutionResult, ToolResults
+from tools.math_tools import calculate_expression
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("(2+3)*4-5**2", r"\left(2 + 3\right) \times 4 - 5^{2}"),
+    ("2**-3", "2^{-3}"),
+    ("2**x**2", "2^{x^{2}}"),
+    ("(2**3)**2", r"\left(2^{3}\right)^{2}"),
+    ("(-2)**2", r"\left(-2\right)^{2}"),
+    ("-2**2", "-2^{2}"),
+    ("2*-3", r"2 \times \left(-3\right)"),
+    ("3-(2-1)", r"3 - \left(2 - 1\right)"),
+    ("sqrt(16)+3*2", r"\sqrt{16} + 3 \times 2"),
+    ("2^10", "2^{10}"),
+])
+def test_latex_as_written(expression, expected):
+    assert _latex_as_written(expression) == expected
+
+
+def test_latex_as_written_falls_back_to_sympy():
+    assert _latex_as_written("Rational(1, 2)") == r"\frac{1}{2}"
+
+
+def test_latex_does_not_evaluate():
+    assert _latex("10**10**10 - factorial(10**8)") == r"10^{10^{10}} - \left(10^{8}\right)!"
+
+
+@pytest.mark.parametrize("expression, exact", [("2**-3", "1/8"), ("0.1+0.2", "3/10"), ("2**10", None),
+                                               ("sqrt(2)", None), ("1/3 + 10**-20", None)])
+def test_calculation_returns_exact_rational(expression, exact):
+    assert calculate_expression(expression)["exact"] == exact
+
+
+def _calculation_context(background: str, strategy_source: str) -> ChainContext:
+    context = ChainContext("计算 2**-3", background)
+    context.metadata["strategy_source"] = strategy_source
+    context.tool_results = ToolResults(executed=True, summary="成功执行了 1 个工具", results=[
+        ToolExecutionResult(tool_name="calculate_expression", arguments={"expression": "2**-3"},
+                            result={"success": True, "expression": "2**-3", "result": 0.125, "exact": "1/8"},
+                            success=True)
+    ])
+    return context
+
+
+def test_quick_answer_renders_locally_classified_calculation():
+    context = _calculation_context(QUICK_ANSWER_STYLE, "local")
+    assert is_eligible(context, "style")
+    answer = render_quick_answer(context)
+    assert "$$ 2^{-3} = 0.125 $$" in answer
+    assert r"\frac{1}{8}" in answer
+
+
+def test_quick_answer_requires_local_problem_class():
+    # LLM 规划的题目（如应用题）即使只用到计算工具，也不套模板
+    assert not is_eligible(_calculation_context(QUICK_ANSWER_STYLE, "llm"), "always")
+    assert not is_eligible(_calculation_context(QUICK_ANSWER_STYLE, "llm"), "style")
+
+
+def test_quick_answer_modes():
+    assert not is_eligible(_calculation_context(QUICK_ANSWER_STYLE, "local"), "off")
+    assert not is_eligible(_calculation_context("详细步骤", "local"), "style")
+    assert is_eligible(_calculation_context("详细步骤", "local"), "always")
+
+
+def test_quick_answer_skips_equations_whose_unknown_cancels():
+    context = ChainContext("解 x = x", QUICK_ANSWER_STYLE)
+    context.metadata["strategy_source"] = "local"
+    context.tool_results = ToolResults(executed=True, summary="成功执行了 1 个工具", results=[
+        ToolExecutionResult(tool_name="solve_equation", arguments={"equation": "x = x", "variable": "x"},
+                            result={"success": True, "solutions": [], "degenerate": "identity",
+                                    "equation": "x = x", "variable": "x"}, success=True)
+    ])
+    assert not is_eligible(context, "style")
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from fakes import connection_error
+from providers import Resilience
+from providers.Resilience import LatencyTracker, ResiliencePolicy, acall_with_policy, call_with_policy
+
+
+def _policy(**fields) -> ResiliencePolicy:
+    return ResiliencePolicy(**{"backoff_initial": 0.0, "backoff_max": 0.0, **fields})
+
+
+class Script:
+    """按顺序执行的调用脚本，记录每次尝试拿到的超时"""
+
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self.timeouts = []
+
+    def __call__(self, timeout):
+        self.timeouts.append(timeout)
+        step = self.steps.pop(0)
+        return step() if callable(step) else step
+
+
+class Response:
+    def __init__(self, name: str):
+        self.name = name
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+
+def _raise(error):
+    def step():
+        raise error
+    return step
+
+
+def _slow(seconds: float, value):
+    def step():
+        time.sleep(seconds)
+        return value
+    return step
+
+
+def test_retries_retryable_errors():
+    script = Script(_raise(connection_error()), _raise(connection_error()), "ok")
+    assert call_with_policy(script, _policy(max_retries=2), LatencyTracker()) == "ok"
+    assert len(script.timeouts) == 3
+
+
+def test_does_not_retry_other_errors_or_non_idempotent_calls():
+    script = Script(_raise(ValueError("参数错误")), "ok")
+    with pytest.raises(ValueError):
+        call_with_policy(script, _policy(max_retries=2), LatencyTracker())
+    assert len(script.timeouts) == 1
+
+    script = Script(_raise(connection_error()), "ok")
+    with pytest.raises(Exception):
+        call_with_policy(script, _policy(max_retries=2), LatencyTracker(), idempotent=False)
+    assert len(script.timeouts) == 1
+
+
+def test_deadline_bounds_attempt_timeouts_and_stops_retrying():
+    def slow_failure():
+        time.sleep(0.15)
+        raise connection_error()
+
+    script = Script(*[slow_failure] * 5)
+    start = time.monotonic()
+    with pytest.raises(Exception):
+        call_with_policy(script, _policy(timeout=10.0, deadline=0.2, max_retries=5), LatencyTracker())
+    assert time.monotonic() - start < 1.0
+    assert len(script.timeouts) == 2
+    assert all(timeout <= 0.2 for timeout in script.timeouts)
+
+
+def test_hedge_returns_faster_attempt_and_closes_loser():
+    slow, fast = Response("slow"), Response("fast")
+    script = Script(_slow(0.3, slow), fast)
+    result = call_with_policy(script, _policy(hedge=True, hedge_delay=0.02), LatencyTracker())
+
+    assert result is fast
+    assert slow.closed.wait(2)
+    assert not fast.closed.is_set()
+
+
+def test_hedge_is_skipped_when_no_slot_is_free(monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(Resilience, "_hedge_slots", slots)
+    script = Script(_slow(0.1, "primary"), "hedge")
+
+    assert call_with_policy(script, _policy(hedge=True, hedge_delay=0.02), LatencyTracker()) == "primary"
+    assert len(script.timeouts) == 1
+
+
+def test_hedge_slot_is_held_until_loser_finishes(monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(Resilience, "_hedge_slots", slots)
+    loser = Response("slow")
+    script = Script(_slow(0.3, loser), "fast")
+
+    assert call_with_policy(script, _policy(hedge=True, hedge_delay=0.02), LatencyTracker()) == "fast"
+    assert not slots.acquire(blocking=False)
+    assert loser.closed.wait(2)
+    assert slots.acquire(timeout=1)
+
+
+def test_async_hedge_cancels_loser_and_releases_slot(monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(Resilience, "_hedge_slots", slots)
+    cancelled = []
+
+    async def attempt(timeout):
+        if not cancelled:
+            cancelled.append(False)
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled[0] = True
+                raise
+            return "slow"
+        return "fast"
+
+    result = asyncio.run(acall_with_policy(attempt, _policy(hedge=True, hedge_delay=0.02), LatencyTracker()))
+    assert result == "fast"
+    assert cancelled == [True]
+    assert slots.acquire(blocking=False)
@@ -0,0 +1,117 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+from fakes import FakeChat, chunk, completion, connection_error
+from providers import ResponseCache as response_cache_module
+from providers.ResponseCache import ResponseCache
+
+MESSAGES = [{"role": "user", "content": "解方程 x + 1 = 2"}]
+
+
+def _cached_chat(script, model: str = "fake") -> FakeChat:
+    chat = FakeChat(script, model=model)
+    chat.enable_cache(ResponseCache(":memory:"))
+    return chat
+
+
+def test_repeated_request_hits_cache():
+    chat = _cached_chat([completion("x = 1")])
+    first = chat.call_api(MESSAGES, stream=False)
+    second = chat.call_api(MESSAGES, stream=False)
+
+    assert chat.calls == 1
+    assert second.choices[0].message.content == first.choices[0].message.content == "x = 1"
+    stats = chat.response_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_async_call_shares_cache_with_sync_call():
+    chat = _cached_chat([completion("x = 1")])
+    chat.call_api(MESSAGES, stream=False)
+    response = asyncio.run(chat.acall_api(MESSAGES, stream=False))
+
+    assert chat.calls == 1
+    assert response.choices[0].message.content == "x = 1"
+
+
+@pytest.mark.parametrize("other", [
+    dict(messages=[{"role": "user", "content": "解方程 x + 2 = 2"}]),
+    dict(temperature=0.7),
+    dict(tools=[{"type": "function", "function": {"name": "solve_equation"}}]),
+])
+def test_different_requests_do_not_share_entries(other):
+    chat = _cached_chat([completion("第一次"), completion("第二次")])
+    chat.call_api(MESSAGES, stream=False)
+    response = chat.call_api(**{"messages": MESSAGES, "stream": False, **other})
+
+    assert chat.calls == 2
+    assert response.choices[0].message.content == "第二次"
+
+
+def test_models_do_not_share_entries():
+    cache = ResponseCache(":memory:")
+    chat, other = FakeChat([completion("chat")]), FakeChat([completion("reasoner")], model="fake-reasoner")
+    chat.enable_cache(cache)
+    other.enable_cache(cache)
+    chat.call_api(MESSAGES, stream=False)
+
+    assert other.call_api(MESSAGES, stream=False).choices[0].message.content == "reasoner"
+    assert cache.stats()["entries"] == 2
+
+
+def test_use_cache_false_bypasses_cache():
+    chat = _cached_chat([completion("x = 1")])
+    chat.call_api(MESSAGES, stream=False)
+    chat.call_api(MESSAGES, stream=False, use_cache=False)
+
+    assert chat.calls == 2
+
+
+def test_stream_replays_cached_chunks_and_is_keyed_apart():
+    chat = _cached_chat([[chunk("x "), chunk("= 1")], completion("x = 1")])
+    first = [c.choices[0].delta.content for c in chat.call_api(MESSAGES, stream=True)]
+    replayed = [c.choices[0].delta.content for c in chat.call_api(MESSAGES, stream=True)]
+
+    assert first == replayed == ["x ", "= 1"]
+    assert chat.calls == 1
+    # 非流式请求不会命中流式缓存
+    chat.call_api(MESSAGES, stream=False)
+    assert chat.calls == 2
+
+
+def test_interrupted_stream_is_not_cached():
+    chat = _cached_chat([[chunk("x "), connection_error()], [chunk("x = 1")]])
+    with pytest.raises(openai.APIConnectionError):
+        list(chat.call_api(MESSAGES, stream=True))
+    assert chat.response_cache.stats()["entries"] == 0
+
+    assert [c.choices[0].delta.content for c in chat.call_api(MESSAGES, stream=True)] == ["x = 1"]
+    assert chat.calls == 2
+
+
+def test_expired_entry_is_a_miss(monkeypatch):
+    cache = ResponseCache(":memory:", ttl=60)
+    cache.set("key", "payload")
+    monkeypatch.setattr(response_cache_module, "time", SimpleNamespace(time=lambda: time.time() + 61))
+
+    assert cache.get("key") is None
+    stats = cache.stats()
+    assert (stats["expired"], stats["entries"]) == (1, 0)
+
+
+def test_least_recently_used_entry_is_evicted(monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr(response_cache_module, "time", SimpleNamespace(time=lambda: next(clock)))
+    cache = ResponseCache(":memory:", max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+    assert cache.stats()["evictions"] == 1
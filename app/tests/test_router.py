@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+from fakes import FakeChat, Pause, chunk, completion, connection_error
+from providers.Router import RouterChat
+
+MESSAGES = [{"role": "user", "content": "1+1"}]
+
+
+def _health(router: RouterChat, backend: FakeChat):
+    return router._health[id(backend)]
+
+
+def test_fails_over_and_ranks_failing_backend_last():
+    broken, healthy = FakeChat([connection_error()], model="broken"), FakeChat([completion("2")], model="healthy")
+    router = RouterChat([broken, healthy], error_threshold=0.2)
+
+    assert router.call_api(MESSAGES, stream=False).choices[0].message.content == "2"
+    assert _health(router, broken).failures == 1
+    assert router.ranked_backends() == [healthy, broken]
+
+
+def test_prefers_lower_ewma_latency_after_probing_unmeasured_backends():
+    def slow(timeout):
+        time.sleep(0.05)
+        return completion("slow")
+
+    slow_backend, fast_backend = FakeChat([slow], model="slow"), FakeChat([completion("fast")], model="fast")
+    router = RouterChat([slow_backend, fast_backend])
+
+    # 未测量过的后端优先试探
+    assert router.call_api(MESSAGES, stream=False).choices[0].message.content == "slow"
+    assert router.ranked_backends()[0] is fast_backend
+    assert router.call_api(MESSAGES, stream=False).choices[0].message.content == "fast"
+    assert router.ranked_backends() == [fast_backend, slow_backend]
+
+
+def test_stream_fails_over_before_first_chunk():
+    broken = FakeChat([[connection_error()]], model="broken")
+    healthy = FakeChat([[chunk("1"), chunk("+1")]], model="healthy")
+    router = RouterChat([broken, healthy])
+
+    deltas = list(router.stream_api(MESSAGES))
+    assert [delta["content"] for delta in deltas] == ["1", "+1"]
+    assert _health(router, broken).failures == 1
+    assert _health(router, healthy).calls == 1
+
+
+def test_stream_error_after_first_chunk_marks_backend_down_without_failover():
+    flaky = FakeChat([[chunk("1"), connection_error()]], model="flaky")
+    other = FakeChat([[chunk("2")]], model="other")
+    router = RouterChat([flaky, other], error_threshold=0.2)
+
+    stream = router.stream_api(MESSAGES)
+    assert next(stream)["content"] == "1"
+    with pytest.raises(Exception):
+        next(stream)
+    assert _health(router, flaky).failures == 1
+    assert other.calls == 0
+    assert router.ranked_backends()[-1] is flaky
+
+
+def test_stream_latency_is_time_to_first_token():
+    backend = FakeChat([[chunk(None), Pause(0.05), chunk("2")]])
+    router = RouterChat([backend])
+
+    list(router.stream_api(MESSAGES))
+    assert _health(router, backend).latency >= 0.05
+
+
+def test_async_stream_fails_over_before_first_chunk():
+    broken = FakeChat([[connection_error()]], model="broken")
+    healthy = FakeChat([[chunk("ok")]], model="healthy")
+    router = RouterChat([broken, healthy])
+
+    async def collect():
+        return [delta["content"] async for delta in router.astream_api(MESSAGES)]
+
+    assert asyncio.run(collect()) == ["ok"]
+    assert _health(router, broken).failures == 1
@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+from tools.sandbox import ToolSandbox
+
+# 在 sympy 中不会在截止时间内算完的表达式
+HANGING = {"expression": "factorial(10**8)"}
+
+
+@pytest.fixture
+def sandbox():
+    sandbox = ToolSandbox(workers=1, timeout=1, memory_limit_mb=4096)
+    # 等待工作进程完成预加载，避免启动耗时计入后续调用的截止时间
+    assert sandbox.run("calculate_expression", {"expression": "1+1"}, timeout=60)["success"]
+    yield sandbox
+    sandbox.close()
+
+
+def _worker_process(sandbox: ToolSandbox):
+    assert len(sandbox._all) == 1
+    return sandbox._all[0].process
+
+
+def _assert_replaced(sandbox: ToolSandbox, process) -> None:
+    """原工作进程已被杀掉，新进程可以正常执行工具"""
+    assert not process.is_alive()
+    assert _worker_process(sandbox) is not process
+    result = sandbox.run("calculate_expression", {"expression": "2**10"}, timeout=60)
+    assert result["success"] and result["result"] == 1024
+
+
+def test_deadline_kills_and_replaces_worker(sandbox):
+    process = _worker_process(sandbox)
+    result = sandbox.run("calculate_expression", HANGING)
+
+    assert not result["success"] and result["reason"] == "timeout"
+    stats = sandbox.stats()
+    assert (stats["timeouts"], stats["respawns"], stats["workers"]) == (1, 1, 1)
+    _assert_replaced(sandbox, process)
+
+
+def test_memory_limit_kills_and_replaces_worker(sandbox):
+    process = _worker_process(sandbox)
+    sandbox.memory_limit_mb = 1
+    result = sandbox.run("calculate_expression", HANGING)
+    sandbox.memory_limit_mb = 4096
+
+    assert not result["success"] and result["reason"] == "memory_exceeded"
+    assert sandbox.stats()["memory_kills"] == 1
+    _assert_replaced(sandbox, process)
+
+
+def test_crashed_worker_is_replaced(sandbox):
+    process = _worker_process(sandbox)
+    process.kill()
+    process.join()
+    result = sandbox.run("calculate_expression", {"expression": "1+1"})
+
+    assert not result["success"] and result["reason"] == "crashed"
+    assert sandbox.stats()["crashes"] == 1
+    _assert_replaced(sandbox, process)
+
+
+def test_waiting_for_busy_worker_counts_against_deadline(sandbox):
+    busy = threading.Thread(target=sandbox.run, args=("calculate_expression", HANGING), daemon=True)
+    busy.start()
+    result = sandbox.run("calculate_expression", {"expression": "1+1"}, timeout=0.2)
+    busy.join(5)
+
+    assert not result["success"] and result["reason"] == "timeout"
+    assert "等待空闲工作进程" in result["error"]
+    assert sandbox.stats()["timeouts"] == 2
+
+
+def test_tool_errors_keep_worker(sandbox):
+    process = _worker_process(sandbox)
+    result = sandbox.run("no_such_tool", {})
+
+    assert not result["success"]
+    assert _worker_process(sandbox) is process and process.is_alive()
+    assert sandbox.stats()["respawns"] == 0
@@ -0,0 +1,184 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from chain.base_handler import ChainContext
+from chain.single_flight import SingleFlight
+from telemetry.tracing import Trace, current_trace, use_trace
+
+KEY = ("scope", "key")
+
+
+def _wait_until(predicate, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("等待超时")
+        time.sleep(0.005)
+
+
+def _in_thread(fn):
+    """在线程中执行 fn，返回 (thread, outcome)，outcome 在结束后含 result 或 error"""
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = fn()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+def _unexpected():
+    raise AssertionError("合并的请求不应再次执行")
+
+
+def _events(gate: threading.Event, context: ChainContext, closed: list = None, trace: Trace = None):
+    """产出 a，等待 gate 后产出 b 和 done；closed 记录生成器退出时所在的线程"""
+    try:
+        with use_trace(trace):
+            yield {"type": "content", "delta": "a"}
+            assert gate.wait(2)
+            assert current_trace() is trace
+            yield {"type": "content", "delta": "b"}
+        yield {"type": "done", "context": context}
+    finally:
+        if closed is not None:
+            closed.append(threading.current_thread())
+
+
+def test_run_follower_gets_its_own_error():
+    flight, gate = SingleFlight(), threading.Event()
+    error = ValueError("模型调用失败")
+
+    def fail():
+        assert gate.wait(2)
+        raise error
+
+    leader, leader_outcome = _in_thread(lambda: flight.run(KEY, fail))
+    _wait_until(lambda: flight.stats()["in_flight"] == 1)
+    follower, follower_outcome = _in_thread(lambda: flight.run(KEY, _unexpected))
+    _wait_until(lambda: flight.stats()["coalesced"] == 1)
+    gate.set()
+    leader.join(2)
+    follower.join(2)
+
+    assert leader_outcome["error"] is error
+    assert isinstance(follower_outcome["error"], RuntimeError)
+    assert follower_outcome["error"].__cause__ is error
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_stream_follower_gets_leader_error():
+    flight, gate = SingleFlight(), threading.Event()
+
+    def fail():
+        yield {"type": "content", "delta": "a"}
+        assert gate.wait(2)
+        raise ValueError("流式输出中断")
+
+    leader = flight.stream(KEY, fail)
+    assert next(leader)["delta"] == "a"
+    follower, outcome = _in_thread(lambda: list(flight.stream(KEY, _unexpected)))
+    _wait_until(lambda: flight.stats()["coalesced"] == 1)
+    gate.set()
+    with pytest.raises(ValueError):
+        next(leader)
+    follower.join(2)
+
+    assert isinstance(outcome["error"], RuntimeError)
+    assert isinstance(outcome["error"].__cause__, ValueError)
+
+
+def test_late_joiner_replays_stream_from_start():
+    flight, gate = SingleFlight(), threading.Event()
+    context = ChainContext("解方程 x + 1 = 2", "高中")
+
+    leader = flight.stream(KEY, lambda: _events(gate, context))
+    assert next(leader)["delta"] == "a"
+    follower, outcome = _in_thread(lambda: list(flight.stream(KEY, _unexpected)))
+    _wait_until(lambda: flight.stats()["coalesced"] == 1)
+    gate.set()
+    assert [event["type"] for event in leader] == ["content", "done"]
+    follower.join(2)
+
+    events = outcome["result"]
+    assert [event.get("delta") for event in events[:2]] == ["a", "b"]
+    shared = events[2]["context"]
+    assert shared is not context and shared.metadata["coalesced_from"] == context.context_id
+
+
+def test_abandoned_leader_hands_off_to_waiting_follower():
+    flight, gate, closed = SingleFlight(), threading.Event(), []
+    context, trace = ChainContext("分析函数 x**2", "高中"), Trace("single-flight")
+
+    leader = flight.stream(KEY, lambda: _events(gate, context, closed, trace))
+    assert next(leader)["delta"] == "a"
+    follower, outcome = _in_thread(lambda: list(flight.stream(KEY, _unexpected)))
+    _wait_until(lambda: flight.stats()["coalesced"] == 1)
+    leader.close()
+    gate.set()
+    follower.join(2)
+
+    # 后台线程在原 Context 中继续推进生成器，use_trace 的 reset 不会因跨线程失败
+    assert [event.get("delta") for event in outcome["result"][:2]] == ["a", "b"]
+    assert outcome["result"][2]["type"] == "done"
+    assert closed and closed[0] is not threading.current_thread()
+    assert flight.stats()["handoffs"] == 1
+
+
+def test_abandoned_leader_without_followers_cancels_execution():
+    flight, closed = SingleFlight(), []
+
+    leader = flight.stream(KEY, lambda: _events(threading.Event(), ChainContext("1+1", ""), closed))
+    assert next(leader)["delta"] == "a"
+    leader.close()
+
+    assert closed == [threading.current_thread()]
+    assert flight.stats()["in_flight"] == 0
+    assert flight.stats()["handoffs"] == 0
+
+
+def test_abandoned_follower_does_not_affect_leader():
+    flight, gate = SingleFlight(), threading.Event()
+    context = ChainContext("计算 2**10", "")
+
+    leader = flight.stream(KEY, lambda: _events(gate, context))
+    assert next(leader)["delta"] == "a"
+    follower = flight.stream(KEY, _unexpected)
+    assert next(follower)["delta"] == "a"
+    assert flight._flights[KEY].waiters == 1
+    follower.close()
+    assert flight._flights[KEY].waiters == 0
+
+    gate.set()
+    assert [event["type"] for event in leader] == ["content", "done"]
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_sync_caller_joins_async_flight():
+    flight, gate = SingleFlight(), threading.Event()
+    context = ChainContext("计算 3*4", "")
+
+    async def solve():
+        assert await asyncio.to_thread(gate.wait, 2)
+        return context
+
+    leader, leader_outcome = _in_thread(lambda: asyncio.run(flight.arun(KEY, solve)))
+    _wait_until(lambda: flight.stats()["in_flight"] == 1)
+    follower, follower_outcome = _in_thread(lambda: flight.run(KEY, _unexpected))
+    _wait_until(lambda: flight.stats()["coalesced"] == 1)
+    gate.set()
+    leader.join(2)
+    follower.join(2)
+
+    assert leader_outcome["result"] is context
+    shared = follower_outcome["result"]
+    assert shared.context_id != context.context_id
+    assert shared.metadata["coalesced_from"] == context.context_id
+    assert flight.stats()["executions"] == 1
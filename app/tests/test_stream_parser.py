@@ -0,0 +1,138 @@
+import asyncio
+import json
+from concurrent.futures import Future
+
+from openai.types.chat.chat_completion_chunk import ChoiceDeltaToolCall
+
+from agents.function_caller import FunctionCaller
+from agents.stream_parser import FunctionCallsStreamParser, ToolCallStreamAccumulator
+from chain.base_handler import ChainContext
+from chain.strategy_planner import StrategyPlanner
+from entity.ChainContextEntity import FunctionCall
+from fakes import FakeChat, chunk, connection_error
+
+SOLVE = {"function_name": "solve_equation", "parameters": {"equation": "x + 1 = 2"}, "reason": "含 {花括号} 的说明"}
+CALC = {"function_name": "calculate_expression", "parameters": {"expression": "2**10"}}
+
+
+def _tool_delta(index: int, name: str = None, arguments: str = None) -> dict:
+    function = {"arguments": arguments}
+    if name:
+        function["name"] = name
+    return {"index": index, "id": f"call_{index}" if name else None, "type": "function", "function": function}
+
+
+def _native_chunks():
+    """两个原生工具调用，参数分多块到达；第一个在第二个开始前闭合"""
+    return [
+        chunk("先解方程"),
+        chunk(tool_calls=[_tool_delta(0, "solve_equation", '{"equation": ')]),
+        chunk(tool_calls=[_tool_delta(0, arguments='"x + 1 = 2"}')]),
+        chunk(tool_calls=[_tool_delta(1, "calculate_expression", '{"expression"')]),
+        chunk(tool_calls=[_tool_delta(1, arguments=': "2**10"}')]),
+    ]
+
+
+def test_json_parser_returns_each_call_as_it_closes():
+    text = json.dumps({"need_function": True, "function_calls": [SOLVE, CALC], "analysis": "分析"},
+                      ensure_ascii=False)
+    parser = FunctionCallsStreamParser()
+    closed_at = {}
+    for i, char in enumerate(text):
+        for call in parser.feed(char):
+            closed_at[call.function_name] = i
+
+    assert closed_at["solve_equation"] < text.index("calculate_expression")
+    assert closed_at["calculate_expression"] < text.index('"analysis"')
+    assert parser.feed("{}") == []
+
+
+def test_json_parser_skips_malformed_call():
+    parser = FunctionCallsStreamParser()
+    calls = parser.feed('{"function_calls": [{"parameters": {}}, ' + json.dumps(CALC) + "]}")
+    assert [call.function_name for call in calls] == ["calculate_expression"]
+
+
+def test_accumulator_completes_call_once_arguments_close():
+    accumulator = ToolCallStreamAccumulator()
+    deltas = [c.choices[0].delta.tool_calls[0] for c in _native_chunks()[1:]]
+
+    assert accumulator.feed(deltas[:1]) == []
+    assert [call.parameters for call in accumulator.feed(deltas[1:2])] == [{"equation": "x + 1 = 2"}]
+    assert [call.function_name for call in accumulator.feed(deltas[2:])] == ["calculate_expression"]
+    # 已完整的调用不会重复返回，流结束时按 index 给出全部调用
+    assert accumulator.feed([ChoiceDeltaToolCall.model_validate(_tool_delta(0, arguments=""))]) == []
+    assert [call.function_name for call in accumulator.finish()] == ["solve_equation", "calculate_expression"]
+
+
+def test_accumulator_finish_skips_invalid_arguments():
+    accumulator = ToolCallStreamAccumulator()
+    accumulator.feed([ChoiceDeltaToolCall.model_validate(_tool_delta(0, "solve_equation", '{"equation": "x'))])
+    assert accumulator.finish() == []
+
+
+def test_analyze_stream_dispatches_before_stream_ends():
+    events = []
+
+    def stream(timeout):
+        for item in _native_chunks():
+            events.append("chunk")
+            yield item
+
+    caller = FunctionCaller(chat=FakeChat([stream]))
+    response = caller.analyze_stream("解方程 x + 1 = 2", "高中", lambda call: events.append(call.function_name))
+
+    assert events == ["chunk", "chunk", "chunk", "solve_equation", "chunk", "chunk", "calculate_expression"]
+    assert response.need_function and response.analysis == "先解方程"
+    assert [call.function_name for call in response.function_results] == ["solve_equation", "calculate_expression"]
+
+
+def test_async_analyze_stream_matches_sync():
+    caller = FunctionCaller(chat=FakeChat([_native_chunks()]))
+    dispatched = []
+    response = asyncio.run(caller.aanalyze_stream("解方程 x + 1 = 2", "高中", dispatched.append))
+
+    assert [call.function_name for call in dispatched] == ["solve_equation", "calculate_expression"]
+    assert [call.function_name for call in response.function_results] == ["solve_equation", "calculate_expression"]
+
+
+def test_json_fallback_discards_native_dispatches():
+    """原生模式中途出现不可重试错误时作废已派发的调用，改用 JSON 模式重新分析"""
+    rejected = ValueError("模型不支持工具调用")
+    json_reply = json.dumps({"need_function": True, "function_calls": [CALC], "analysis": "计算"})
+    caller = FunctionCaller(chat=FakeChat([_native_chunks()[:3] + [rejected], [chunk(json_reply)]]))
+    events = []
+    response = caller.analyze_stream("计算 2**10", "高中", lambda call: events.append(call.function_name),
+                                     lambda: events.append("discard"))
+
+    assert events == ["solve_equation", "discard", "calculate_expression"]
+    assert [call.function_name for call in response.function_results] == ["calculate_expression"]
+
+
+def test_planner_discards_pending_tools_when_stream_fails():
+    planner = StrategyPlanner(chat=FakeChat([_native_chunks()[:3] + [connection_error()]]),
+                              use_local_classifier=False)
+    context = planner.run(ChainContext("解方程 x + 1 = 2", "高中"))
+
+    assert context.pending_tools == []
+    assert not (context.strategy_plan and context.strategy_plan.needs_tools)
+
+
+def test_planner_keeps_dispatched_tools_for_executor():
+    planner = StrategyPlanner(chat=FakeChat([_native_chunks()]), use_local_classifier=False)
+    context = planner.run(ChainContext("解方程 x + 1 = 2", "高中"))
+
+    assert [call.function_name for call, _ in context.pending_tools] == ["solve_equation", "calculate_expression"]
+    assert [call.function_name for call in context.strategy_plan.tool_calls] == \
+        ["solve_equation", "calculate_expression"]
+    for _, future in context.pending_tools:
+        future.result(timeout=30)
+
+
+def test_discarder_cancels_pending_futures():
+    context = ChainContext("计算 2**10", "")
+    future = Future()
+    context.pending_tools = [(FunctionCall(function_name="calculate_expression", parameters={}), future)]
+    StrategyPlanner._discarder(context)()
+
+    assert future.cancelled() and context.pending_tools == []
@@ -0,0 +1,97 @@
+"""
+数学工具共用的表达式缓存：按规范化后的表达式文本缓存 sympy 解析结果、导数和 lambdify 生成的 numpy 函数。
+同一函数在分析、绘图以及后续提问中通常会被反复解析，缓存后只需解析 / 编译一次。
+缓存为进程级 LRU，沙箱中每个工具工作进程各有一份
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+import sympy as sp
+
+# 缓存条目上限（解析结果、导数、编译函数合计），可通过环境变量 SMART_TEACHER_EXPR_CACHE_SIZE 调整
+DEFAULT_CACHE_SIZE = int(os.getenv("SMART_TEACHER_EXPR_CACHE_SIZE", "512"))
+
+_OPERATOR_SPACES = re.compile(r"\s*([-+*/^=(),])\s*")
+
+
+def normalize_expression(text: str) -> str:
+    """去掉运算符两侧的空白并把 ^ 统一为 **（与 sympify 的默认解释一致）"""
+    text = " ".join(str(text).split())
+    return _OPERATOR_SPACES.sub(r"\1", text).replace("^", "**")
+
+
+class ExprCache:
+    """线程安全的 LRU 缓存，解析失败的表达式不缓存，异常照常抛出"""
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get_or_create(self, key: Tuple, factory: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        # 解析和编译可能较慢，不持锁执行；并发未命中时重复计算一次，结果相同
+        value = factory()
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def expr(self, text: str) -> sp.Expr:
+        """sympify 的缓存版本"""
+        normalized = normalize_expression(text)
+        return self._get_or_create(("expr", normalized), lambda: sp.sympify(normalized))
+
+    def derivative(self, text: str, variable: str = "x", order: int = 1) -> sp.Expr:
+        """order 阶导数，高阶导数在低阶导数的缓存结果上求导"""
+        normalized = normalize_expression(text)
+        if order <= 0:
+            return self.expr(normalized)
+        return self._get_or_create(
+            ("derivative", normalized, variable, order),
+            lambda: sp.diff(self.derivative(normalized, variable, order - 1), sp.Symbol(variable))
+        )
+
+    def lambdified(self, text: str, variable: str = "x") -> Callable:
+        """编译为接受 numpy 数组的函数"""
+        normalized = normalize_expression(text)
+        return self._get_or_create(
+            ("lambdify", normalized, variable),
+            lambda: sp.lambdify(sp.Symbol(variable), self.expr(normalized), "numpy")
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# 进程级单例，所有工具共用
+expr_cache = ExprCache()
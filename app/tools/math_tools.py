@@ -1,20 +1,54 @@
+import io
 import sympy as sp
 import matplotlib.pyplot as plt
 import numpy as np
 import os
-from typing import Dict, Any, List, Union, Tuple
-from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional, Union, Tuple
+
+from tools.expr_cache import expr_cache, normalize_expression
+from tools.plot_store import plot_key, plot_store
+
+# 绘制函数曲线的基础采样点数，可通过环境变量 SMART_TEACHER_PLOT_SAMPLES 调整
+DEFAULT_PLOT_SAMPLES = int(os.getenv("SMART_TEACHER_PLOT_SAMPLES", "1000"))
+# 计算结果给出分数精确值时分母的最大位数
+MAX_EXACT_DIGITS = 12
+# 采样点数上限：samples 可由模型在工具调用中指定，超出时截断，避免单次绘图占用过多内存
+MAX_PLOT_SAMPLES = int(os.getenv("SMART_TEACHER_PLOT_MAX_SAMPLES", "20000"))
+# 绘图输出方式：memory 返回编码后的图像字节，file 写入图像文件（指定 save_path 时总是写文件）
+DEFAULT_PLOT_OUTPUT = os.getenv("SMART_TEACHER_PLOT_OUTPUT", "memory")
+DEFAULT_PLOT_FORMAT = os.getenv("SMART_TEACHER_PLOT_FORMAT", "png")
+# 内存渲染的像素预算（宽×高），按屏幕显示尺寸设置，超出时降低 dpi
+DEFAULT_PLOT_MAX_PIXELS = int(os.getenv("SMART_TEACHER_PLOT_MAX_PIXELS", str(1200 * 960)))
+# 是否使用按内容寻址的绘图缓存（tools.plot_store）
+PLOT_CACHE_ENABLED = os.getenv("SMART_TEACHER_PLOT_CACHE", "1") == "1"
+PLOT_OUTPUTS = ("memory", "file")
+PLOT_FORMATS = {"png": "image/png", "webp": "image/webp", "svg": "image/svg+xml"}
+# 自适应细化：最多细化轮数，以及每个可疑区间内插入的点数
+_REFINE_DEPTH = 4
+_REFINE_POINTS = 8
+# 相邻两点的函数值之差超过 y 值主体范围的该比例时，视为可能的间断点或渐近线
+_JUMP_RATIO = 0.25
+
+
+def _exact_rational(value: sp.Expr) -> Optional[str]:
+    """非整数有理数结果（含可精确换算的小数，如 0.1 + 0.2）的分数写法；分母位数过多时不给出"""
+    if value.is_Float:
+        value = sp.nsimplify(value, rational=True)
+    if not value.is_Rational or value.is_Integer or len(str(value.q)) > MAX_EXACT_DIGITS:
+        return None
+    return str(value)
 
 
 def calculate_expression(expression: str) -> Dict[str, Any]:
     """计算数学表达式"""
     try:
         # 使用sympy计算表达式
-        result = sp.sympify(expression)
+        result = expr_cache.expr(expression)
         evaluated = float(result.evalf()) if result.is_number else str(result)
         return {
             "success": True,
             "result": evaluated,
+            "exact": _exact_rational(result) if result.is_number else None,
             "expression": expression,
             "description": f"计算表达式 {expression} = {evaluated}"
         }
@@ -31,8 +65,20 @@ def solve_equation(equation: str, variable: str = "x") -> Dict[str, Any]:
     """解方程"""
     try:
         # 解析方程
-        eq = sp.Eq(*[sp.sympify(side) for side in equation.split("=")])
+        eq = sp.Eq(*[expr_cache.expr(side) for side in equation.split("=")])
         var = sp.Symbol(variable)
+        if eq is sp.true or eq is sp.false:
+            # 未知数在移项后消去：恒等式对任意值成立，矛盾方程无解
+            degenerate = "identity" if eq is sp.true else "contradiction"
+            return {
+                "success": True,
+                "solutions": [],
+                "degenerate": degenerate,
+                "equation": equation,
+                "variable": variable,
+                "description": f"方程 {equation} 中 {variable} 移项后消去，"
+                               f"{'对任意值恒成立' if degenerate == 'identity' else '方程无解'}"
+            }
         solutions = sp.solve(eq, var)
 
         solutions_str = [str(sol) for sol in solutions]
@@ -56,11 +102,10 @@ def plot_function(function: str, x_range: List[float] = [-10, 10]) -> Dict[str,
     """分析函数图像特征"""
     try:
         x = sp.Symbol('x')
-        func = sp.sympify(function)
 
         # 计算导数
-        derivative = sp.diff(func, x)
-        second_derivative = sp.diff(derivative, x)
+        derivative = expr_cache.derivative(function, 'x', 1)
+        second_derivative = expr_cache.derivative(function, 'x', 2)
 
         # 找到极值点
         critical_points = sp.solve(derivative, x)
@@ -88,74 +133,186 @@ def plot_function(function: str, x_range: List[float] = [-10, 10]) -> Dict[str,
         }
 
 
-def draw_plot(plot_type: str,
-              functions: Union[str, List[str]] = None,
-              x_range: List[float] = [-10, 10],
-              y_range: List[float] = None,
-              points: List[Tuple[float, float]] = None,
-              shapes: List[Dict[str, Any]] = None,
-              title: str = None,
-              xlabel: str = "x",
-              ylabel: str = "y",
-              grid: bool = True,
-              save_path: str = None,
-              figure_size: Tuple[int, int] = (10, 8),
-              dpi: int = 300) -> Dict[str, Any]:
-    """
-    绘制函数或几何图形并保存至文件
+def _evaluate_on(func_lambda: Callable, x: np.ndarray) -> np.ndarray:
+    """对整个数组求值，定义域外、复数和无穷大的结果记为 NaN"""
+    try:
+        with np.errstate(all="ignore"):
+            y = np.asarray(func_lambda(x))
+        if y.shape != x.shape:
+            # 常数函数返回标量
+            y = np.broadcast_to(y, x.shape)
+    except Exception:
+        # 含有无法向量化的运算时逐点求值
+        y = np.array([_evaluate_point(func_lambda, value) for value in x])
+
+    if np.iscomplexobj(y):
+        y = np.where(np.abs(y.imag) < 1e-12, y.real, np.nan)
+    try:
+        y = y.astype(float)
+    except (TypeError, ValueError):
+        # 结果中含有 sympy 数值等对象
+        y = np.array([_to_real(value) for value in y])
+    y[~np.isfinite(y)] = np.nan
+    return y
 
-    参数：
-    - plot_type: 绘图类型 ("function", "geometry", "mixed")
-    - functions: 函数表达式字符串或字符串列表
-    - x_range: x轴范围 [xmin, xmax]
-    - y_range: y轴范围 [ymin, ymax]，None时自动设置
-    - points: 点坐标列表 [(x1, y1), (x2, y2), ...]
-    - shapes: 几何图形列表，每个元素为字典描述图形参数
-    - title: 图表标题
-    - xlabel, ylabel: 坐标轴标签
-    - grid: 是否显示网格
-    - save_path: 保存路径，None时自动生成
-    - figure_size: 图像尺寸 (width, height)
-    - dpi: 图像分辨率
+
+def _evaluate_point(func_lambda: Callable, value: float) -> float:
+    try:
+        with np.errstate(all="ignore"):
+            return _to_real(func_lambda(value))
+    except Exception:
+        return np.nan
+
+
+def _to_real(value: Any) -> float:
+    try:
+        result = complex(value)
+    except (TypeError, ValueError):
+        return np.nan
+    return result.real if abs(result.imag) < 1e-12 else np.nan
+
+
+def _jump_threshold(y: np.ndarray) -> float:
+    finite = y[np.isfinite(y)]
+    if finite.size < 2:
+        return np.inf
+    low, high = np.percentile(finite, [5, 95])
+    return _JUMP_RATIO * ((high - low) or 1.0)
+
+
+def _suspect_intervals(x: np.ndarray, y: np.ndarray, threshold: float) -> np.ndarray:
+    """需要细化的区间下标，定义域边界优先，其次按跳变幅度从大到小"""
+    finite = np.isfinite(y)
+    edges = finite[:-1] != finite[1:]
+    with np.errstate(invalid="ignore"):
+        jumps = np.abs(np.diff(y))
+    jumps = np.where(finite[:-1] & finite[1:], jumps, 0.0)
+    priority = np.where(edges, np.inf, jumps)
+    # 区间已细到浮点精度附近时不再细化
+    candidates = np.flatnonzero((edges | (jumps > threshold)) & (np.diff(x) > 1e-9 * (x[-1] - x[0])))
+    return candidates[np.argsort(-priority[candidates], kind="stable")]
+
+
+def _clamp_samples(samples: int) -> int:
+    return min(max(2, int(samples)), MAX_PLOT_SAMPLES)
+
+
+def sample_function(func_lambda: Callable, x_range: List[float],
+                    samples: int = DEFAULT_PLOT_SAMPLES) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    对函数整体向量化采样，并在间断点、渐近线和定义域边界附近自适应加密（额外点数不超过 samples），
+    在极点处插入 NaN 断开曲线，避免在渐近线处画出竖直连线；samples 截断到 [2, MAX_PLOT_SAMPLES]
     """
+    samples = _clamp_samples(samples)
+    x = np.linspace(x_range[0], x_range[1], samples)
+    y = _evaluate_on(func_lambda, x)
+    threshold = _jump_threshold(y)
+
+    budget = samples
+    offsets = np.arange(1, _REFINE_POINTS + 1) / (_REFINE_POINTS + 1)
+    for _ in range(_REFINE_DEPTH):
+        suspect = _suspect_intervals(x, y, threshold)[:budget // _REFINE_POINTS]
+        if suspect.size == 0:
+            break
+        new_x = (x[suspect, None] + (x[suspect + 1] - x[suspect])[:, None] * offsets).ravel()
+        budget -= new_x.size
+        x = np.concatenate([x, new_x])
+        y = np.concatenate([y, _evaluate_on(func_lambda, new_x)])
+        order = np.argsort(x, kind="stable")
+        x, y = x[order], y[order]
+
+    # 细化后两侧函数值异号且绝对值都很大的区间视为极点（如 tan(x)、1/x），插入 NaN 断开
+    with np.errstate(invalid="ignore"):
+        poles = (np.sign(y[:-1]) != np.sign(y[1:])) & \
+            (np.minimum(np.abs(y[:-1]), np.abs(y[1:])) > threshold) & \
+            (np.abs(np.diff(y)) > threshold)
+    breaks = np.flatnonzero(poles) + 1
+    if breaks.size:
+        x = np.insert(x, breaks, np.nan)
+        y = np.insert(y, breaks, np.nan)
+    return x, y
+
+
+def _weighted_percentiles(x: np.ndarray, y: np.ndarray, percents: List[float]) -> np.ndarray:
+    """按采样间距加权的分位数，间断点附近加密的点不会压过其余区间"""
+    mask = np.isfinite(x) & np.isfinite(y)
+    x, y = x[mask], y[mask]
+    weights = np.gradient(x) if x.size > 1 else np.ones_like(x)
+    order = np.argsort(y)
+    cumulative = np.cumsum(weights[order])
+    return np.interp(np.asarray(percents) / 100 * cumulative[-1], cumulative, y[order])
+
+
+def _auto_ylim(curves: List[Tuple[np.ndarray, np.ndarray]],
+               points: List[Tuple[float, float]] = None) -> Optional[Tuple[float, float]]:
+    """存在渐近线等极端值时，按曲线主体确定 y 轴范围（并包含标注的点）；否则返回 None 交给 matplotlib 自动设置"""
+    curves = [(x, y) for x, y in curves if np.isfinite(y).sum() >= 2]
+    if not curves:
+        return None
+    low = min(_weighted_percentiles(x, y, [1])[0] for x, y in curves)
+    high = max(_weighted_percentiles(x, y, [99])[0] for x, y in curves)
+    span = (high - low) or 1.0
+    if all(np.nanmin(y) >= low - 3 * span and np.nanmax(y) <= high + 3 * span for _, y in curves):
+        return None
+
+    low, high = low - 0.1 * span, high + 0.1 * span
+    for _, point_y in points or []:
+        low, high = min(low, point_y - 0.1 * span), max(high, point_y + 0.1 * span)
+    return low, high
+
+
+def _budget_dpi(figure_size: Tuple[float, float], dpi: int, max_pixels: Optional[int]) -> float:
+    """在像素预算内可用的最大 dpi"""
+    if not max_pixels:
+        return dpi
+    return min(dpi, (max_pixels / (figure_size[0] * figure_size[1])) ** 0.5)
+
+
+def _encode_figure(fig, image_format: str, dpi: float) -> bytes:
+    """把图形编码为指定格式的字节"""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=image_format, dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def _image_size(image: bytes, image_format: str) -> Tuple[Optional[int], Optional[int]]:
+    """位图的像素尺寸（只读取文件头）；SVG 为矢量图，返回 (None, None)"""
+    if image_format == "svg":
+        return None, None
+
+    from PIL import Image
+    with Image.open(io.BytesIO(image)) as decoded:
+        return decoded.size
+
+
+def _render_plot(plot_type: str, functions: List[str], x_range: List[float], y_range: List[float],
+                 points: List[Tuple[float, float]], shapes: List[Dict[str, Any]], title: str,
+                 xlabel: str, ylabel: str, grid: bool, figure_size: Tuple[int, int], samples: int,
+                 image_format: str, render_dpi: float) -> bytes:
+    """绘制图形并编码为图像字节"""
+    fig = None
     try:
         # 设置中文字体支持
         plt.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS', 'DejaVu Sans']
         plt.rcParams['axes.unicode_minus'] = False
 
         # 创建图形
-        fig, ax = plt.subplots(figsize=figure_size, dpi=dpi)
-
-        # 生成x轴数据点
-        x_vals = np.linspace(x_range[0], x_range[1], 1000)
+        fig, ax = plt.subplots(figsize=figure_size, dpi=render_dpi)
+        # 各函数曲线的采样结果，用于确定 y 轴范围
+        curves = []
 
         # 绘制函数
         if plot_type in ["function", "mixed"] and functions:
-            if isinstance(functions, str):
-                functions = [functions]
-
             colors = ['blue', 'red', 'green', 'orange', 'purple', 'brown', 'pink', 'gray']
 
             for i, func_str in enumerate(functions):
                 try:
-                    # 将函数字符串转换为numpy可计算的形式
-                    x_sym = sp.Symbol('x')
-                    func_sym = sp.sympify(func_str)
-                    func_lambda = sp.lambdify(x_sym, func_sym, 'numpy')
-
-                    # 计算y值，处理可能的数学错误
-                    y_vals = []
-                    for x_val in x_vals:
-                        try:
-                            y_val = func_lambda(x_val)
-                            if np.isfinite(y_val):
-                                y_vals.append(y_val)
-                            else:
-                                y_vals.append(np.nan)
-                        except:
-                            y_vals.append(np.nan)
-
-                    y_vals = np.array(y_vals)
+                    # 将函数字符串转换为numpy可计算的形式（解析与编译结果在工具间共享缓存）
+                    func_lambda = expr_cache.lambdified(func_str, 'x')
+
+                    # 向量化计算y值，定义域外和无穷大处为 NaN，间断点附近自适应加密
+                    x_vals, y_vals = sample_function(func_lambda, x_range, samples)
+                    curves.append((x_vals, y_vals))
 
                     # 绘制函数曲线
                     color = colors[i % len(colors)]
@@ -220,6 +377,10 @@ def draw_plot(plot_type: str,
         ax.set_xlim(x_range)
         if y_range:
             ax.set_ylim(y_range)
+        else:
+            auto_ylim = _auto_ylim(curves, points)
+            if auto_ylim:
+                ax.set_ylim(auto_ylim)
 
         # 设置标签和标题
         ax.set_xlabel(xlabel, fontsize=12)
@@ -239,30 +400,149 @@ def draw_plot(plot_type: str,
         if (functions and len(functions) > 1) or points or (shapes and len(shapes) > 0):
             ax.legend()
 
-        # 生成保存路径
-        if save_path is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            save_path = f"plot_{plot_type}_{timestamp}.png"
+        plt.tight_layout()
+        return _encode_figure(fig, image_format, render_dpi)
+    finally:
+        # 关闭图形以释放内存（出错时同样关闭）
+        if fig is not None:
+            plt.close(fig)
+
 
+def _cached_plot(key: str, image_format: str) -> Optional[bytes]:
+    """读取绘图缓存，缓存目录不可用时视为未命中"""
+    try:
+        return plot_store.get(key, image_format)
+    except OSError as e:
+        print(f"读取绘图缓存失败：{str(e)}")
+        return None
+
+
+def _store_plot(key: str, image_format: str, image: bytes) -> Optional[str]:
+    """写入绘图缓存并返回文件路径；缓存目录不可用时只记录日志、返回 None，绘图结果照常返回"""
+    try:
+        return plot_store.put(key, image_format, image)
+    except OSError as e:
+        print(f"写入绘图缓存失败：{str(e)}")
+        return None
+
+
+def draw_plot(plot_type: str,
+              functions: Union[str, List[str]] = None,
+              x_range: List[float] = [-10, 10],
+              y_range: List[float] = None,
+              points: List[Tuple[float, float]] = None,
+              shapes: List[Dict[str, Any]] = None,
+              title: str = None,
+              xlabel: str = "x",
+              ylabel: str = "y",
+              grid: bool = True,
+              save_path: str = None,
+              figure_size: Tuple[int, int] = (10, 8),
+              dpi: int = 300,
+              samples: int = DEFAULT_PLOT_SAMPLES,
+              output: str = DEFAULT_PLOT_OUTPUT,
+              image_format: str = DEFAULT_PLOT_FORMAT,
+              max_pixels: Optional[int] = None) -> Dict[str, Any]:
+    """
+    绘制函数或几何图形，返回编码后的图像或保存至文件
+
+    参数：
+    - plot_type: 绘图类型 ("function", "geometry", "mixed")
+    - functions: 函数表达式字符串或字符串列表
+    - x_range: x轴范围 [xmin, xmax]
+    - y_range: y轴范围 [ymin, ymax]，None时自动设置
+    - points: 点坐标列表 [(x1, y1), (x2, y2), ...]
+    - shapes: 几何图形列表，每个元素为字典描述图形参数
+    - title: 图表标题
+    - xlabel, ylabel: 坐标轴标签
+    - grid: 是否显示网格
+    - save_path: 保存路径，None时在当前目录按内容哈希命名
+    - figure_size: 图像尺寸 (width, height)
+    - dpi: 图像分辨率
+    - samples: 每条函数曲线的基础采样点数，间断点附近会自适应加密，超过 MAX_PLOT_SAMPLES 时截断
+    - output: "memory" 在结果的 image 字段返回编码后的图像字节，"file" 保存为文件；指定 save_path 时总是保存文件
+    - image_format: 图像格式 "png" / "webp" / "svg"
+    - max_pixels: 像素预算，超出时降低 dpi；内存渲染默认按屏幕显示尺寸设置，保存文件默认不限制
+
+    相同参数的绘图结果保存在按内容寻址的绘图缓存中（见 tools.plot_store），再次请求时直接返回
+    """
+    try:
+        if output not in PLOT_OUTPUTS:
+            raise ValueError(f"output 必须是 {', '.join(PLOT_OUTPUTS)} 之一")
+        if image_format not in PLOT_FORMATS:
+            raise ValueError(f"image_format 必须是 {', '.join(PLOT_FORMATS)} 之一")
+        to_memory = output == "memory" and save_path is None
+        if to_memory and max_pixels is None:
+            max_pixels = DEFAULT_PLOT_MAX_PIXELS
+        render_dpi = _budget_dpi(figure_size, dpi, max_pixels)
+        if isinstance(functions, str):
+            functions = [functions]
+
+        # 规范化的绘图参数，决定渲染结果
+        key = plot_key({
+            "plot_type": plot_type,
+            "functions": [normalize_expression(func) for func in functions or []],
+            "x_range": [float(value) for value in x_range],
+            "y_range": [float(value) for value in y_range] if y_range else None,
+            "points": [[float(value) for value in point] for point in points or []],
+            "shapes": shapes or [],
+            "title": title,
+            "xlabel": xlabel,
+            "ylabel": ylabel,
+            "grid": bool(grid),
+            "figure_size": [float(value) for value in figure_size],
+            "dpi": round(render_dpi, 3),
+            "samples": _clamp_samples(samples),
+            "image_format": image_format
+        })
+
+        image = _cached_plot(key, image_format) if PLOT_CACHE_ENABLED else None
+        cached = image is not None
+        if image is None:
+            image = _render_plot(plot_type, functions, x_range, y_range, points, shapes, title, xlabel, ylabel,
+                                 grid, figure_size, samples, image_format, render_dpi)
+            if PLOT_CACHE_ENABLED:
+                _store_plot(key, image_format, image)
+
+        if to_memory:
+            width, height = _image_size(image, image_format)
+            size = f"，{width}x{height}" if width else ""
+            return {
+                "success": True,
+                "image": image,
+                "image_format": image_format,
+                "mime_type": PLOT_FORMATS[image_format],
+                "width": width,
+                "height": height,
+                "size_bytes": len(image),
+                "plot_type": plot_type,
+                "functions": functions,
+                "plot_key": key,
+                "cached": cached,
+                "description": f"成功绘制{plot_type}图像（{image_format.upper()}{size}）"
+            }
+
+        if save_path is None:
+            # 按内容哈希命名，避免同时绘图时互相覆盖；不直接返回绘图缓存中的文件，缓存按配额淘汰后路径会失效
+            save_path = f"plot_{plot_type}_{key[:16]}.{image_format}"
         # 确保保存目录存在
         save_dir = os.path.dirname(save_path) if os.path.dirname(save_path) else '.'
         os.makedirs(save_dir, exist_ok=True)
-
-        # 保存图像
-        plt.tight_layout()
-        plt.savefig(save_path, dpi=dpi, bbox_inches='tight')
-        plt.close()  # 关闭图形以释放内存
+        with open(save_path, "wb") as f:
+            f.write(image)
 
         return {
             "success": True,
             "file_path": os.path.abspath(save_path),
+            "image_format": image_format,
             "plot_type": plot_type,
             "functions": functions,
+            "plot_key": key,
+            "cached": cached,
             "description": f"成功绘制{plot_type}图像并保存到 {save_path}"
         }
 
     except Exception as e:
-        plt.close()  # 确保在错误时也关闭图形
         return {
             "success": False,
             "error": str(e),
@@ -289,7 +569,7 @@ FUNCTION_DESCRIPTIONS = """
    - 参数：function - 函数表达式，如 "x**2 + 2*x + 1"；x_range - 分析范围
    - 适用场景：需要分析函数性质、求导数、找极值点时
 
-4. draw_plot(plot_type, functions, x_range, y_range, points, shapes, title, xlabel, ylabel, grid, save_path, figure_size, dpi)
+4. draw_plot(plot_type, functions, x_range, y_range, points, shapes, title, xlabel, ylabel, grid, save_path, figure_size, dpi, samples)
    - 功能：绘制函数图像或几何图形
    - 参数：
      * plot_type: "function"(函数图像), "geometry"(几何图形), "mixed"(混合)
@@ -322,8 +602,20 @@ def execute_function(function_name: str, **kwargs) -> Dict[str, Any]:
         }
 
 
-def execute_tool(tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-    """执行工具函数"""
+def execute_tool(tool_name: str, arguments: Dict[str, Any], timeout: float = None) -> Dict[str, Any]:
+    """
+    执行工具函数：默认在沙箱工作进程中执行（有截止时间和内存上限），
+    设置环境变量 SMART_TEACHER_TOOL_SANDBOX=0 时在当前进程内直接执行
+    """
+    if os.getenv("SMART_TEACHER_TOOL_SANDBOX", "1") == "0":
+        return run_tool(tool_name, arguments)
+
+    from tools.sandbox import get_sandbox
+    return get_sandbox().run(tool_name, arguments, timeout=timeout)
+
+
+def run_tool(tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """在当前进程内执行工具函数"""
     if tool_name == "calculate_expression":
         return calculate_expression(arguments["expression"])
     elif tool_name == "solve_equation":
@@ -477,6 +769,12 @@ MATH_TOOLS = [
                     "dpi": {
                         "type": "integer",
                         "description": "图像分辨率"
+                    },
+                    "samples": {
+                        "type": "integer",
+                        "minimum": 2,
+                        "maximum": MAX_PLOT_SAMPLES,
+                        "description": f"每条函数曲线的采样点数，默认 1000，最多 {MAX_PLOT_SAMPLES}，间断点附近会自动加密"
                     }
                 },
                 "required": ["plot_type"]
@@ -0,0 +1,140 @@
+"""
+按内容寻址的绘图缓存：以规范化后的绘图参数（函数、范围、图形、样式、格式）的哈希作为文件名保存渲染结果，
+相同的绘图请求直接返回已有图像；总大小超过磁盘配额时按最近使用时间淘汰。
+目录由多个工具工作进程共享：写入先写临时文件再替换，文件修改时间记录最近使用时间
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PLOT_DIR = os.getenv("SMART_TEACHER_PLOT_DIR", os.path.join(os.path.dirname(CURRENT_DIR), "data", "plots"))
+DEFAULT_QUOTA_MB = float(os.getenv("SMART_TEACHER_PLOT_QUOTA_MB", "200"))
+# 超出配额时淘汰到配额的该比例以下，避免每次写入都触发淘汰
+_EVICT_TARGET = 0.9
+# 绘图代码改变渲染结果时递增，使旧缓存失效
+PLOT_RENDER_VERSION = 1
+
+
+def plot_key(spec: Dict[str, Any]) -> str:
+    """规范化绘图参数的哈希"""
+    canonical = json.dumps({"version": PLOT_RENDER_VERSION, **spec}, sort_keys=True, ensure_ascii=False,
+                           separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class PlotStore:
+    """磁盘上的绘图缓存，带配额和 LRU 淘汰"""
+
+    def __init__(self, directory: str = DEFAULT_PLOT_DIR, quota_mb: float = DEFAULT_QUOTA_MB):
+        self.directory = directory
+        self.quota_bytes = int(quota_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        # 本进程估算的目录总大小，首次写入时扫描目录得到
+        self._usage: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def path_for(self, key: str, image_format: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.{image_format}")
+
+    def get(self, key: str, image_format: str) -> Optional[bytes]:
+        """命中时返回图像字节并刷新最近使用时间"""
+        path = self.path_for(key, image_format)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            # 不存在，或刚被其他进程淘汰
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, image_format: str, data: bytes) -> str:
+        """保存图像并返回文件路径，超出配额时淘汰最久未使用的图像"""
+        path = self.path_for(key, image_format)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+
+        with self._lock:
+            # 同一 key 并发未命中时会重复写入，替换已有文件时只计入大小差
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(temp_path, path)
+            self.writes += 1
+            if self._usage is None:
+                self._usage = sum(size for _, _, size in self._scan())
+            else:
+                self._usage += len(data) - replaced
+            if self._usage > self.quota_bytes:
+                self._evict(keep=path)
+        return path
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        """目录下所有图像的 (最近使用时间, 路径, 大小)"""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def _evict(self, keep: str) -> None:
+        """重新扫描目录（其他进程也在写入），按最近使用时间从旧到新删除"""
+        entries = sorted(self._scan())
+        usage = sum(size for _, _, size in entries)
+        target = self.quota_bytes * _EVICT_TARGET
+        for _, path, size in entries:
+            if usage <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            usage -= size
+            self.evictions += 1
+        self._usage = usage
+
+    def usage(self) -> Dict[str, Any]:
+        """目录中的图像数量和总大小（所有进程共享）"""
+        entries = self._scan()
+        return {"files": len(entries), "bytes": sum(size for _, _, size in entries), "quota_bytes": self.quota_bytes}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+# 进程级单例；沙箱中每个工具工作进程各有一个实例，共用同一目录
+plot_store = PlotStore()
@@ -0,0 +1,247 @@
+"""
+工具沙箱：在预先启动的工作进程中执行数学工具（已预加载 sympy / numpy / matplotlib），
+每次调用有墙钟截止时间和内存（RSS）上限；超时或超限的工作进程被杀掉并替换，
+调用方得到结构化的失败结果，单个病态题目不会拖垮 Streamlit 服务进程或其他请求
+"""
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows 无 resource 模块
+    resource = None
+
+DEFAULT_WORKERS = int(os.getenv("SMART_TEACHER_TOOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+DEFAULT_TIMEOUT = float(os.getenv("SMART_TEACHER_TOOL_TIMEOUT", "30"))
+DEFAULT_MEMORY_MB = int(os.getenv("SMART_TEACHER_TOOL_MEMORY_MB", "1024"))
+# 可选的虚拟地址空间硬上限（RLIMIT_AS），0 表示不设置；numpy 等库的虚拟内存占用远大于 RSS，需留足余量
+DEFAULT_ADDRESS_SPACE_MB = int(os.getenv("SMART_TEACHER_TOOL_ADDRESS_SPACE_MB", "0"))
+
+# 等待结果时检查内存占用的间隔（秒）
+_POLL_INTERVAL = 0.1
+
+
+def _worker_main(conn, address_space_mb: int) -> None:
+    """工作进程主循环：接收 (工具名, 参数)，返回执行结果"""
+    if address_space_mb and resource is not None:
+        limit = address_space_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    import matplotlib
+    matplotlib.use("Agg")
+    from tools.expr_cache import expr_cache
+    from tools.math_tools import run_tool
+    from tools.plot_store import plot_store
+
+    def cache_stats() -> Dict[str, Dict[str, Any]]:
+        return {"expr_cache": expr_cache.stats(), "plot_store": plot_store.stats()}
+
+    # 每次返回 (结果, 本进程缓存统计)，由父进程汇总
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if request is None:
+            break
+
+        tool_name, arguments = request
+        try:
+            result = run_tool(tool_name, arguments)
+        except MemoryError:
+            # 内存耗尽后进程状态不可靠，返回结果后退出，由父进程替换
+            conn.send((_failure(tool_name, "memory_exceeded", "工具执行超出内存限制"), cache_stats()))
+            break
+        except Exception as e:
+            result = _failure(tool_name, "error", str(e))
+        conn.send((result, cache_stats()))
+
+
+def _failure(tool_name: str, reason: str, message: str) -> Dict[str, Any]:
+    return {
+        "success": False,
+        "error": message,
+        "reason": reason,
+        "description": f"执行 {tool_name} 失败：{message}"
+    }
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    """读取进程常驻内存（MB），仅 Linux 可用"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class _Worker:
+    def __init__(self, context, address_space_mb: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, address_space_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class ToolSandbox:
+    """预启动的工具工作进程池"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, timeout: float = DEFAULT_TIMEOUT,
+                 memory_limit_mb: int = DEFAULT_MEMORY_MB, address_space_mb: int = DEFAULT_ADDRESS_SPACE_MB):
+        """
+        Args:
+            workers: 工作进程数，即工具调用的最大并发
+            timeout: 单次工具调用的默认截止时间（秒）
+            memory_limit_mb: 单个工作进程的 RSS 上限，超过即杀掉
+            address_space_mb: 工作进程的 RLIMIT_AS 硬上限，0 表示不设置
+        """
+        # spawn 启动的子进程不继承父进程的线程和锁，Streamlit 多线程环境下更安全
+        self._context = multiprocessing.get_context("spawn")
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.address_space_mb = address_space_mb
+
+        self._lock = threading.Lock()
+        self._closed = False
+        self._counters = {"calls": 0, "timeouts": 0, "memory_kills": 0, "crashes": 0, "respawns": 0}
+        # 各工作进程最近一次上报的缓存统计，按进程号记录（已退出的进程保留其累计值）
+        self._cache_stats: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        self._all: List[_Worker] = []
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        for _ in range(max(1, workers)):
+            self._add_worker()
+
+    def _add_worker(self) -> None:
+        worker = _Worker(self._context, self.address_space_mb)
+        with self._lock:
+            self._all.append(worker)
+        self._idle.put(worker)
+
+    def _replace(self, worker: _Worker, counter: str) -> None:
+        worker.kill()
+        with self._lock:
+            self._counters[counter] += 1
+            self._counters["respawns"] += 1
+            if worker in self._all:
+                self._all.remove(worker)
+            closed = self._closed
+        if not closed:
+            self._add_worker()
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def run(self, tool_name: str, arguments: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """在工作进程中执行工具，超时、超内存或进程崩溃时返回结构化的失败结果"""
+        timeout = self.timeout if timeout is None else timeout
+        self._count("calls")
+
+        try:
+            # 所有工作进程都忙时排队等待，排队时间同样受截止时间约束
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            self._count("timeouts")
+            return _failure(tool_name, "timeout", f"等待空闲工作进程超过 {timeout:.0f} 秒")
+
+        deadline = time.monotonic() + timeout
+        try:
+            worker.conn.send((tool_name, arguments))
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._replace(worker, "timeouts")
+                    return _failure(tool_name, "timeout", f"工具执行超过 {timeout:.0f} 秒，已终止")
+
+                if worker.conn.poll(min(_POLL_INTERVAL, remaining)):
+                    result, cache_stats = worker.conn.recv()
+                    with self._lock:
+                        self._cache_stats[worker.process.pid] = cache_stats
+                    break
+
+                rss = _rss_mb(worker.process.pid)
+                if rss is not None and rss > self.memory_limit_mb:
+                    self._replace(worker, "memory_kills")
+                    return _failure(tool_name, "memory_exceeded",
+                                    f"工具执行内存占用 {rss:.0f}MB 超过上限 {self.memory_limit_mb}MB，已终止")
+        except (EOFError, OSError) as e:
+            self._replace(worker, "crashes")
+            return _failure(tool_name, "crashed", f"工具进程异常退出：{str(e) or type(e).__name__}")
+
+        if worker.process.is_alive():
+            self._idle.put(worker)
+        else:
+            # 工作进程在返回结果后退出（如内存耗尽）
+            self._replace(worker, "crashes")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": len(self._all),
+                "idle": self._idle.qsize(),
+                "timeout": self.timeout,
+                "memory_limit_mb": self.memory_limit_mb,
+                **self._counters,
+                "expr_cache": self._sum_cache_stats("expr_cache"),
+                "plot_store": self._sum_cache_stats("plot_store")
+            }
+
+    def _sum_cache_stats(self, cache: str) -> Dict[str, Any]:
+        """汇总各工作进程的缓存计数；条目数只计存活进程"""
+        alive = {worker.process.pid for worker in self._all}
+        totals: Dict[str, Any] = {}
+        for pid, worker_stats in self._cache_stats.items():
+            for key, value in worker_stats.get(cache, {}).items():
+                if key in ("hit_rate", "maxsize") or (key == "size" and pid not in alive):
+                    continue
+                totals[key] = totals.get(key, 0) + value
+        lookups = totals.get("hits", 0) + totals.get("misses", 0)
+        totals["hit_rate"] = totals.get("hits", 0) / lookups if lookups else 0.0
+        return totals
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            workers = list(self._all)
+            self._all.clear()
+        for worker in workers:
+            worker.stop()
+
+
+_sandbox: Optional[ToolSandbox] = None
+_sandbox_lock = threading.Lock()
+
+
+def get_sandbox() -> ToolSandbox:
+    """进程级沙箱单例，首次使用时启动工作进程"""
+    global _sandbox
+    with _sandbox_lock:
+        if _sandbox is None:
+            _sandbox = ToolSandbox()
+            atexit.register(_sandbox.close)
+        return _sandbox